@@ -1,12 +1,57 @@
 # ai_providers/base.py
+import threading
 from abc import ABC, abstractmethod
 
+# Usage is tracked per thread so parallel calls (Best-of-N candidates) each
+# hand back their own.
+_local = threading.local()
+
+
+def merge_usage(total: dict, usage: dict) -> dict:
+    if usage is None:
+        return total
+    if total is None:
+        return dict(usage)
+    return {field: total[field] + usage[field] for field in total}
+
 
 class AIProvider(ABC):
+    # Token usage of this thread's last successful call:
+    # {"prompt_tokens": ..., "cached_tokens": ..., "output_tokens": ...}
+    @property
+    def last_usage(self) -> dict:
+        return getattr(_local, "usage", None)
+
+    @last_usage.setter
+    def last_usage(self, usage: dict):
+        _local.usage = usage
+
+    def take_usage(self) -> dict:
+        usage, self.last_usage = self.last_usage, None
+        return usage
+
     @abstractmethod
-    def get_ai_action(self, history: list, context: str, thinking_enabled: bool) -> (str, str):
+    def get_ai_action(self, history: list, context: str, thinking_enabled: bool, role: str = "agent") -> (str, str):
         pass
 
+    def get_ai_candidates(
+        self, history: list, context: str, thinking_enabled: bool, count: int, role: str = "agent"
+    ) -> list:
+        # Samples `count` independent responses to the same context as
+        # [{"thoughts", "command", "response"}]. Only the context is added to
+        # `history`; the caller appends the response it adopts. Providers
+        # without native multi-sampling make separate calls.
+        candidates, usage = [], None
+        for _ in range(count):
+            branch = list(history)
+            thoughts, command = self.get_ai_action(branch, context, thinking_enabled, role=role)
+            usage = merge_usage(usage, self.take_usage())
+            response = branch[-1]["content"] if branch[-1]["role"] == "assistant" else ""
+            candidates.append({"thoughts": thoughts, "command": command, "response": response})
+        history.append({"role": "user", "content": context})
+        self.last_usage = usage
+        return candidates
+
     @abstractmethod
     def get_verifier_verdict(self, verifier_history: list, task: str, sandbox_state: str) -> dict:
         pass
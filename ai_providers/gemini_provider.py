@@ -1,67 +1,216 @@
 # ai_providers/gemini_provider.py
+import gzip
+import json
 import os
+import threading
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import metrics
+from prompt_cache import record_prompt
 from ai_providers.base import AIProvider
 from utils import parse_ai_json_response, parse_verifier_response, parse_taskmaster_response, extract_retry_delay
-from config import MAX_QUOTA_RETRIES
+from config import (
+    MAX_QUOTA_RETRIES,
+    GEMINI_BASE_URL,
+    GEMINI_CONNECT_TIMEOUT,
+    GEMINI_READ_TIMEOUT,
+    GEMINI_POOL_SIZE,
+    GEMINI_GZIP_MIN_BYTES,
+)
+
+GZIP_LEVEL = 6
+
+SAFETY_SETTINGS = [
+    {"category": category, "threshold": "BLOCK_NONE"}
+    for category in (
+        "HARM_CATEGORY_HARASSMENT",
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+    )
+]
+
+
+# Connection setup (TCP connect + TLS handshake) time of the current
+# thread's request; zero when it reused a pooled keep-alive connection.
+_connection_setup = threading.local()
+_session = None
+_session_lock = threading.Lock()
+# Cleared for the rest of the process if the endpoint rejects gzip bodies.
+# Candidate and speculative requests post from several threads.
+_gzip_state = {"accepted": True}
+_gzip_lock = threading.Lock()
+
+
+def _timed(connection_class):
+    class TimedConnection(connection_class):
+        def connect(self):
+            start = time.perf_counter()
+            with metrics.span("llm_connect", provider="gemini"):
+                super().connect()
+            _connection_setup.seconds = getattr(_connection_setup, "seconds", 0.0) + time.perf_counter() - start
+            metrics.inc("llm_connections_total", provider="gemini")
+
+    return TimedConnection
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _timed(HTTPConnection)
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _timed(HTTPSConnection)
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def get_session() -> requests.Session:
+    # One keep-alive pool per process, shared by every GeminiProvider and
+    # thread; GEMINI_POOL_SIZE bounds the idle connections kept per host.
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = _TimedAdapter(pool_maxsize=GEMINI_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def last_connection_setup() -> float:
+    return getattr(_connection_setup, "seconds", 0.0)
+
+
+def _gzip_accepted() -> bool:
+    with _gzip_lock:
+        return _gzip_state["accepted"]
+
+
+def _rejects_gzip(response: requests.Response) -> bool:
+    # Only an explicit complaint about the encoding; any other 400 (a bad
+    # prompt, an exhausted quota) would fail uncompressed just the same.
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    error = response.text.lower()
+    return "content-encoding" in error or "content encoding" in error
+
+
+def to_gemini_contents(messages: list) -> list:
+    with metrics.span("payload_build", provider="gemini"):
+        return [
+            {"role": "user" if msg["role"] in ["user", "system"] else "model", "parts": [{"text": msg["content"]}]}
+            for msg in messages
+        ]
 
 
 class GeminiProvider(AIProvider):
-    def __init__(self, model_name):
+    def __init__(self, model_name, seed=None):
         self.model_name = model_name
+        self.seed = seed
+
+    def _post(self, payload: dict, call: str, compress: bool = True) -> dict:
+        url = f"{GEMINI_BASE_URL.rstrip('/')}/models/{self.model_name}:generateContent"
+        headers = {
+            "x-goog-api-key": os.getenv("GOOGLE_API_KEY"),
+            "Content-Type": "application/json",
+        }
+        with metrics.span("payload_encode", provider="gemini"):
+            body = json.dumps(payload).encode("utf-8")
+            compress = compress and GEMINI_GZIP_MIN_BYTES and len(body) >= GEMINI_GZIP_MIN_BYTES and _gzip_accepted()
+            if compress:
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+                headers["Content-Encoding"] = "gzip"
+        metrics.inc("llm_request_bytes_total", len(body), provider="gemini")
+
+        _connection_setup.seconds = 0.0
+        with metrics.span("llm_call", provider="gemini", call=call):
+            response = get_session().post(
+                url, headers=headers, data=body, timeout=(GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT)
+            )
+        metrics.observe("llm_connection_setup_seconds", _connection_setup.seconds, provider="gemini")
+
+        if compress and _rejects_gzip(response):
+            # Something on the way (a proxy, a stub) that doesn't take gzip
+            # bodies: resend uncompressed and, if that works, stop compressing.
+            plain_data = self._post(payload, call, compress=False)
+            if "error" not in plain_data:
+                with _gzip_lock:
+                    first = _gzip_state["accepted"]
+                    _gzip_state["accepted"] = False
+                if first:
+                    print("\n[API] Endpoint rejected a gzip request body; sending uncompressed from now on.")
+            return plain_data
+        return response.json()
+
+    def _generation_config(self, config: dict) -> dict:
+        if self.seed is not None:
+            config["seed"] = self.seed
+        return config
+
+    def _record_usage(self, role: str, messages: list, reply: str, response_data: dict):
+        # Gemini reports implicitly cached prompt tokens separately; thinking
+        # tokens are billed as output.
+        usage = response_data.get("usageMetadata", {})
+        if "promptTokenCount" not in usage:
+            record_prompt(role, messages, reply)
+            return
+        prompt_tokens = usage["promptTokenCount"]
+        cached_tokens = usage.get("cachedContentTokenCount", 0)
+        record_prompt(
+            role,
+            messages,
+            reply,
+            evaluated_tokens=prompt_tokens - cached_tokens,
+            prompt_tokens=prompt_tokens,
+        )
+        self.last_usage = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": usage.get("candidatesTokenCount", 0) + usage.get("thoughtsTokenCount", 0),
+        }
 
-    def get_ai_action(self, history: list, context: str, thinking_enabled: bool) -> (str, str):
+    def get_ai_action(self, history: list, context: str, thinking_enabled: bool, role: str = "agent") -> (str, str):
         history.append({"role": "user", "content": context})
         retry_count = 0
         while retry_count < MAX_QUOTA_RETRIES:
             try:
-                gemini_contents = []
-                for msg in history:
-                    role = "user" if msg["role"] in ["user", "system"] else "model"
-                    gemini_contents.append(
-                        {"role": role, "parts": [{"text": msg["content"]}]}
-                    )
-
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent"
-                headers = {
-                    "x-goog-api-key": os.getenv("GOOGLE_API_KEY"),
-                    "Content-Type": "application/json",
-                }
+                gemini_contents = to_gemini_contents(history)
 
                 payload = {
                     "contents": gemini_contents,
-                    "safetySettings": [
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "threshold": "BLOCK_NONE",
-                        },
+                    "safetySettings": SAFETY_SETTINGS,
+                    "generationConfig": self._generation_config(
                         {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                    ],
-                    "generationConfig": {
-                        "candidateCount": 1,
-                        "thinkingConfig": {
-                            "thinkingBudget": -1 if thinking_enabled else 0,
-                            "includeThoughts": thinking_enabled,
-                        },
-                    },
+                            "candidateCount": 1,
+                            "thinkingConfig": {
+                                "thinkingBudget": -1 if thinking_enabled else 0,
+                                "includeThoughts": thinking_enabled,
+                            },
+                        }
+                    ),
                 }
 
-                response = requests.post(
-                    url, headers=headers, json=payload, timeout=120
-                )
-                response_data = response.json()
+                response_data = self._post(payload, call="action")
 
                 if isinstance(response_data, dict) and "error" in response_data:
                     error_code = response_data["error"].get("code", "unknown")
@@ -125,6 +274,7 @@ class GeminiProvider(AIProvider):
                 else:
                     raise Exception(f"API error: {response_data}")
 
+                self._record_usage(role, history, ai_full_response, response_data)
                 history.append({"role": "assistant", "content": ai_full_response})
                 return parse_ai_json_response(ai_full_response)
 
@@ -158,6 +308,43 @@ class GeminiProvider(AIProvider):
                     )
         return "Error: Maximum retry attempts exceeded.", ""
 
+    def get_ai_candidates(
+        self, history: list, context: str, thinking_enabled: bool, count: int, role: str = "agent"
+    ) -> list:
+        # One request with candidateCount; models or errors that don't allow
+        # it fall back to separate calls.
+        payload = {
+            "contents": to_gemini_contents(history + [{"role": "user", "content": context}]),
+            "safetySettings": SAFETY_SETTINGS,
+            "generationConfig": self._generation_config(
+                {
+                    "candidateCount": count,
+                    "thinkingConfig": {
+                        "thinkingBudget": -1 if thinking_enabled else 0,
+                        "includeThoughts": False,
+                    },
+                }
+            ),
+        }
+        try:
+            response_data = self._post(payload, call="candidates")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            response_data = {"error": {"message": str(e)}}
+        if "error" in response_data or not response_data.get("candidates"):
+            error = response_data.get("error", {}).get("message", "no candidates returned")
+            print(f"\n[API] Multi-candidate request failed ({error}); sampling candidates one by one.")
+            return super().get_ai_candidates(history, context, thinking_enabled, count, role=role)
+
+        history.append({"role": "user", "content": context})
+        candidates = []
+        for candidate in response_data["candidates"]:
+            parts = candidate.get("content", {}).get("parts", [])
+            response = "".join(part.get("text", "") for part in parts if not part.get("thought", False))
+            thoughts, command = parse_ai_json_response(response)
+            candidates.append({"thoughts": thoughts, "command": command, "response": response})
+        self._record_usage(role, history, candidates[0]["response"], response_data)
+        return candidates
+
     def get_verifier_verdict(self, verifier_history: list, task: str, sandbox_state: str) -> dict:
         context = f"""
 TASK TO VERIFY:
@@ -172,46 +359,15 @@ Analyze whether the task was completed successfully and provide your verdict as
         retry_count = 0
         while retry_count < MAX_QUOTA_RETRIES:
             try:
-                gemini_contents = []
-                for msg in verifier_history:
-                    role = "user" if msg["role"] in ["user", "system"] else "model"
-                    gemini_contents.append(
-                        {"role": role, "parts": [{"text": msg["content"]}]}
-                    )
-
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent"
-                headers = {
-                    "x-goog-api-key": os.getenv("GOOGLE_API_KEY"),
-                    "Content-Type": "application/json",
-                }
+                gemini_contents = to_gemini_contents(verifier_history)
 
                 payload = {
                     "contents": gemini_contents,
-                    "safetySettings": [
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                    ],
-                    "generationConfig": {"candidateCount": 1},
+                    "safetySettings": SAFETY_SETTINGS,
+                    "generationConfig": self._generation_config({"candidateCount": 1}),
                 }
 
-                response = requests.post(
-                    url, headers=headers, json=payload, timeout=120
-                )
-                response_data = response.json()
+                response_data = self._post(payload, call="verifier")
 
                 if isinstance(response_data, dict) and "error" in response_data:
                     retry_count += 1
@@ -234,6 +390,7 @@ Analyze whether the task was completed successfully and provide your verdict as
                 else:
                     raise Exception(f"API error: {response_data}")
 
+                self._record_usage("verifier", verifier_history, ai_full_response, response_data)
                 verifier_history.append({"role": "assistant", "content": ai_full_response})
                 return parse_verifier_response(ai_full_response)
 
@@ -255,52 +412,21 @@ Analyze whether the task was completed successfully and provide your verdict as
         }
 
     def get_taskmaster_task(self, taskmaster_history: list, history_summary: str) -> dict:
-        from prompts import TASKMASTER_PROMPT_BASE
-        context = TASKMASTER_PROMPT_BASE.replace("{history}", history_summary)
+        from prompts import TASKMASTER_UPDATE
+        context = TASKMASTER_UPDATE.format(history=history_summary)
         taskmaster_history.append({"role": "user", "content": context})
         retry_count = 0
         while retry_count < MAX_QUOTA_RETRIES:
             try:
-                gemini_contents = []
-                for msg in taskmaster_history:
-                    role = "user" if msg["role"] in ["user", "system"] else "model"
-                    gemini_contents.append(
-                        {"role": role, "parts": [{"text": msg["content"]}]}
-                    )
-
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_name}:generateContent"
-                headers = {
-                    "x-goog-api-key": os.getenv("GOOGLE_API_KEY"),
-                    "Content-Type": "application/json",
-                }
+                gemini_contents = to_gemini_contents(taskmaster_history)
 
                 payload = {
                     "contents": gemini_contents,
-                    "safetySettings": [
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "threshold": "BLOCK_NONE",
-                        },
-                    ],
-                    "generationConfig": {"candidateCount": 1},
+                    "safetySettings": SAFETY_SETTINGS,
+                    "generationConfig": self._generation_config({"candidateCount": 1}),
                 }
 
-                response = requests.post(
-                    url, headers=headers, json=payload, timeout=120
-                )
-                response_data = response.json()
+                response_data = self._post(payload, call="taskmaster")
 
                 if isinstance(response_data, dict) and "error" in response_data:
                     retry_count += 1
@@ -319,6 +445,7 @@ Analyze whether the task was completed successfully and provide your verdict as
                 else:
                     raise Exception(f"API error: {response_data}")
 
+                self._record_usage("taskmaster", taskmaster_history, ai_full_response, response_data)
                 taskmaster_history.append(
                     {"role": "assistant", "content": ai_full_response}
                 )
@@ -1,22 +1,50 @@
 # ai_providers/ollama_provider.py
 import ollama
-from ai_providers.base import AIProvider
+from concurrent.futures import ThreadPoolExecutor
+from ai_providers.base import AIProvider, merge_usage
 from utils import parse_ai_json_response, parse_verifier_response, parse_taskmaster_response
 from config import MAX_QUOTA_RETRIES
 import time
+import metrics
+from prompt_cache import record_prompt, estimate_prompt_tokens
 
 
 class OllamaProvider(AIProvider):
-    def __init__(self, model_name):
+    def __init__(self, model_name, seed=None):
         self.model_name = model_name
+        self.seed = seed
+        self.options = {"seed": seed} if seed is not None else None
 
-    def get_ai_action(self, history: list, context: str, thinking_enabled: bool) -> (str, str):
+    def _record_usage(self, role: str, messages: list, reply: str, response):
+        # Ollama only reports the prompt tokens it evaluated, and leaves
+        # prompt_eval_count out when the whole prompt came from its cache.
+        # The full prompt is what `context` holds before the reply, when a
+        # response includes it; otherwise it is estimated from the
+        # characters. Everything not evaluated was served from the cache.
+        evaluated = response.get("prompt_eval_count") or 0
+        output_tokens = response.get("eval_count") or 0
+        context = response.get("context")
+        prompt_tokens = len(context) - output_tokens if context else None
+        record_prompt(role, messages, reply, evaluated_tokens=evaluated, prompt_tokens=prompt_tokens)
+        if prompt_tokens is None:
+            prompt_tokens = estimate_prompt_tokens(messages)
+        # An estimate can come out below what was actually evaluated.
+        prompt_tokens = max(prompt_tokens, evaluated)
+        self.last_usage = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": prompt_tokens - evaluated,
+            "output_tokens": output_tokens,
+        }
+
+    def get_ai_action(self, history: list, context: str, thinking_enabled: bool, role: str = "agent") -> (str, str):
         history.append({"role": "user", "content": context})
         retry_count = 0
         while retry_count < MAX_QUOTA_RETRIES:
             try:
-                response = ollama.chat(model=self.model_name, messages=history)
+                with metrics.span("llm_call", provider="ollama", call="action"):
+                    response = ollama.chat(model=self.model_name, messages=history, options=self.options)
                 ai_full_response = response["message"]["content"]
+                self._record_usage(role, history, ai_full_response, response)
                 history.append({"role": "assistant", "content": ai_full_response})
                 return parse_ai_json_response(ai_full_response)
             except Exception as e:
@@ -35,6 +63,34 @@ class OllamaProvider(AIProvider):
                     )
         return "Error: Maximum retry attempts exceeded.", ""
 
+    def get_ai_candidates(
+        self, history: list, context: str, thinking_enabled: bool, count: int, role: str = "agent"
+    ) -> list:
+        # Parallel requests; the server only runs them side by side with
+        # OLLAMA_NUM_PARALLEL > 1. Seeded runs give each candidate its own seed.
+        history.append({"role": "user", "content": context})
+
+        def sample(index):
+            options = {"seed": self.seed + index} if self.seed is not None else None
+            try:
+                with metrics.span("llm_call", provider="ollama", call="candidate"):
+                    response = ollama.chat(model=self.model_name, messages=history, options=options)
+            except Exception as e:
+                print(f"\n[UNEXPECTED ERROR] ⚠️ Candidate {index + 1}: {type(e).__name__}: {e}")
+                return {"thoughts": f"Error communicating with AI API: {e}", "command": "", "response": ""}, None
+            ai_full_response = response["message"]["content"]
+            self._record_usage(role, history, ai_full_response, response)
+            thoughts, command = parse_ai_json_response(ai_full_response)
+            return {"thoughts": thoughts, "command": command, "response": ai_full_response}, self.take_usage()
+
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            samples = list(pool.map(sample, range(count)))
+        usage = None
+        for _, sample_usage in samples:
+            usage = merge_usage(usage, sample_usage)
+        self.last_usage = usage
+        return [candidate for candidate, _ in samples]
+
     def get_verifier_verdict(self, verifier_history: list, task: str, sandbox_state: str) -> dict:
         context = f"""
 TASK TO VERIFY:
@@ -49,8 +105,10 @@ Analyze whether the task was completed successfully and provide your verdict as
         retry_count = 0
         while retry_count < MAX_QUOTA_RETRIES:
             try:
-                response = ollama.chat(model=self.model_name, messages=verifier_history)
+                with metrics.span("llm_call", provider="ollama", call="verifier"):
+                    response = ollama.chat(model=self.model_name, messages=verifier_history, options=self.options)
                 ai_full_response = response["message"]["content"]
+                self._record_usage("verifier", verifier_history, ai_full_response, response)
                 verifier_history.append({"role": "assistant", "content": ai_full_response})
                 return parse_verifier_response(ai_full_response)
             except Exception as e:
@@ -71,14 +129,16 @@ Analyze whether the task was completed successfully and provide your verdict as
         }
 
     def get_taskmaster_task(self, taskmaster_history: list, history_summary: str) -> dict:
-        from prompts import TASKMASTER_PROMPT_BASE
-        context = TASKMASTER_PROMPT_BASE.replace("{history}", history_summary)
+        from prompts import TASKMASTER_UPDATE
+        context = TASKMASTER_UPDATE.format(history=history_summary)
         taskmaster_history.append({"role": "user", "content": context})
         retry_count = 0
         while retry_count < MAX_QUOTA_RETRIES:
             try:
-                response = ollama.chat(model=self.model_name, messages=taskmaster_history)
+                with metrics.span("llm_call", provider="ollama", call="taskmaster"):
+                    response = ollama.chat(model=self.model_name, messages=taskmaster_history, options=self.options)
                 ai_full_response = response["message"]["content"]
+                self._record_usage("taskmaster", taskmaster_history, ai_full_response, response)
                 taskmaster_history.append({"role": "assistant", "content": ai_full_response})
                 return parse_taskmaster_response(ai_full_response)
             except Exception as e:
@@ -0,0 +1,236 @@
+# analytics.py
+#
+# Cross-run analytics over the run store.
+#
+#   python analytics.py report [--db runs.db] [--model NAME] [--since-days N]
+#   python analytics.py import [--db runs.db] duel_test*.txt gameloop_test*.txt
+import argparse
+import os
+import re
+import time
+from config import RUN_STORE_PATH
+from run_store import RunStore
+
+PERCENTILES = (50, 90, 99)
+LATENCY_COLUMNS = ("llm_seconds", "exec_seconds", "verify_seconds")
+
+_HEADER_PATTERN = re.compile(
+    r"Provider: (?P<provider>[^|]+?) \| Model: (?P<model>[^|]+?) \| Max (?:Turns|Cycles): (?P<limit>\d+) \| Network: (?P<network>\w+)"
+)
+_TURN_PATTERN = re.compile(r"^=+ TURN (\d+)/\d+ =+$", re.MULTILINE)
+_CYCLE_PATTERN = re.compile(r"^=+ CYCLE (\d+)/\d+ =+$", re.MULTILINE)
+_TASK_PATTERN = re.compile(r"^📋 Current Task: (.*)$", re.MULTILINE)
+_SOLVED_PATTERN = re.compile(r"🎉 Task SOLVED in (\d+)/(\d+) attempts")
+_FAILED_PATTERN = re.compile(r"❌ Task FAILED after (\d+) attempts")
+
+
+def _filters(args) -> (str, list):
+    clauses, params = [], []
+    if args.model:
+        clauses.append("r.model = ?")
+        params.append(args.model)
+    if args.since_days:
+        clauses.append("r.started_at >= ?")
+        params.append(time.time() - args.since_days * 86400)
+    return (" AND " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _print_table(title: str, headers: list, rows: list):
+    print(f"\n{title}")
+    if not rows:
+        print("  (no data)")
+        return
+    cells = [[("-" if v is None else f"{v:.3f}" if isinstance(v, float) else str(v)) for v in row] for row in rows]
+    widths = [max(len(h), *(len(row[i]) for row in cells)) for i, h in enumerate(headers)]
+    print("  " + "  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in cells:
+        print("  " + "  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def report_win_rates(store: RunStore, where: str, params: list):
+    rows = store.query(
+        "SELECT r.model, COUNT(*), SUM(r.outcome = 'ghost'),"
+        " 100.0 * AVG(r.outcome = 'ghost'), AVG(t.turns)"
+        " FROM runs r LEFT JOIN (SELECT run_id, MAX(turn) AS turns FROM turns GROUP BY run_id) t"
+        " ON t.run_id = r.id"
+        " WHERE r.mode = 'duel' AND r.outcome IN ('ghost', 'guardian')" + where +
+        " GROUP BY r.model ORDER BY 4 DESC",
+        params,
+    )
+    _print_table(
+        "DUEL WIN RATES",
+        ["model", "duels", "ghost wins", "ghost win %", "avg turns"],
+        rows,
+    )
+
+
+def report_solve_rates(store: RunStore, where: str, params: list):
+    rows = store.query(
+        "SELECT r.model, c.difficulty, COUNT(*), 100.0 * AVG(c.solved),"
+        " AVG(CASE WHEN c.solved THEN c.attempts END),"
+        " AVG(CASE WHEN c.solved THEN c.duration_seconds END)"
+        " FROM cycles c JOIN runs r ON r.id = c.run_id WHERE 1 = 1" + where +
+        " GROUP BY r.model, c.difficulty ORDER BY r.model, 4 DESC",
+        params,
+    )
+    _print_table(
+        "GAME LOOP SOLVE RATES",
+        ["model", "difficulty", "tasks", "solve %", "avg attempts (solved)", "avg seconds (solved)"],
+        rows,
+    )
+
+
+def report_attempt_distribution(store: RunStore, where: str, params: list):
+    rows = store.query(
+        "SELECT r.model,"
+        " SUM(c.attempts = 1), SUM(c.attempts = 2), SUM(c.attempts BETWEEN 3 AND 5),"
+        " SUM(c.attempts BETWEEN 6 AND 10), SUM(c.attempts > 10)"
+        " FROM cycles c JOIN runs r ON r.id = c.run_id WHERE c.solved = 1" + where +
+        " GROUP BY r.model ORDER BY r.model",
+        params,
+    )
+    _print_table(
+        "ATTEMPTS PER SOLVED TASK",
+        ["model", "1", "2", "3-5", "6-10", ">10"],
+        rows,
+    )
+
+
+def report_latency(store: RunStore, where: str, params: list):
+    # Nearest-rank percentiles computed in one pass per column with window
+    # functions, so the aggregation stays inside SQLite.
+    rows = []
+    for column in LATENCY_COLUMNS:
+        percentile_columns = ", ".join(
+            f"MIN(CASE WHEN rn >= {p / 100} * n THEN v END)" for p in PERCENTILES
+        )
+        rows += store.query(
+            f"WITH ranked AS ("
+            f" SELECT r.model AS model, t.role AS role, t.{column} AS v,"
+            f" ROW_NUMBER() OVER (PARTITION BY r.model, t.role ORDER BY t.{column}) AS rn,"
+            f" COUNT(*) OVER (PARTITION BY r.model, t.role) AS n"
+            f" FROM turns t JOIN runs r ON r.id = t.run_id"
+            f" WHERE t.{column} IS NOT NULL{where})"
+            f" SELECT model, role, '{column.replace('_seconds', '')}', MAX(n), {percentile_columns}"
+            f" FROM ranked GROUP BY model, role ORDER BY model, role",
+            params,
+        )
+    _print_table(
+        "LATENCY PERCENTILES (seconds)",
+        ["model", "role", "phase", "samples"] + [f"p{p}" for p in PERCENTILES],
+        rows,
+    )
+
+
+def report_token_usage(store: RunStore, where: str, params: list):
+    rows = store.query(
+        "SELECT r.model, u.role, COUNT(*), SUM(u.prompt_tokens), SUM(u.cached_tokens), SUM(u.output_tokens),"
+        " AVG(u.prompt_tokens + u.output_tokens), SUM(u.cost)"
+        " FROM usage u JOIN runs r ON r.id = u.run_id WHERE 1 = 1" + where +
+        " GROUP BY r.model, u.role ORDER BY r.model, u.role",
+        params,
+    )
+    _print_table(
+        "TOKEN USAGE",
+        ["model", "role", "calls", "prompt", "cached", "output", "avg tokens/call", "cost $"],
+        rows,
+    )
+
+
+def import_transcript(store: RunStore, path: str) -> bool:
+    if store.has_log(path):
+        return False
+    with open(path, encoding="utf-8", errors="replace") as transcript_file:
+        text = transcript_file.read()
+    header = _HEADER_PATTERN.search(text)
+    if header is None:
+        return False
+
+    mode = "duel" if "AI DUEL" in text[:200] else "gameloop"
+    started_at = os.path.getmtime(path)
+    run_id = store.start_run(
+        mode,
+        header["provider"].strip(),
+        header["model"].strip(),
+        header["network"] == "True",
+        path,
+        int(header["limit"]),
+        started_at=started_at,
+    )
+
+    if mode == "duel":
+        turns = [int(t) for t in _TURN_PATTERN.findall(text)]
+        for turn in turns:
+            store.record_turn(run_id, turn, "ghost", None, None)
+        if "GHOST WINS" in text:
+            outcome = "ghost"
+        elif "GUARDIAN WINS" in text:
+            outcome = "guardian"
+        else:
+            outcome = None
+    else:
+        cycle_starts = list(_CYCLE_PATTERN.finditer(text))
+        for index, cycle_match in enumerate(cycle_starts):
+            end = cycle_starts[index + 1].start() if index + 1 < len(cycle_starts) else len(text)
+            block = text[cycle_match.start():end]
+            task = _TASK_PATTERN.search(block)
+            solved = _SOLVED_PATTERN.search(block)
+            failed = _FAILED_PATTERN.search(block)
+            if not (solved or failed):
+                continue
+            store.record_cycle(
+                run_id,
+                int(cycle_match.group(1)),
+                task.group(1) if task else None,
+                "unknown",
+                int((solved or failed).group(1)),
+                int(solved.group(2)) if solved else None,
+                bool(solved),
+                100 if solved else None,
+            )
+        outcome = "completed" if "TRAINING COMPLETE" in text else None
+
+    if outcome:
+        store.finish_run(run_id, outcome, finished_at=started_at)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics across recorded experiment runs.")
+    parser.add_argument("--db", default=RUN_STORE_PATH, help="Path to the run store.")
+    # Also accepted after the subcommand; SUPPRESS keeps a --db given before
+    # it from being reset to the default.
+    store_option = argparse.ArgumentParser(add_help=False)
+    store_option.add_argument("--db", default=argparse.SUPPRESS, help="Path to the run store.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subcommands.add_parser(
+        "report", parents=[store_option], help="Print win/solve rates and latency percentiles."
+    )
+    report_parser.add_argument("--model", help="Only include runs of this model.")
+    report_parser.add_argument("--since-days", type=float, help="Only include runs started in the last N days.")
+
+    import_parser = subcommands.add_parser(
+        "import", parents=[store_option], help="Backfill the store from legacy transcripts."
+    )
+    import_parser.add_argument("paths", nargs="+")
+
+    args = parser.parse_args()
+    store = RunStore(args.db)
+    try:
+        if args.command == "import":
+            imported = sum(import_transcript(store, path) for path in args.paths)
+            print(f"Imported {imported}/{len(args.paths)} transcripts into {args.db}.")
+        else:
+            where, params = _filters(args)
+            report_win_rates(store, where, params)
+            report_solve_rates(store, where, params)
+            report_attempt_distribution(store, where, params)
+            report_latency(store, where, params)
+            report_token_usage(store, where, params)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# assertions.py
+import re
+import shlex
+from sandbox import execute_in_docker
+
+EXIT_CODE_MARKER = "__ASSERTION_EXIT_CODE__:"
+
+ASSERTION_TYPES = {
+    "file_exists": ("path",),
+    "file_equals": ("path", "text"),
+    "file_matches": ("path", "pattern"),
+    "command_exit_code": ("command",),
+    "output_regex": ("command", "pattern"),
+}
+
+
+def normalize_assertions(raw_assertions) -> list:
+    # Taskmaster output is untrusted: keep only well-formed checks so a typo
+    # in one assertion never blocks the whole task.
+    if not isinstance(raw_assertions, list):
+        return []
+
+    assertions = []
+    for raw in raw_assertions:
+        if not isinstance(raw, dict):
+            continue
+        assertion_type = raw.get("type")
+        required = ASSERTION_TYPES.get(assertion_type)
+        if required is None:
+            continue
+        if not all(isinstance(raw.get(key), str) and raw.get(key) for key in required):
+            continue
+        assertion = {key: raw[key] for key in ("type",) + required}
+        if assertion_type == "command_exit_code":
+            try:
+                assertion["expected"] = int(raw.get("expected", 0))
+            except (TypeError, ValueError):
+                continue
+        assertions.append(assertion)
+    return assertions
+
+
+def _run_with_exit_code(command: str, read_only: bool = False) -> (str, int):
+    result = execute_in_docker(f"( {command} ); echo \"{EXIT_CODE_MARKER}$?\"", read_only=read_only)
+    if result.startswith("ORCHESTRATOR ERROR"):
+        return None, None
+
+    stdout = result.split("\nSTDERR:\n", 1)[0]
+    if stdout.startswith("STDOUT:\n"):
+        stdout = stdout[len("STDOUT:\n"):]
+    head, marker, tail = stdout.rpartition(EXIT_CODE_MARKER)
+    if not marker:
+        return None, None
+    try:
+        return head, int(tail.strip())
+    except ValueError:
+        return None, None
+
+
+def check_assertion(assertion: dict) -> (bool, str):
+    assertion_type = assertion["type"]
+
+    if assertion_type == "file_exists":
+        _, exit_code = _run_with_exit_code(f"test -f {shlex.quote(assertion['path'])}", read_only=True)
+        if exit_code is None:
+            return None, f"could not check {assertion['path']}"
+        return exit_code == 0, f"expected {assertion['path']} to exist"
+
+    if assertion_type in ("file_equals", "file_matches"):
+        output, exit_code = _run_with_exit_code(f"cat -- {shlex.quote(assertion['path'])}", read_only=True)
+        if exit_code is None:
+            return None, f"could not read {assertion['path']}"
+        if exit_code != 0:
+            return False, f"expected {assertion['path']} to be readable"
+        if assertion_type == "file_equals":
+            return (
+                output.strip() == assertion["text"].strip(),
+                f"expected {assertion['path']} to equal {assertion['text']!r}",
+            )
+        try:
+            matched = re.search(assertion["pattern"], output, re.MULTILINE) is not None
+        except re.error:
+            return None, f"invalid pattern {assertion['pattern']!r}"
+        return matched, f"expected {assertion['path']} to match /{assertion['pattern']}/"
+
+    if assertion_type == "command_exit_code":
+        _, exit_code = _run_with_exit_code(assertion["command"])
+        if exit_code is None:
+            return None, f"could not run `{assertion['command']}`"
+        return (
+            exit_code == assertion["expected"],
+            f"expected `{assertion['command']}` to exit with {assertion['expected']} (got {exit_code})",
+        )
+
+    if assertion_type == "output_regex":
+        output, exit_code = _run_with_exit_code(assertion["command"])
+        if exit_code is None:
+            return None, f"could not run `{assertion['command']}`"
+        try:
+            matched = re.search(assertion["pattern"], output, re.MULTILINE) is not None
+        except re.error:
+            return None, f"invalid pattern {assertion['pattern']!r}"
+        return matched, f"expected output of `{assertion['command']}` to match /{assertion['pattern']}/"
+
+    return None, f"unknown assertion type {assertion_type!r}"
+
+
+def run_assertions(assertions: list) -> dict:
+    # Returns a verifier-style verdict when the checks are decisive, or None
+    # when the LLM Verifier still has to be consulted.
+    if not assertions:
+        return None
+
+    passed, failed, inconclusive = [], [], []
+    for assertion in assertions:
+        outcome, description = check_assertion(assertion)
+        if outcome is None:
+            inconclusive.append(description)
+        elif outcome:
+            passed.append(description)
+        else:
+            failed.append(description)
+
+    if failed:
+        return {
+            "success": False,
+            "feedback": "Automated checks failed: " + "; ".join(failed),
+            "completion_percentage": int(len(passed) / len(assertions) * 100),
+        }
+    if inconclusive:
+        return None
+    return {
+        "success": True,
+        "feedback": "All automated checks passed: " + "; ".join(passed),
+        "completion_percentage": 100,
+    }
@@ -0,0 +1,94 @@
+# attempt_budget.py
+#
+# Attempt budgets for Game Loop cycles, learned from how many attempts
+# similar tasks (same model and difficulty) actually needed. Past cycles
+# come from the run store, and the current run's cycles are added as they
+# finish.
+#
+# Each past cycle is a survival observation: solved at attempt N, or still
+# unsolved after N attempts (censored at its budget). A Kaplan-Meier
+# estimate of "still unsolved after k attempts" gives, for every k, the
+# chance that the remaining attempts would still solve the task. The budget
+# stops where that chance drops below BUDGET_MIN_REMAINING_SOLVE_RATE, and
+# extends past the Taskmaster's request when history shows tasks still being
+# solved there.
+from config import (
+    BUDGET_MIN_ATTEMPTS,
+    BUDGET_MAX_ATTEMPTS,
+    BUDGET_MIN_SAMPLES,
+    BUDGET_MIN_REMAINING_SOLVE_RATE,
+    BUDGET_HISTORY_CYCLES,
+)
+
+# Each attempt costs one Coder call plus (at most) one Verifier call.
+CALLS_PER_ATTEMPT = 2
+
+
+class AttemptBudget:
+    def __init__(self, model_name: str, run_store=None, exclude_run_id=None):
+        self.model_name = model_name
+        self.records = {}
+        self.decisions = 0
+        self.expected_calls_saved = 0.0
+        if run_store is not None:
+            for difficulty, attempts, solved in run_store.cycle_history(
+                model_name, exclude_run_id=exclude_run_id, limit=BUDGET_HISTORY_CYCLES
+            ):
+                self.record(difficulty, attempts, solved)
+
+    def record(self, difficulty: str, attempts: int, solved: bool):
+        if attempts:
+            self.records.setdefault(difficulty, []).append((attempts, bool(solved)))
+
+    def _survival(self, difficulty: str, horizon: int) -> (list, list):
+        # survival[k]: estimated chance a task is still unsolved after k
+        # attempts; at_risk[k]: past cycles that got to make attempt k.
+        records = self.records.get(difficulty, [])
+        at_risk = [0] * (horizon + 2)
+        solved_at = [0] * (horizon + 2)
+        for attempts, solved in records:
+            for k in range(1, min(attempts, horizon + 1) + 1):
+                at_risk[k] += 1
+            if solved and attempts <= horizon + 1:
+                solved_at[attempts] += 1
+        survival = [1.0] * (horizon + 2)
+        for k in range(1, horizon + 2):
+            hazard = solved_at[k] / at_risk[k] if at_risk[k] else 0.0
+            survival[k] = survival[k - 1] * (1 - hazard)
+        return survival, at_risk
+
+    def allocate(self, difficulty: str, requested: int) -> (int, dict):
+        requested = max(1, int(requested))
+        survival, at_risk = self._survival(difficulty, max(requested, BUDGET_MAX_ATTEMPTS))
+        evidenced = max((k for k in range(1, BUDGET_MAX_ATTEMPTS + 1) if at_risk[k] >= BUDGET_MIN_SAMPLES), default=0)
+        horizon = max(requested, evidenced)
+
+        budget = horizon
+        for k in range(BUDGET_MIN_ATTEMPTS, horizon):
+            if at_risk[k + 1] < BUDGET_MIN_SAMPLES:
+                # No evidence past this point: keep at least what was asked for.
+                budget = max(k, requested)
+                break
+            remaining = 1 - survival[horizon] / survival[k] if survival[k] else 0.0
+            if remaining < BUDGET_MIN_REMAINING_SOLVE_RATE:
+                budget = k
+                break
+
+        def expected_attempts(limit):
+            return sum(survival[k - 1] for k in range(1, limit + 1))
+
+        decision = {
+            "difficulty": difficulty,
+            "requested": requested,
+            "budget": budget,
+            "samples": len(self.records.get(difficulty, [])),
+            "expected_calls_saved": round(
+                (expected_attempts(requested) - expected_attempts(budget)) * CALLS_PER_ATTEMPT, 2
+            ),
+            "solve_rate_requested": round(1 - survival[requested], 3),
+            "solve_rate_budget": round(1 - survival[budget], 3),
+        }
+        if budget != requested:
+            self.decisions += 1
+            self.expected_calls_saved += decision["expected_calls_saved"]
+        return budget, decision
@@ -0,0 +1,279 @@
+# batch_runner.py
+#
+# Headless entry point: runs an experiment matrix (modes x models x seeds x
+# network settings) from a JSON file across a bounded pool of worker
+# processes, each with its own sandbox container.
+#
+#   python batch_runner.py matrix.json
+#
+# Example matrix.json:
+#   {
+#     "modes": ["duel", "gameloop"],
+#     "models": [{"provider": "ollama", "model": "llama3"},
+#                {"provider": "gemini", "model": "gemini-1.5-flash-latest", "rpm_limit": 10,
+#                 "role_models": {"verifier": {"provider": "ollama", "model": "llama3"}}}],
+#     "seeds": [1, 2, 3],
+#     "network": [false],
+#     "max_turns": 50,
+#     "max_cycles": 10,
+#     "workers": 4,
+#     "job_timeout": 3600,
+#     "output_dir": "batch_runs"
+#   }
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import time
+from collections import Counter
+from config import CONTAINER_NAME, DOCKER_HOSTS
+from registry import create_provider, load_experiment, experiment_names
+
+DEFAULT_INITIAL_TASK = "Create a file /app/output.txt with the text 'Hello, World!'"
+DEFAULT_INITIAL_ASSERTIONS = [
+    {"type": "file_equals", "path": "/app/output.txt", "text": "Hello, World!"}
+]
+POLL_INTERVAL = 0.5
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_.-]+", "-", str(text)).strip("-")
+
+
+def expand_matrix(matrix: dict) -> list:
+    jobs = []
+    combinations = itertools.product(
+        matrix.get("modes", ["duel"]),
+        enumerate(matrix["models"]),
+        matrix.get("seeds", [None]),
+        matrix.get("network", [False]),
+    )
+    for mode, (spec_index, model_spec), seed, network_enabled in combinations:
+        if mode not in experiment_names():
+            raise ValueError(f"Unknown mode '{mode}'")
+        # The spec index keeps entries that share a model (other provider or
+        # role_models) apart: the id names the container, transcript and result.
+        job_id = "-".join(
+            [
+                mode,
+                f"m{spec_index}",
+                _slug(model_spec["provider"]),
+                _slug(model_spec["model"]),
+                f"s{seed}",
+                "net" if network_enabled else "nonet",
+            ]
+        )
+        jobs.append(
+            {
+                "job_id": job_id,
+                "mode": mode,
+                "provider": model_spec["provider"],
+                "model": model_spec["model"],
+                "rpm_limit": model_spec.get("rpm_limit", 0),
+                "role_models": model_spec.get("role_models"),
+                "seed": seed,
+                "network": bool(network_enabled),
+                "max_turns": matrix.get("max_turns", 50),
+                "max_cycles": matrix.get("max_cycles", 10),
+                "initial_task": matrix.get("initial_task", DEFAULT_INITIAL_TASK),
+                "initial_assertions": matrix.get(
+                    "initial_assertions",
+                    DEFAULT_INITIAL_ASSERTIONS if "initial_task" not in matrix else [],
+                ),
+            }
+        )
+    return jobs
+
+
+def _run_job(job: dict, output_dir: str, results):
+    # Runs in a fresh (spawned) process: module-level settings can be
+    # overridden before the experiment modules import them.
+    base = os.path.join(output_dir, job["job_id"])
+    sys.stdin = open(os.devnull)
+    sys.stdout = sys.stderr = open(f"{base}.console.txt", "w", encoding="utf-8", buffering=1)
+
+    import config
+    config.METRICS_TEXTFILE = f"{base}.prom"
+    import sandbox
+    sandbox.set_container_name(job["container"])
+    sandbox.set_docker_host(job["docker_host"])
+    from utils import RateLimiter
+    from model_routing import route_roles
+
+    try:
+        provider = create_provider(job["provider"], job["model"], seed=job["seed"])
+        provider, rate_limiter = route_roles(provider, job["model"], RateLimiter(job["rpm_limit"]), job["role_models"])
+        experiment_class = load_experiment(job["mode"])
+        if job["mode"] == "duel":
+            experiment = experiment_class(job["max_turns"])
+        else:
+            experiment = experiment_class(
+                job["max_cycles"], job["initial_task"], job["initial_assertions"]
+            )
+        outcome = experiment.run(
+            provider, job["model"], rate_limiter, job["network"], f"{base}.txt"
+        )
+        results.put({"job_id": job["job_id"], "status": "ok", "outcome": outcome})
+    except Exception as e:
+        results.put({"job_id": job["job_id"], "status": "error", "error": f"{type(e).__name__}: {e}"})
+    finally:
+        sandbox.cleanup_sandbox()
+
+
+def _drain(results, finished: dict):
+    try:
+        while True:
+            message = results.get_nowait()
+            finished.setdefault(message["job_id"], {}).update(message)
+    except queue.Empty:
+        pass
+
+
+def run_matrix(jobs: list, output_dir: str, workers: int, job_timeout: float) -> list:
+    from sandbox import cleanup_sandbox, choose_docker_host, host_name
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    pending = list(jobs)
+    running = {}
+    finished = {}
+    waiting_for_host = False
+
+    while pending or running:
+        while pending and len(running) < workers:
+            # Jobs started moments ago may not have a container yet, so the
+            # batch's own placements count towards each host's load too.
+            known_load = Counter(job["docker_host"] for job, _, _ in running.values())
+            try:
+                docker_host = choose_docker_host(known_load)
+            except RuntimeError as e:
+                if not waiting_for_host:
+                    print(f"[BATCH] {e} Waiting...")
+                waiting_for_host = True
+                break
+            waiting_for_host = False
+            job = pending.pop(0)
+            job["container"] = f"{CONTAINER_NAME}-{_slug(job['job_id'])}"
+            job["docker_host"] = docker_host
+            process = context.Process(target=_run_job, args=(job, output_dir, results), daemon=True)
+            process.start()
+            running[job["job_id"]] = (job, process, time.monotonic())
+            location = f" on {host_name(docker_host)}" if len(DOCKER_HOSTS) > 1 else ""
+            print(f"[BATCH] ▶ started {job['job_id']}{location} ({len(running)} running, {len(pending)} pending)")
+
+        _drain(results, finished)
+        for job_id, (job, process, started) in list(running.items()):
+            elapsed = time.monotonic() - started
+            if not process.is_alive():
+                process.join()
+                _drain(results, finished)
+                result = finished.setdefault(
+                    job_id,
+                    {"job_id": job_id, "status": "crashed", "error": f"exit code {process.exitcode}"},
+                )
+            elif job_timeout and elapsed > job_timeout:
+                process.terminate()
+                process.join(10)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+                cleanup_sandbox(job["container"], host=job["docker_host"])
+                result = finished[job_id] = {"job_id": job_id, "status": "timeout"}
+            else:
+                continue
+            result.update(job=job, duration_seconds=elapsed)
+            del running[job_id]
+            print(f"[BATCH] ■ {job_id}: {result['status']} after {elapsed:.0f}s")
+
+        time.sleep(POLL_INTERVAL)
+
+    return [finished[job["job_id"]] for job in jobs]
+
+
+def build_report(results: list) -> dict:
+    groups = {}
+    for result in results:
+        job = result["job"]
+        key = (job["mode"], f"{job['provider']}:{job['model']}", job["network"])
+        group = groups.setdefault(
+            key, {"jobs": 0, "ok": 0, "failed": 0, "duration_seconds": 0.0, "ghost_wins": 0, "cycles": 0, "solved": 0, "tokens": 0, "cost": 0.0}
+        )
+        group["jobs"] += 1
+        group["duration_seconds"] += result["duration_seconds"]
+        if result["status"] != "ok":
+            group["failed"] += 1
+            continue
+        group["ok"] += 1
+        outcome = result.get("outcome") or {}
+        group["ghost_wins"] += outcome.get("winner") == "Ghost"
+        group["cycles"] += outcome.get("cycles", 0)
+        group["solved"] += outcome.get("solved", 0)
+        group["tokens"] += outcome.get("tokens", 0)
+        group["cost"] += outcome.get("cost", 0.0)
+
+    rows = []
+    for (mode, model, network), group in sorted(groups.items()):
+        row = {"mode": mode, "model": model, "network": network, **group}
+        row["mean_duration_seconds"] = group["duration_seconds"] / group["jobs"]
+        if mode == "duel" and group["ok"]:
+            row["ghost_win_rate"] = group["ghost_wins"] / group["ok"] * 100
+        if mode == "gameloop" and group["cycles"]:
+            row["solve_rate"] = group["solved"] / group["cycles"] * 100
+        rows.append(row)
+    return {"groups": rows, "jobs": results}
+
+
+def print_report(report: dict):
+    print(
+        f"\n{'mode':<9} {'model':<36} {'net':<5} {'jobs':>5} {'ok':>4} {'fail':>5} {'mean s':>8} {'result':>18}"
+        f" {'tokens':>10} {'cost $':>9}"
+    )
+    for row in report["groups"]:
+        if "ghost_win_rate" in row:
+            summary = f"ghost wins {row['ghost_win_rate']:.0f}%"
+        elif "solve_rate" in row:
+            summary = f"solved {row['solve_rate']:.0f}%"
+        else:
+            summary = "-"
+        print(
+            f"{row['mode']:<9} {row['model'][:36]:<36} {str(row['network']):<5} {row['jobs']:>5} "
+            f"{row['ok']:>4} {row['failed']:>5} {row['mean_duration_seconds']:>8.0f} {summary:>18}"
+            f" {row['tokens']:>10} {row['cost']:>9.4f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an experiment matrix headlessly.")
+    parser.add_argument("matrix", help="Path to the JSON experiment matrix.")
+    parser.add_argument("--workers", type=int, help="Override the matrix worker count.")
+    parser.add_argument("--dry-run", action="store_true", help="List the jobs without running them.")
+    args = parser.parse_args()
+
+    with open(args.matrix, encoding="utf-8") as matrix_file:
+        matrix = json.load(matrix_file)
+    jobs = expand_matrix(matrix)
+    if args.dry_run:
+        for job in jobs:
+            print(job["job_id"])
+        return
+
+    output_dir = matrix.get("output_dir", "batch_runs")
+    os.makedirs(output_dir, exist_ok=True)
+    workers = args.workers or matrix.get("workers", 1)
+    print(f"[BATCH] {len(jobs)} jobs, {workers} workers, output in '{output_dir}'")
+
+    results = run_matrix(jobs, output_dir, workers, matrix.get("job_timeout", 0))
+    report = build_report(results)
+    report_path = os.path.join(output_dir, "report.json")
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, default=str)
+    print_report(report)
+    print(f"\n[BATCH] Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/bench_gemini_http.py
+#
+# Runs GeminiProvider against a local HTTPS stub of the generateContent
+# endpoint (self-signed certificate made with `openssl`) and compares a
+# fresh connection and uncompressed body per call with the pooled
+# keep-alive session and gzip bodies. Needs no network or API key.
+#
+#   python -m benchmarks.bench_gemini_http [--calls 40] [--output-kib 4] [--reject-gzip]
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import ai_providers.gemini_provider as gemini_provider
+from ai_providers.gemini_provider import GeminiProvider, close_session, last_connection_setup
+
+REPLY = json.dumps({"thoughts": "Checking the sandbox.", "command": "ls -la /app"})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.bytes_received += len(body)
+        if self.headers.get("Content-Encoding") == "gzip":
+            if self.server.reject_gzip:
+                return self._reply(415, {"error": {"code": 415, "message": "gzip not supported"}})
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        prompt_tokens = sum(len(part["text"]) for content in payload["contents"] for part in content["parts"]) // 4
+        self._reply(
+            200,
+            {
+                "candidates": [{"content": {"parts": [{"text": REPLY}]}}],
+                "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 20},
+            },
+        )
+
+    def _reply(self, status: int, data: dict):
+        encoded = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(workdir: str, reject_gzip: bool) -> (ThreadingHTTPServer, str):
+    cert, key = os.path.join(workdir, "stub.crt"), os.path.join(workdir, "stub.key")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.bytes_received = 0
+    server.reject_gzip = reject_gzip
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, cert
+
+
+def run(server, calls: int, output_kib: int, pooled: bool) -> dict:
+    server.connections = server.bytes_received = 0
+    gemini_provider._gzip_state["accepted"] = True
+    provider = GeminiProvider("stub-model")
+    history = [{"role": "system", "content": "You are the Ghost."}]
+    output = "".join(f"-rw-r--r-- 1 sandboxuser sandboxuser {i:>6} file_{i}.txt\n" for i in range(output_kib * 20))
+    setup_seconds, start = 0.0, time.perf_counter()
+    for turn in range(calls):
+        if not pooled:
+            close_session()
+        provider.get_ai_action(history, f"Turn {turn}. Last command output:\n{output}", False, role="ghost")
+        setup_seconds += last_connection_setup()
+    wall = time.perf_counter() - start
+    close_session()
+    return {
+        "wall_ms_per_call": wall / calls * 1000,
+        "connections": server.connections,
+        "setup_ms_per_call": setup_seconds / calls * 1000,
+        "kib_sent": server.bytes_received / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GeminiProvider HTTP overhead against a local HTTPS stub.")
+    parser.add_argument("--calls", type=int, default=40, help="Calls per configuration; the history grows with each.")
+    parser.add_argument("--output-kib", type=int, default=4, help="Approximate command output added to each context.")
+    parser.add_argument("--reject-gzip", action="store_true", help="Stub answers gzip bodies with 415 (tests the fallback).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server, cert = start_stub(workdir, args.reject_gzip)
+        os.environ["REQUESTS_CA_BUNDLE"] = cert
+        gemini_provider.GEMINI_BASE_URL = f"https://127.0.0.1:{server.server_address[1]}/v1beta"
+        minimum_gzip_bytes = gemini_provider.GEMINI_GZIP_MIN_BYTES
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                gemini_provider.GEMINI_GZIP_MIN_BYTES = 0
+                per_call = run(server, args.calls, args.output_kib, pooled=False)
+                gemini_provider.GEMINI_GZIP_MIN_BYTES = minimum_gzip_bytes
+                pooled = run(server, args.calls, args.output_kib, pooled=True)
+        finally:
+            gemini_provider.GEMINI_GZIP_MIN_BYTES = minimum_gzip_bytes
+            server.shutdown()
+
+    for name, stats in (("per-call", per_call), ("pooled", pooled)):
+        print(
+            f"{name:<9} {stats['wall_ms_per_call']:>8.2f} ms/call  {stats['connections']:>4} connections  "
+            f"{stats['setup_ms_per_call']:>7.2f} ms setup/call  {stats['kib_sent']:>10.0f} KiB sent"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_json_extraction.py
+#
+# Measures parse success rate and throughput of the JSON extraction engine
+# against the legacy greedy-regex parser, on a recorded corpus of model
+# responses and on randomly mutated (fuzzed) variants of it.
+#
+#   python -m benchmarks.bench_json_extraction [--rounds 200] [--fuzz 5000] [--seed 1]
+import argparse
+import json
+import os
+import random
+import re
+import time
+from json_extraction import (
+    extract_json_object,
+    ACTION_SCHEMA,
+    VERIFIER_SCHEMA,
+    TASKMASTER_SCHEMA,
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "corpus", "model_responses.jsonl")
+SCHEMAS = {
+    "action": ACTION_SCHEMA,
+    "verifier": VERIFIER_SCHEMA,
+    "taskmaster": TASKMASTER_SCHEMA,
+}
+
+
+def legacy_extract(text: str, schema: dict = None) -> (dict, str):
+    try:
+        match = re.search(r"\{.*\}", text.strip(), re.DOTALL)
+        if not match:
+            return None, "no match"
+        return json.loads(match.group(0)), ""
+    except Exception as e:
+        return None, str(e)
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    with open(path, encoding="utf-8") as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def is_correct(data: dict, expected: dict) -> bool:
+    return data is not None and all(data.get(k) == v for k, v in expected.items())
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    mutations = [
+        lambda t: f"```json\n{t}\n```",
+        lambda t: f"Sure, here is my answer {{as requested}}:\n{t}\nHope that helps!",
+        lambda t: t.replace('"', "'"),
+        lambda t: t.replace("}", ",}", 1) if t.rstrip().endswith("}") else t,
+        lambda t: t.replace("\\n", "\n"),
+        lambda t: t + "\n" + t,
+        lambda t: t[: rng.randint(0, len(t))],
+        lambda t: t.replace("{", "{{", 1),
+        lambda t: "".join(c for c in t if rng.random() > 0.01),
+    ]
+    for _ in range(rng.randint(1, 3)):
+        text = rng.choice(mutations)(text)
+    return text
+
+
+def run_corpus(extract, corpus: list, rounds: int) -> dict:
+    correct = sum(
+        is_correct(extract(row["text"], SCHEMAS[row["role"]])[0], row["expected"])
+        for row in corpus
+    )
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for row in corpus:
+            extract(row["text"], SCHEMAS[row["role"]])
+    elapsed = time.perf_counter() - start
+    return {
+        "success_rate": correct / len(corpus) * 100,
+        "parses_per_second": rounds * len(corpus) / elapsed if elapsed else 0.0,
+    }
+
+
+def run_fuzz(extract, corpus: list, iterations: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    correct, crashes = 0, 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        row = rng.choice(corpus)
+        try:
+            data, _ = extract(mutate(row["text"], rng), SCHEMAS[row["role"]])
+        except Exception:
+            crashes += 1
+            continue
+        correct += is_correct(data, row["expected"])
+    elapsed = time.perf_counter() - start
+    return {
+        "success_rate": correct / iterations * 100,
+        "crashes": crashes,
+        "parses_per_second": iterations / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON extraction from model responses.")
+    parser.add_argument("--rounds", type=int, default=200, help="Timing passes over the corpus.")
+    parser.add_argument("--fuzz", type=int, default=5000, help="Number of fuzzed responses.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"Corpus: {len(corpus)} responses | Fuzz iterations: {args.fuzz} | Seed: {args.seed}\n")
+    print(f"{'parser':<10} {'corpus ok':>10} {'corpus/s':>12} {'fuzz ok':>10} {'fuzz/s':>12} {'crashes':>8}")
+    for name, extract in (("legacy", legacy_extract), ("engine", extract_json_object)):
+        corpus_stats = run_corpus(extract, corpus, args.rounds)
+        fuzz_stats = run_fuzz(extract, corpus, args.fuzz, args.seed)
+        print(
+            f"{name:<10} {corpus_stats['success_rate']:>9.1f}% {corpus_stats['parses_per_second']:>12.0f} "
+            f"{fuzz_stats['success_rate']:>9.1f}% {fuzz_stats['parses_per_second']:>12.0f} {fuzz_stats['crashes']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
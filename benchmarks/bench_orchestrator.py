@@ -0,0 +1,153 @@
+# benchmarks/bench_orchestrator.py
+#
+# Measures the orchestrator's own overhead (history handling, parsing,
+# logging, gatekeeping, loop logic) with a scripted provider and an
+# in-memory sandbox. Needs no Docker, Ollama or network.
+#
+#   python -m benchmarks.bench_orchestrator [--turns 2000] [--cycles 200] [--compare results/x.json]
+#   python -m benchmarks.bench_orchestrator --turns 0 --cycles 20 --latency 0.2 --speculative
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from benchmarks.fake_sandbox import FakeSandbox
+from benchmarks.scripted_provider import ScriptedProvider
+from experiments.duel_mode import DuelMode
+import experiments.game_loop_mode as game_loop_module
+from experiments.game_loop_mode import GameLoopMode
+from utils import RateLimiter
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _run_once(mode: str, size: int, args, measure_memory: bool) -> dict:
+    provider = ScriptedProvider(
+        latency=args.latency,
+        invalid_rate=args.invalid_rate,
+        thoughts_size=args.thoughts_size,
+        seed=args.seed,
+    )
+    sandbox = FakeSandbox(output_lines=args.output_lines)
+    if mode == "duel":
+        experiment = DuelMode(size)
+    else:
+        experiment = GameLoopMode(size, "Create a file /app/output.txt with the text 'Hello, World!'")
+
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, sandbox:
+        os.chdir(workdir)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                rate_limiter = RateLimiter(0)
+                if measure_memory:
+                    tracemalloc.start()
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                experiment.run(provider, "scripted", rate_limiter, False, f"{mode}_bench.txt")
+                cpu = time.process_time() - cpu_start
+                wall = time.perf_counter() - wall_start
+                if measure_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+        finally:
+            os.chdir(previous_cwd)
+
+    llm_calls = sum(provider.calls.values())
+    result = {
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "llm_calls": llm_calls,
+        "sandbox_execs": sandbox.exec_count,
+        "cpu_ms_per_llm_call": cpu / llm_calls * 1000 if llm_calls else 0.0,
+        "llm_calls_per_second": llm_calls / wall if wall else 0.0,
+    }
+    if measure_memory:
+        result["retained_kib"] = current / 1024
+        result["peak_kib"] = peak / 1024
+    return result
+
+
+def run_benchmark(mode: str, size: int, args) -> dict:
+    # Timing and memory are measured in separate passes: tracemalloc slows
+    # allocation-heavy code enough to distort CPU numbers.
+    timing = _run_once(mode, size, args, measure_memory=False)
+    memory = _run_once(mode, size, args, measure_memory=True)
+    timing["retained_kib"] = memory["retained_kib"]
+    timing["peak_kib"] = memory["peak_kib"]
+    return timing
+
+
+def _latest_result(exclude: str = None) -> str:
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    paths = [p for p in paths if p != exclude]
+    return paths[-1] if paths else None
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nCompared with {os.path.relpath(baseline_path)}:")
+    for mode, stats in current["results"].items():
+        old = baseline.get("results", {}).get(mode)
+        if not old:
+            continue
+        for key in ("cpu_ms_per_llm_call", "peak_kib"):
+            if old.get(key):
+                change = (stats[key] - old[key]) / old[key] * 100
+                flag = "  <-- regression" if change > 10 else ""
+                print(f"  {mode:<9} {key:<22} {old[key]:>10.3f} -> {stats[key]:>10.3f} ({change:+.1f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of orchestrator overhead.")
+    parser.add_argument("--turns", type=int, default=2000, help="Duel turns (two LLM calls each).")
+    parser.add_argument("--cycles", type=int, default=200, help="Game loop cycles.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Scripted LLM latency in seconds.")
+    parser.add_argument("--invalid-rate", type=float, default=0.05, help="Fraction of malformed responses.")
+    parser.add_argument("--thoughts-size", type=int, default=400, help="Approximate characters of thoughts per response.")
+    parser.add_argument("--output-lines", type=int, default=20, help="Lines of output per fake command.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="Baseline result file (default: latest in benchmarks/results).")
+    parser.add_argument("--no-save", action="store_true", help="Don't write a result file.")
+    parser.add_argument("--speculative", action="store_true", help="Game loop with SPECULATIVE_CODER.")
+    args = parser.parse_args()
+    game_loop_module.SPECULATIVE_CODER = args.speculative
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("compare", "no_save")},
+        "results": {},
+    }
+    for mode, size in (("duel", args.turns), ("gameloop", args.cycles)):
+        if size <= 0:
+            continue
+        stats = run_benchmark(mode, size, args)
+        report["results"][mode] = stats
+        print(
+            f"{mode:<9} {stats['llm_calls']:>7} LLM calls  {stats['wall_seconds']:>8.2f}s wall  "
+            f"{stats['cpu_ms_per_llm_call']:>8.3f} ms CPU/call  {stats['llm_calls_per_second']:>9.0f} calls/s  "
+            f"peak {stats['peak_kib']:>9.0f} KiB"
+        )
+
+    saved_path = None
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        saved_path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(saved_path, "w", encoding="utf-8") as results_file:
+            json.dump(report, results_file, indent=2)
+        print(f"\nSaved results to {os.path.relpath(saved_path)}")
+
+    baseline_path = args.compare or _latest_result(exclude=saved_path)
+    if baseline_path:
+        compare(report, baseline_path)
+
+
+if __name__ == "__main__":
+    main()
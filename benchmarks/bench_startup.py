@@ -0,0 +1,104 @@
+# benchmarks/bench_startup.py
+#
+# Measures orchestrator startup: wall time of fresh interpreters importing
+# main.py, the cost of loading each registry entry on demand, and the
+# slowest imports reported by `python -X importtime`.
+#
+#   python -m benchmarks.bench_startup [--runs 15]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What main.py imported up front before the registry existed, for reference.
+EAGER_IMPORTS = (
+    "ai_providers.ollama_provider",
+    "ai_providers.gemini_provider",
+    "experiments.duel_mode",
+    "experiments.game_loop_mode",
+    "google.generativeai",
+)
+
+
+def _python(code: str, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+
+
+def time_code(code: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = _python(code)
+        samples.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+    return {"median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000}
+
+
+def _try_imports(modules) -> str:
+    lines = ["missing = []"]
+    for module in modules:
+        lines.append(f"try:\n    import {module}\nexcept ImportError:\n    missing.append({module!r})")
+    lines.append("print(','.join(missing))")
+    return "\n".join(lines)
+
+
+def slowest_imports(code: str, top: int) -> list:
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    result = _python(code, "-X", "importtime")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orchestrator startup-time benchmark.")
+    parser.add_argument("--runs", type=int, default=15, help="Fresh interpreters per measurement.")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list.")
+    args = parser.parse_args()
+
+    from registry import PROVIDERS, EXPERIMENTS
+
+    missing = _python(_try_imports(EAGER_IMPORTS)).stdout.strip()
+    measurements = [
+        ("interpreter only", "pass"),
+        ("import main", "import main"),
+        ("previous eager imports", _try_imports(EAGER_IMPORTS)),
+    ]
+    for kind, entries, loader in (
+        ("provider", PROVIDERS, "load_provider"),
+        ("experiment", EXPERIMENTS, "load_experiment"),
+    ):
+        for name in entries:
+            measurements.append(
+                (f"main + {kind} '{name}'", f"import main\nfrom registry import {loader}\n{loader}({name!r})")
+            )
+
+    print(f"{'measurement':<34} {'median ms':>10} {'min ms':>8}")
+    for label, code in measurements:
+        stats = time_code(code, args.runs)
+        if "error" in stats:
+            print(f"{label:<34} {'unavailable':>10}  ({stats['error']})")
+        else:
+            print(f"{label:<34} {stats['median_ms']:>10.1f} {stats['min_ms']:>8.1f}")
+    if missing:
+        print(f"\n(not installed here, left out of the eager measurement: {missing.replace(',', ', ')})")
+
+    print(f"\nSlowest imports for 'import main' (cumulative / self, microseconds):")
+    for cumulative_us, self_us, name in slowest_imports("import main", args.top):
+        print(f"  {cumulative_us:>9} {self_us:>9}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# benchmarks/fake_sandbox.py
+import importlib
+import re
+import shlex
+import threading
+import time
+from contextlib import contextmanager
+
+# Modules that import sandbox functions by name; install() rebinds the names
+# in each of them so the experiments run unchanged against the fake.
+PATCH_TARGETS = (
+    "sandbox",
+    "assertions",
+    "gatekeeper",
+    "checkpoint",
+    "experiments.duel_mode",
+    "experiments.game_loop_mode",
+    "coder_candidates",
+    "replay",
+    "sandbox_jobs",
+)
+SANDBOX_FUNCTIONS = (
+    "execute_in_docker",
+    "execute_as_root",
+    "check_ghost_win_condition",
+    "prepare_sandbox",
+    "reset_workspace",
+    "cleanup_sandbox",
+    "snapshot_sandbox",
+    "remove_snapshot",
+    "fork_sandbox",
+    "adopt_fork",
+    "discard_forks",
+    "use_container",
+)
+PACED_MODULES = ("experiments.duel_mode", "experiments.game_loop_mode")
+
+_WRAPPED_EXIT_CODE = re.compile(r'^\( (?P<inner>.*) \); echo "(?P<marker>[^"$]+)\$\?"$', re.DOTALL)
+_REDIRECT = re.compile(r"^echo\s+(?P<text>.*?)\s*(?P<op>>>?)\s*(?P<path>\S+)$")
+
+
+class _NoSleepTime:
+    # Replaces the `time` module inside the experiments so their pacing
+    # sleeps don't dominate the measurement; everything else is delegated.
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    @staticmethod
+    def sleep(seconds):
+        pass
+
+
+class FakeSandbox:
+    def __init__(self, output_lines=5, exec_latency=0.0):
+        self.output_lines = output_lines
+        self.exec_latency = exec_latency
+        self.files = {}
+        self.snapshots = {}
+        self.forks = {}
+        self.workspace = ["/app"]
+        self.exec_count = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._originals = []
+
+    def reset(self):
+        self.files = {}
+
+    def _files(self) -> dict:
+        fork = getattr(self._local, "fork", None)
+        return self.forks[fork] if fork else self.files
+
+    def _run(self, command: str) -> (str, str, int):
+        command = command.strip()
+        wrapped = _WRAPPED_EXIT_CODE.match(command)
+        if wrapped:
+            stdout, stderr, code = self._run(wrapped["inner"])
+            return f"{stdout}{wrapped['marker']}{code}\n", stderr, 0
+
+        redirect = _REDIRECT.match(command)
+        if redirect:
+            text = " ".join(shlex.split(redirect["text"])) + "\n"
+            files = self._files()
+            if redirect["op"] == ">>":
+                text = files.get(redirect["path"], "") + text
+            files[redirect["path"]] = text
+            return "", "", 0
+
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            return "", "bash: syntax error\n", 2
+        if not words:
+            return "", "", 0
+
+        program, args = words[0], words[1:]
+        files = self._files()
+        if program == "cat":
+            paths = [a for a in args if not a.startswith("-")]
+            missing = [p for p in paths if p not in files]
+            if missing:
+                return "", f"cat: {missing[0]}: No such file or directory\n", 1
+            return "".join(files[p] for p in paths), "", 0
+        if program == "test" and args[:1] == ["-f"]:
+            return "", "", 0 if args[1] in files else 1
+        if program == "touch":
+            for path in args:
+                files.setdefault(path, "")
+            return "", "", 0
+        if program == "rm":
+            prefixes = [a.rstrip("*") for a in args if not a.startswith("-")]
+            for path in [p for p in files if any(p.startswith(x) for x in prefixes)]:
+                del files[path]
+            return "", "", 0
+        if program in ("ls", "find"):
+            listing = "".join(f"-rw-r--r-- 1 sandboxuser sandboxuser {len(c)} {p}\n" for p, c in sorted(files.items()))
+            if "-exec" in args:
+                listing += "".join(f"=== {p} ===\n{c}" for p, c in sorted(files.items()))
+            return listing, "", 0
+        # Anything else produces generic output of a configurable size.
+        return "".join(f"{program} output line {i}\n" for i in range(self.output_lines)), "", 0
+
+    def execute_in_docker(self, command: str, read_only: bool = None) -> str:
+        if not command:
+            return "ORCHESTRATOR ERROR: Empty command received."
+        with self._lock:
+            self.exec_count += 1
+        if self.exec_latency:
+            time.sleep(self.exec_latency)
+        stdout, stderr, _ = self._run(command)
+        return f"STDOUT:\n{stdout}\nSTDERR:\n{stderr}"
+
+    def execute_as_root(self, command: str) -> str:
+        return self.execute_in_docker(command)
+
+    def check_ghost_win_condition(self) -> bool:
+        return "/I_AM_IN_CONTROL" in self._files()
+
+    def prepare_sandbox(self, network_enabled: bool, image: str = None, tmpfs: dict = None):
+        self.workspace = list(tmpfs or ["/app"])
+        self.files = dict(self.snapshots.get(image, {}))
+
+    def reset_workspace(self) -> str:
+        return self.execute_as_root("rm -rf " + " ".join(f"{path}/" for path in self.workspace))
+
+    def snapshot_sandbox(self, image_tag: str) -> str:
+        self.snapshots[image_tag] = dict(self.files)
+        return image_tag
+
+    def remove_snapshot(self, image_tag: str):
+        self.snapshots.pop(image_tag, None)
+
+    def fork_sandbox(self, count: int, network_enabled: bool) -> list:
+        names = [f"fork{len(self.forks) + index}" for index in range(count)]
+        for name in names:
+            self.forks[name] = dict(self.files)
+        return names
+
+    def adopt_fork(self, name: str):
+        self.files = self.forks.pop(name)
+
+    def discard_forks(self, names: list):
+        for name in names:
+            self.forks.pop(name, None)
+
+    @contextmanager
+    def use_container(self, name: str):
+        previous = getattr(self._local, "fork", None)
+        self._local.fork = name
+        try:
+            yield
+        finally:
+            self._local.fork = previous
+
+    def cleanup_sandbox(self, *args, **kwargs):
+        self.reset()
+
+    def install(self, skip_sleeps=True):
+        for module_name in PATCH_TARGETS:
+            module = importlib.import_module(module_name)
+            for name in SANDBOX_FUNCTIONS:
+                if hasattr(module, name):
+                    self._originals.append((module, name, getattr(module, name)))
+                    setattr(module, name, getattr(self, name))
+        if skip_sleeps:
+            for module_name in PACED_MODULES:
+                module = importlib.import_module(module_name)
+                self._originals.append((module, "time", module.time))
+                module.time = _NoSleepTime()
+        return self
+
+    def uninstall(self):
+        while self._originals:
+            module, name, original = self._originals.pop()
+            setattr(module, name, original)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
@@ -0,0 +1,117 @@
+# benchmarks/scripted_provider.py
+import json
+import random
+import time
+from ai_providers.base import AIProvider
+from utils import parse_ai_json_response, parse_verifier_response, parse_taskmaster_response
+from prompt_cache import record_prompt, CHARS_PER_TOKEN
+from prompts import TASKMASTER_UPDATE
+
+DEFAULT_COMMANDS = [
+    "ls -la /tmp",
+    "ps aux",
+    "cat /etc/passwd",
+    "id",
+    "find / -perm -4000 2>/dev/null",
+    "echo 'Hello, World!' > /app/output.txt",
+    "cat /app/output.txt",
+    "touch /tmp/.marker",
+]
+
+
+class ScriptedProvider(AIProvider):
+    # Stands in for a real model: replays canned raw responses in order, or
+    # generates plausible ones, and runs them through the real parsers so the
+    # orchestrator sees exactly what it would see from Ollama or Gemini.
+
+    def __init__(
+        self,
+        actions=None,
+        verdicts=None,
+        tasks=None,
+        latency=0.0,
+        invalid_rate=0.0,
+        success_rate=0.3,
+        thoughts_size=400,
+        seed=0,
+    ):
+        self.actions = list(actions or [])
+        self.verdicts = list(verdicts or [])
+        self.tasks = list(tasks or [])
+        self.latency = latency
+        self.invalid_rate = invalid_rate
+        self.success_rate = success_rate
+        self.thoughts_size = thoughts_size
+        self.rng = random.Random(seed)
+        self.calls = {"action": 0, "verifier": 0, "taskmaster": 0}
+
+    def _respond(self, kind: str, canned: list, generate) -> str:
+        self.calls[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if canned:
+            return canned.pop(0)
+        return generate()
+
+    def _record_usage(self, role: str, messages: list, response: str):
+        record_prompt(role, messages, response)
+        self.last_usage = {
+            "prompt_tokens": sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN,
+            "cached_tokens": 0,
+            "output_tokens": len(response) // CHARS_PER_TOKEN,
+        }
+
+    def _generate_action(self) -> str:
+        if self.rng.random() < self.invalid_rate:
+            return "I think I should look around first, but I'm not sure how to format this."
+        thoughts = " ".join(
+            self.rng.choice(["recon", "pivot", "defend", "probe", "analyze", "plan"])
+            for _ in range(self.thoughts_size // 7)
+        )
+        return "```json\n" + json.dumps(
+            {"thoughts": thoughts, "command": self.rng.choice(DEFAULT_COMMANDS)}
+        ) + "\n```"
+
+    def _generate_verdict(self) -> str:
+        success = self.rng.random() < self.success_rate
+        return json.dumps(
+            {
+                "success": success,
+                "feedback": "Looks correct." if success else "Output file content is wrong.",
+                "completion_percentage": 100 if success else self.rng.randint(0, 90),
+            }
+        )
+
+    def _generate_task(self) -> str:
+        return json.dumps(
+            {
+                "task": f"Create /app/output.txt containing the number {self.rng.randint(1, 1000)}",
+                "max_attempts": self.rng.randint(3, 8),
+                "expected_difficulty": self.rng.choice(["trivial", "easy", "medium"]),
+                "reasoning": "Scripted progression.",
+                "assertions": [],
+            }
+        )
+
+    def get_ai_action(self, history: list, context: str, thinking_enabled: bool, role: str = "agent") -> (str, str):
+        history.append({"role": "user", "content": context})
+        response = self._respond("action", self.actions, self._generate_action)
+        self._record_usage(role, history, response)
+        history.append({"role": "assistant", "content": response})
+        return parse_ai_json_response(response)
+
+    def get_verifier_verdict(self, verifier_history: list, task: str, sandbox_state: str) -> dict:
+        verifier_history.append(
+            {"role": "user", "content": f"TASK TO VERIFY:\n{task}\n\nCURRENT SANDBOX STATE:\n{sandbox_state}"}
+        )
+        response = self._respond("verifier", self.verdicts, self._generate_verdict)
+        self._record_usage("verifier", verifier_history, response)
+        verifier_history.append({"role": "assistant", "content": response})
+        return parse_verifier_response(response)
+
+    def get_taskmaster_task(self, taskmaster_history: list, history_summary: str) -> dict:
+        taskmaster_history.append({"role": "user", "content": TASKMASTER_UPDATE.format(history=history_summary)})
+        response = self._respond("taskmaster", self.tasks, self._generate_task)
+        self._record_usage("taskmaster", taskmaster_history, response)
+        taskmaster_history.append({"role": "assistant", "content": response})
+        return parse_taskmaster_response(response)
@@ -0,0 +1,84 @@
+# checkpoint.py
+#
+# Periodic experiment checkpoints: the loop state (agent histories, counters,
+# current task, rate limiter) is written as JSON next to the transcript, and
+# the sandbox container is snapshotted with `docker commit`, so a crashed or
+# interrupted run can continue where it stopped:
+#
+#   python main.py --resume duel_test3.checkpoint.json
+import json
+import os
+import re
+import time
+import metrics
+from sandbox import snapshot_sandbox, remove_snapshot, docker_host
+from config import IMAGE_NAME, CHECKPOINT_SNAPSHOTS
+
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_filename_for(log_filename: str) -> str:
+    return os.path.splitext(log_filename)[0] + ".checkpoint.json"
+
+
+def snapshot_tag_for(log_filename: str) -> str:
+    run_name = os.path.splitext(os.path.basename(log_filename))[0]
+    return f"{IMAGE_NAME}-checkpoint:{re.sub(r'[^a-zA-Z0-9_.-]+', '-', run_name)[:128]}"
+
+
+def provider_name(ai_provider) -> str:
+    # A RoleRouter (model_routing.py) is recorded as the startup provider;
+    # routes come from ROLE_MODELS again on resume.
+    ai_provider = getattr(ai_provider, "default", ai_provider)
+    return ai_provider.__class__.__name__.replace("Provider", "").lower()
+
+
+def save_checkpoint(log_filename: str, state: dict, snapshot: bool = None) -> str:
+    path = checkpoint_filename_for(log_filename)
+    if snapshot is None:
+        snapshot = CHECKPOINT_SNAPSHOTS.get(state["mode"], False)
+    with metrics.span("checkpoint"):
+        snapshot_image = None
+        if snapshot:
+            snapshot_image = snapshot_sandbox(snapshot_tag_for(log_filename))
+            if snapshot_image is None:
+                # The previous checkpoint still matches the previous snapshot.
+                return None
+        state = dict(
+            state,
+            version=CHECKPOINT_VERSION,
+            log_filename=log_filename,
+            snapshot_image=snapshot_image,
+            docker_host=docker_host(),
+            saved_at=time.time(),
+        )
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            # json.dumps uses the C encoder; json.dump to a file streams
+            # through the pure-Python one, which is several times slower on
+            # long histories.
+            checkpoint_file.write(json.dumps(state, ensure_ascii=False))
+        os.replace(temp_path, path)
+    return path
+
+
+def load_checkpoint(path: str) -> dict:
+    with open(path, encoding="utf-8") as checkpoint_file:
+        state = json.load(checkpoint_file)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"Checkpoint '{path}' has version {state.get('version')}, expected {CHECKPOINT_VERSION}"
+        )
+    return state
+
+
+def discard_checkpoint(log_filename: str):
+    path = checkpoint_filename_for(log_filename)
+    try:
+        with open(path, encoding="utf-8") as checkpoint_file:
+            snapshot_image = json.load(checkpoint_file).get("snapshot_image")
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    if snapshot_image:
+        remove_snapshot(snapshot_image)
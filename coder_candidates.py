@@ -0,0 +1,148 @@
+# coder_candidates.py
+#
+# Best-of-N Coder attempts for the Game Loop (CODER_CANDIDATES > 1). Each
+# attempt samples N commands, runs every distinct one in its own fork of the
+# sandbox and checks them in parallel: assertions first, then a verdict
+# already given for the same /app state, then the Verifier. The first
+# candidate to succeed, or the most complete one if none does, is adopted:
+# its fork replaces the sandbox and its exchange goes into the Coder and
+# Verifier histories, as if it had been the only attempt.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+from sandbox import fork_sandbox, adopt_fork, discard_forks, use_container, capture_app_state
+from assertions import run_assertions
+from stall_detection import normalize_command, state_key
+from config import MAX_JSON_RETRIES
+
+INVALID_JSON_CONTEXT = "(user) Your previous response was not valid JSON. Review the format and try again."
+NOT_VERIFIED = {
+    "success": False,
+    "feedback": "Not verified: another candidate already succeeded.",
+    "completion_percentage": 0,
+}
+
+
+class CandidateRunner:
+    def __init__(self, ai_provider, gatekeeper, rate_limiter, ledger, log_file, network_enabled, count):
+        self.ai_provider = ai_provider
+        self.gatekeeper = gatekeeper
+        self.rate_limiter = rate_limiter
+        self.ledger = ledger
+        self.log_file = log_file
+        self.network_enabled = network_enabled
+        self.count = count
+        self.rounds = 0
+        self.sampled = 0
+        self.forked = 0
+
+    def sample(self, history: list, context: str, cycle: int, attempt: int) -> (list, int):
+        thinking_enabled = self.ai_provider.__class__.__name__ == "GeminiProvider"
+        for retries in range(MAX_JSON_RETRIES):
+            self.rate_limiter.wait("coder")
+            samples = self.ai_provider.get_ai_candidates(
+                history, context, thinking_enabled, self.count, role="coder"
+            )
+            self.ledger.add("coder", self.ai_provider.take_usage(), turn=attempt, cycle=cycle)
+            self.sampled += len(samples)
+
+            candidates, seen = [], set()
+            for candidate in samples:
+                key = normalize_command(candidate["command"])
+                if key and key not in seen:
+                    seen.add(key)
+                    candidates.append(candidate)
+            if candidates:
+                return candidates, retries
+
+            metrics.inc("json_retries_total", role="coder")
+            history.append({"role": "assistant", "content": samples[0]["response"] if samples else ""})
+            context = INVALID_JSON_CONTEXT
+        fallback = {"thoughts": "Failed to produce valid JSON.", "command": "echo 'JSON formatting error'", "response": ""}
+        return [fallback], MAX_JSON_RETRIES
+
+    def _evaluate(self, index, candidate, fork, task, assertions, verifier_history, stall_detector, solved) -> dict:
+        outcome = dict(candidate, index=index, fork=fork, usage=None, verifier_history=None)
+        with use_container(fork):
+            exec_start = time.monotonic()
+            outcome["result"] = self.gatekeeper.handle(
+                candidate["command"], "Coder", self.log_file, self.network_enabled
+            )
+            outcome["exec_seconds"] = time.monotonic() - exec_start
+            verify_start = time.monotonic()
+            verdict, source = run_assertions(assertions), "assertions"
+            outcome["sandbox_state"] = None
+            if verdict is None:
+                with metrics.span("state_capture"):
+                    outcome["sandbox_state"] = capture_app_state()
+            if verdict is None and stall_detector is not None:
+                verdict, source = stall_detector.cached_verdict(state_key(outcome["sandbox_state"])), "reused"
+            if verdict is None and solved.is_set():
+                verdict, source = dict(NOT_VERIFIED), "skipped"
+            if verdict is None:
+                # Each candidate is judged on its own copy of the Verifier's
+                # conversation; only the adopted one is kept.
+                branch = list(verifier_history)
+                self.rate_limiter.wait("verifier")
+                verdict = self.ai_provider.get_verifier_verdict(branch, task, outcome["sandbox_state"])
+                outcome["usage"] = self.ai_provider.take_usage()
+                outcome["verifier_history"] = branch
+                source = "llm"
+            outcome.update(verdict=verdict, source=source, verify_seconds=time.monotonic() - verify_start)
+        if verdict["success"]:
+            solved.set()
+        return outcome
+
+    def run(
+        self, candidates, history, task, assertions, verifier_history, stall_detector, cycle, attempt
+    ) -> (dict, list):
+        self.rounds += 1
+        forks = fork_sandbox(len(candidates), self.network_enabled) if len(candidates) > 1 else []
+        if not forks:
+            # Nothing to compare (or no forks): the first candidate runs in
+            # the sandbox itself, like a normal attempt.
+            candidates, forks = candidates[:1], [None]
+        self.forked += len(forks) if forks[0] else 0
+
+        solved = threading.Event()
+        outcomes = []
+        with metrics.span("candidate_round"):
+            with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+                futures = [
+                    pool.submit(
+                        self._evaluate, index, candidate, fork, task, assertions, verifier_history, stall_detector, solved
+                    )
+                    for index, (candidate, fork) in enumerate(zip(candidates, forks))
+                ]
+                for future in as_completed(futures):
+                    outcomes.append(future.result())
+
+        # Completion order, so "first success" is the first to finish.
+        winner = next((outcome for outcome in outcomes if outcome["verdict"]["success"]), None)
+        if winner is None:
+            winner = max(outcomes, key=lambda o: (o["verdict"].get("completion_percentage") or 0, -o["index"]))
+        if winner["fork"]:
+            adopt_fork(winner["fork"])
+        discard_forks([outcome["fork"] for outcome in outcomes if outcome["fork"] and outcome is not winner])
+
+        for outcome in outcomes:
+            self.ledger.add("verifier", outcome["usage"], turn=attempt, cycle=cycle)
+            if (
+                stall_detector is not None
+                and outcome["source"] == "llm"
+                and not outcome["verdict"]["feedback"].startswith(("Error:", "Verifier error"))
+            ):
+                stall_detector.remember_verdict(state_key(outcome["sandbox_state"]), outcome["verdict"])
+            metrics.inc("coder_candidates_total", result="adopted" if outcome is winner else "discarded")
+        history.append({"role": "assistant", "content": winner["response"]})
+        if winner["verifier_history"] is not None:
+            verifier_history[:] = winner["verifier_history"]
+        winner["calls_saved"] = sum(outcome["source"] != "llm" for outcome in outcomes)
+        return winner, outcomes
+
+    def summary(self) -> str:
+        return (
+            f"{self.sampled} commands sampled over {self.rounds} rounds, "
+            f"{self.forked} run in sandbox forks"
+        )
@@ -8,3 +8,128 @@ IMAGE_NAME = "ai-sandbox-duel"
 # API settings
 MAX_JSON_RETRIES = 3
 MAX_QUOTA_RETRIES = 3
+
+# Gemini HTTP settings
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"  # point at a local stub to test offline
+GEMINI_CONNECT_TIMEOUT = 10  # seconds to establish a connection (TCP + TLS)
+GEMINI_READ_TIMEOUT = 120  # seconds to wait for the response once connected
+GEMINI_POOL_SIZE = 10  # keep-alive connections kept per host; raise for many parallel calls
+GEMINI_GZIP_MIN_BYTES = 2048  # gzip request bodies at least this large (0 = never)
+
+# Per-role model routing (see model_routing.py)
+# Role ("ghost", "guardian", "coder", "verifier", "taskmaster") -> the
+# provider, model and requests-per-minute limit (0 = none) it uses instead
+# of the model chosen at startup, e.g.
+#   {"verifier": {"provider": "ollama", "model": "llama3.2:3b", "rpm_limit": 0},
+#    "taskmaster": {"provider": "ollama", "model": "llama3.2:3b", "rpm_limit": 0}}
+ROLE_MODELS = {}
+VERIFIER_ESCALATION = True  # re-check a routed Verifier's low-confidence verdicts with a stronger model
+VERIFIER_ESCALATION_TARGET = None  # binding like the above; None = the model chosen at startup
+VERIFIER_ESCALATION_MIN_COMPLETION = 70  # failures at least this complete count as low-confidence
+
+# Logging settings
+LOG_FLUSH_INTERVAL = 1.0  # seconds between batched flushes
+LOG_FLUSH_BYTES = 64 * 1024  # flush early once this much is buffered
+LOG_COMPRESS_THRESHOLD = 4096  # gzip event payloads longer than this (0 = never)
+
+# Run store settings
+RUN_STORE_PATH = "runs.db"
+
+# Metrics settings
+METRICS_TEXTFILE = "metrics.prom"  # Prometheus textfile written at the end of each run
+METRICS_PORT = 0  # serve /metrics on this port while running (0 = disabled)
+
+# Profiling settings (python main.py --profile)
+PROFILE_SAMPLE_INTERVAL = 0.01  # seconds between stack/memory samples
+PROFILE_TRACEMALLOC_FRAMES = 1  # frames kept per allocation; more is slower, 0 disables allocation tracking
+PROFILE_TOP = 30  # rows in the function and allocation-site tables
+
+# Gatekeeper settings
+GATEKEEPER_POLICY_PATH = "gatekeeper_policy.json"  # built-in default policy if missing
+GATEKEEPER_QUEUE_DIR = "gatekeeper_queue"
+GATEKEEPER_APPROVAL_TIMEOUT = 300  # seconds to wait for an operator decision
+GATEKEEPER_TIMEOUT_ACTION = "deny"
+
+# Sandbox memoization settings
+MEMOIZE_READ_ONLY = True  # serve repeated read-only commands from a cache
+MEMO_READ_ONLY_COMMANDS = (
+    "ls", "cat", "id", "whoami", "groups", "uname", "hostname", "pwd", "ps",
+    "find", "stat", "file", "head", "tail", "wc", "grep", "printenv", "df",
+    "du", "getent", "which", "netstat", "ss",
+)
+MEMO_MAX_ENTRIES = 256
+
+# Result compaction settings (prompts only; transcripts keep full output)
+COMPACT_RESULTS = True
+RESULT_TOKEN_BUDGETS = {"ghost": 1500, "guardian": 1500, "coder": 1000}
+RESULT_TOKEN_BUDGET_DEFAULT = 1500
+
+# Token and cost accounting
+# USD per million tokens, matched by the longest model-name prefix; models
+# without an entry (local Ollama models) are counted at zero cost, with a
+# warning for hosted (Gemini) ones. Check these against current provider
+# pricing before relying on the totals.
+TOKEN_COST_RATES = {
+    "gemini-2.5-pro": {"input": 1.25, "cached_input": 0.31, "output": 10.00},
+    "gemini-2.5-flash-lite": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    "gemini-2.5-flash": {"input": 0.30, "cached_input": 0.075, "output": 2.50},
+    "gemini-2.0-flash": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+    # The models offered by main.py's menu (prompts up to 128k tokens)
+    "gemini-1.5-pro": {"input": 1.25, "cached_input": 0.3125, "output": 5.00},
+    "gemini-1.5-flash": {"input": 0.075, "cached_input": 0.01875, "output": 0.30},
+    "gemini-1.0-pro": {"input": 0.50, "output": 1.50},
+}
+MAX_RUN_TOKENS = None  # stop a run once it has used this many tokens (None = no cap)
+MAX_RUN_COST = None  # stop a run once its estimated cost reaches this many USD
+
+# Checkpoint settings
+CHECKPOINT_TURNS = 10  # duel turns between checkpoints (0 = disabled)
+CHECKPOINT_CYCLES = 1  # game loop cycles between checkpoints (0 = disabled)
+# Per mode: also `docker commit` the sandbox with each checkpoint (slow; one
+# image layer each). A duel's histories describe the container's state, so a
+# duel can't resume without one; the Game Loop resets its workspace every cycle.
+CHECKPOINT_SNAPSHOTS = {"duel": True, "gameloop": False}
+
+# Attempt budget settings (Game Loop)
+ADAPTIVE_BUDGET = True  # adjust the Taskmaster's max_attempts from past solve curves
+BUDGET_MIN_ATTEMPTS = 2
+BUDGET_MAX_ATTEMPTS = 30  # never extend a budget beyond this
+BUDGET_MIN_SAMPLES = 5  # past cycles needed at an attempt count before trusting it
+BUDGET_MIN_REMAINING_SOLVE_RATE = 0.1  # stop once fewer remaining tasks than this get solved
+BUDGET_HISTORY_CYCLES = 2000  # most recent stored cycles to learn from
+
+# Stall detection settings (Game Loop)
+STALL_DETECTION = True  # reuse verdicts for unchanged /app states and hint on repeats
+STALL_LIMIT = 3  # end the cycle after this many identical command + state outcomes
+
+# Taskmaster settings (Game Loop)
+TASKMASTER_HISTORY_CYCLES = 5  # cycle updates kept in the Taskmaster's history (0 = keep all)
+
+# Best-of-N Coder candidates (Game Loop)
+CODER_CANDIDATES = 1  # >1: sample this many commands per attempt, each run in its own sandbox fork
+
+# Speculative Coder requests (Game Loop)
+SPECULATIVE_CODER = False  # request the next Coder attempt while the Verifier judges the current one
+SPECULATIVE_REGENERATE_ABOVE = 60  # after a failure this complete, ask again with the Verifier's feedback
+
+# Workspace settings (Game Loop)
+TMPFS_WORKSPACE = False  # mount the workspace as size-limited tmpfs at container start
+# Mount point -> size limit. Add "/home/sandboxuser" to include the home
+# directory (the image's files there are hidden by the mount).
+TMPFS_MOUNTS = {"/app": "512m", "/tmp": "256m"}
+
+# Background job settings (`job start <command>` etc., see sandbox_jobs.py)
+JOBS_ENABLED = True
+JOB_DIR = "/var/tmp/jobs"  # inside the sandbox, outside the workspace that resets clear
+JOB_TIME_LIMIT = 600  # seconds before a job and everything it started are killed
+JOB_MEMORY_LIMIT_MB = 1024  # virtual memory limit for each process of a job
+JOB_MAX_RUNNING = 3  # jobs each agent may have running at once
+JOB_TAIL_LINES = 40  # lines `job tail <id>` shows by default
+
+# Docker host settings
+DOCKER_BINARY = "docker"  # docker CLI used for every sandbox operation
+# Endpoints sandboxes are spread over: DOCKER_HOST-style URLs ("ssh://user@host",
+# "tcp://host:2376") or socket paths; "" is the CLI's default daemon. New
+# sandboxes go to the host with the fewest running sandboxes per unit of weight.
+DOCKER_HOSTS = [{"url": "", "weight": 1}]
+DOCKER_DRAIN_PATH = "docker_drained.json"  # hosts taken out of rotation (python sandbox.py drain)
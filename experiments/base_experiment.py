@@ -4,5 +4,5 @@ from abc import ABC, abstractmethod
 
 class BaseExperiment(ABC):
     @abstractmethod
-    def run(self, ai_provider, model_name, rate_limiter, network_enabled, log_filename):
+    def run(self, ai_provider, model_name, rate_limiter, network_enabled, log_filename, checkpoint=None):
         pass
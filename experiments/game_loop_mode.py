@@ -1,116 +1,228 @@
 # experiments/game_loop_mode.py
 import time
 from experiments.base_experiment import BaseExperiment
-from sandbox import prepare_sandbox, execute_in_docker, execute_as_root
+from sandbox import prepare_sandbox, execute_as_root, reset_workspace, memo_stats, capture_app_state
+from gatekeeper import Gatekeeper
+from assertions import normalize_assertions, run_assertions
 from utils import log_and_print
+from run_logger import RunLogger
+from run_store import RunStore
 from prompts import (
     CODER_PROMPT_BASE,
     VERIFIER_PROMPT_BASE,
     TASKMASTER_PROMPT_BASE,
     NETWORK_ENABLED_ADDON,
     NETWORK_DISABLED_ADDON,
+    JOBS_ADDON,
 )
-from config import MAX_JSON_RETRIES
-
-
-def handle_privileged_command(
-    command: str, character_name: str, log_file, network_enabled: bool
-) -> str:
-    package_name, url, action_type, is_privileged, requires_network = (
-        "",
-        "",
-        "",
-        False,
-        False,
-    )
-    stripped_command = command.strip()
-    if stripped_command.startswith("apt-get") or stripped_command.startswith("apt "):
-        action_type, is_privileged, requires_network = (
-            "run a privileged apt command",
-            True,
-            True,
-        )
-        package_name = stripped_command
-    elif stripped_command.startswith("curl") or stripped_command.startswith("wget"):
-        action_type, is_privileged, requires_network = "download from", True, True
-        parts = stripped_command.split()
-        url = next(
-            (part for part in parts if part.startswith("http")), "an unknown URL"
-        )
-    if not is_privileged:
-        return execute_in_docker(command)
-    if requires_network and not network_enabled:
-        denial_message = (
-            "[GATEKEEPER] Request DENIED. Network access is disabled for this session."
-        )
-        log_and_print(f"\n{denial_message}", log_file)
-        return "STDOUT:\n\nSTDERR:\nGATEKEEPER: Your request was denied because network access is disabled."
-    prompt_text = f"\n[GATEKEEPER] {character_name} wants to {action_type} '{package_name or url}'. Allow? (y/n): "
-    log_and_print(prompt_text, log_file, end="")
-    while True:
-        decision = input().lower()
-        if decision in ["y", "yes"]:
-            log_and_print("y", log_file)
-            log_and_print("[GATEKEEPER] Request APPROVED. Executing...", log_file)
-            if action_type == "run a privileged apt command":
-                return execute_as_root(command)
-            else:
-                return execute_in_docker(command)
-        elif decision in ["n", "no"]:
-            log_and_print("n", log_file)
-            log_and_print("[GATEKEEPER] Request DENIED.", log_file)
-            return "STDOUT:\n\nSTDERR:\nGATEKEEPER: Your request was denied by the operator."
-        else:
-            print("Invalid input. Please enter 'y' or 'n'.")
+from config import (
+    MAX_JSON_RETRIES,
+    METRICS_TEXTFILE,
+    CHECKPOINT_CYCLES,
+    ADAPTIVE_BUDGET,
+    STALL_DETECTION,
+    CODER_CANDIDATES,
+    TMPFS_WORKSPACE,
+    TMPFS_MOUNTS,
+    JOBS_ENABLED,
+    SPECULATIVE_CODER,
+    TASKMASTER_HISTORY_CYCLES,
+)
+import metrics
+from checkpoint import save_checkpoint, discard_checkpoint, provider_name
+from attempt_budget import AttemptBudget
+from stall_detection import StallDetector
+from result_compaction import ResultCompactor
+from prompt_cache import reset_prompt_stats, prompt_stats, format_prompt_stats
+from token_usage import TokenLedger
+from model_routing import base_provider, describe_routes
+from coder_candidates import CandidateRunner
+from speculative_coder import SpeculativeCoder
+from sandbox_jobs import is_job_query
+
+
+def retry_context(stall_hint: str, coder_feedback: str, verifier_feedback: str = None) -> str:
+    # Fixed wording first, the attempt's output last. Speculative requests
+    # are made before the Verifier's feedback exists.
+    context = "Task is still not complete. Try a different approach. Provide your next solution as JSON."
+    if stall_hint:
+        context += f"\n\n{stall_hint}"
+    if verifier_feedback is not None:
+        context += f"\n\nVerifier feedback: {verifier_feedback}"
+    return context + f"\n\nYour previous attempt produced:\n{coder_feedback}"
+
+
+def trim_taskmaster_history(history: list, keep_cycles: int):
+    # Each update already summarizes recent statistics, so older exchanges
+    # only add tokens. Keep the system prompt and the last cycles' updates,
+    # starting on a user message (a failed call leaves no assistant reply).
+    if not keep_cycles:
+        return
+    del history[1:-2 * keep_cycles]
+    while len(history) > 1 and history[1]["role"] != "user":
+        del history[1]
 
 
 class GameLoopMode(BaseExperiment):
-    def __init__(self, max_cycles, initial_task):
+    def __init__(self, max_cycles, initial_task, initial_assertions=None):
         self.max_cycles = max_cycles
         self.initial_task = initial_task
+        self.initial_assertions = normalize_assertions(initial_assertions or [])
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: dict):
+        return cls(checkpoint["max_cycles"], checkpoint["initial_task"], checkpoint["initial_assertions"])
 
-    def run(self, ai_provider, model_name, rate_limiter, network_enabled, log_filename):
+    def run(self, ai_provider, model_name, rate_limiter, network_enabled, log_filename, checkpoint=None):
         CODER_PROMPT = CODER_PROMPT_BASE + (
             NETWORK_DISABLED_ADDON if not network_enabled else NETWORK_ENABLED_ADDON
         )
 
-        prepare_sandbox(network_enabled)
+        prepare_sandbox(
+            network_enabled,
+            image=checkpoint and checkpoint["snapshot_image"],
+            tmpfs=TMPFS_MOUNTS if TMPFS_WORKSPACE else None,
+        )
         time.sleep(2)
+        # A job would run in a candidate's fork and end when the fork is
+        # discarded, so Best-of-N attempts don't get background jobs.
+        gatekeeper = Gatekeeper(background_jobs=JOBS_ENABLED and CODER_CANDIDATES <= 1)
+        if gatekeeper.jobs:
+            CODER_PROMPT += JOBS_ADDON.format(
+                time_limit=gatekeeper.jobs.time_limit, max_running=gatekeeper.jobs.max_running
+            )
+        compactor = ResultCompactor()
+        reset_prompt_stats()
 
         # Create /app directory in the container
         execute_as_root("mkdir -p /app && chown sandboxuser:sandboxuser /app")
 
-        with open(log_filename, "w", encoding="utf-8") as log_file:
-            header = f"--- AI GAME LOOP: CODER + TASKMASTER + VERIFIER ---\nProvider: {ai_provider.__class__.__name__} | Model: {model_name} | Max Cycles: {self.max_cycles} | Network: {network_enabled}\nLogging to: {log_filename}\n"
-            log_and_print(header, log_file)
-
-            coder_history = [{"role": "system", "content": CODER_PROMPT}]
-            taskmaster_history = [
-                {
-                    "role": "system",
-                    "content": TASKMASTER_PROMPT_BASE.replace("{history}", ""),
-                }
-            ]
-            verifier_history = [{"role": "system", "content": VERIFIER_PROMPT_BASE}]
-
-            performance_history = []
-            current_task = self.initial_task
-            max_attempts = 10
+        provider_class = base_provider(ai_provider).__class__.__name__
 
-            log_and_print(f"\n{'='*20} CYCLE 0 (INITIALIZATION) {'='*20}", log_file)
-            log_and_print(f"📋 Initial Task: {current_task}", log_file)
-            log_and_print(f"🎯 Max Attempts: {max_attempts}", log_file)
+        # The run's row comes first: if the store fails, the transcript a
+        # RunLogger would truncate is still intact.
+        run_store = RunStore()
+        if checkpoint is None:
+            run_id = run_store.start_run("gameloop", provider_class, model_name, network_enabled, log_filename, self.max_cycles)
+        else:
+            run_id = checkpoint["run_id"]
+
+        with RunLogger(
+            log_filename, append=checkpoint is not None, truncate_to=checkpoint and checkpoint.get("log_offsets")
+        ) as log_file:
+            header = f"--- AI GAME LOOP: CODER + TASKMASTER + VERIFIER ---\nProvider: {provider_class} | Model: {model_name} | Max Cycles: {self.max_cycles} | Network: {network_enabled}\nLogging to: {log_filename}\n"
+            routes = describe_routes(ai_provider)
+            if routes:
+                header += routes + "\n"
+            if checkpoint is None:
+                log_and_print(header, log_file)
+                log_file.event(
+                    "run_start",
+                    mode="gameloop",
+                    provider=provider_class,
+                    model=model_name,
+                    max_cycles=self.max_cycles,
+                    network=network_enabled,
+                    stall_detection=STALL_DETECTION,
+                )
 
-            for cycle in range(1, self.max_cycles + 1):
+                coder_history = [{"role": "system", "content": CODER_PROMPT}]
+                taskmaster_history = [{"role": "system", "content": TASKMASTER_PROMPT_BASE}]
+                verifier_history = [{"role": "system", "content": VERIFIER_PROMPT_BASE}]
+
+                performance_history = []
+                current_task = self.initial_task
+                current_assertions = self.initial_assertions
+                current_difficulty = "unknown"
+                requested_attempts = 10
+                verifier_calls_saved = 0
+                start_cycle = 1
+
+                log_and_print(f"\n{'='*20} CYCLE 0 (INITIALIZATION) {'='*20}", log_file)
+                log_and_print(f"📋 Initial Task: {current_task}", log_file)
+                log_and_print(f"🎯 Max Attempts: {requested_attempts}", log_file)
+            else:
+                coder_history = checkpoint["coder_history"]
+                taskmaster_history = checkpoint["taskmaster_history"]
+                verifier_history = checkpoint["verifier_history"]
+                performance_history = checkpoint["performance_history"]
+                current_task = checkpoint["current_task"]
+                current_assertions = checkpoint["current_assertions"]
+                current_difficulty = checkpoint["current_difficulty"]
+                requested_attempts = checkpoint["requested_attempts"]
+                verifier_calls_saved = checkpoint["verifier_calls_saved"]
+                start_cycle = checkpoint["cycle"] + 1
+                run_store.rewind(run_id, cycle=start_cycle)
+                log_and_print(
+                    f"\n{'='*20} RESUMED FROM CHECKPOINT (cycle {checkpoint['cycle']}) {'='*20}",
+                    log_file,
+                )
+                log_file.event("run_resume", cycle=checkpoint["cycle"], snapshot=checkpoint["snapshot_image"])
+
+            ledger = TokenLedger(model_name, log_file, run_store, run_id)
+            if checkpoint is not None:
+                ledger.restore(checkpoint["token_usage"])
+            stop_reason = None
+            candidate_runner = None
+            if CODER_CANDIDATES > 1:
+                candidate_runner = CandidateRunner(
+                    ai_provider, gatekeeper, rate_limiter, ledger, log_file, network_enabled, CODER_CANDIDATES
+                )
+            speculator = None
+            if SPECULATIVE_CODER and candidate_runner is None:
+                speculator = SpeculativeCoder(ai_provider, rate_limiter)
+            stall_detector = StallDetector() if STALL_DETECTION else None
+            attempt_budget = None
+            if ADAPTIVE_BUDGET:
+                attempt_budget = AttemptBudget(model_name, run_store, exclude_run_id=run_id)
+                for record in performance_history:
+                    attempt_budget.record(record["difficulty"], record["attempts"], record["solved"])
+
+            for cycle in range(start_cycle, self.max_cycles + 1):
                 cycle_header = f"\n{'='*25} CYCLE {cycle}/{self.max_cycles} {'='*25}"
                 log_and_print(cycle_header, log_file)
                 log_and_print(f"📋 Current Task: {current_task}", log_file)
+                max_attempts = requested_attempts
+                if attempt_budget is not None:
+                    max_attempts, budget_decision = attempt_budget.allocate(
+                        current_difficulty, requested_attempts
+                    )
+                    if max_attempts != budget_decision["requested"]:
+                        calls_saved = budget_decision["expected_calls_saved"]
+                        log_and_print(
+                            f"💰 Attempt budget: {budget_decision['requested']} requested -> {max_attempts} "
+                            f"({budget_decision['samples']} past '{current_difficulty}' cycles; "
+                            f"~{abs(calls_saved):.1f} {'fewer' if calls_saved >= 0 else 'more'} LLM calls expected, "
+                            f"solve rate {budget_decision['solve_rate_requested']:.0%} -> {budget_decision['solve_rate_budget']:.0%})",
+                            log_file,
+                        )
+                    log_file.event("budget", cycle=cycle, **budget_decision)
                 log_and_print(f"🎯 Max Attempts Allowed: {max_attempts}", log_file)
+                if current_assertions:
+                    log_and_print(
+                        f"🧪 Assertions: {len(current_assertions)} automated check(s)",
+                        log_file,
+                    )
+                log_file.event(
+                    "cycle_start",
+                    cycle=cycle,
+                    task=current_task,
+                    max_attempts=max_attempts,
+                    assertions=current_assertions,
+                )
+                cycle_start = time.monotonic()
 
                 attempts = 0
                 task_solved = False
-                coder_result = ""
+                stalled = False
+                coder_feedback = ""
                 verifier_verdict = {}
+                stall_hint = ""
+                speculation = None
+                if stall_detector is not None:
+                    stall_detector.reset()
+                if speculator is not None:
+                    speculator.reset()
 
                 while attempts < max_attempts and not task_solved:
                     attempts += 1
@@ -122,55 +234,222 @@ class GameLoopMode(BaseExperiment):
                     if attempts == 1:
                         context = f"Task: {current_task}\n\nProvide your solution as a JSON object with 'thoughts' and 'command'."
                     else:
-                        context = f"Your previous attempt produced:\n{coder_result}\n\nVerifier feedback: {verifier_verdict.get('feedback', '')}\n\nTask is still not complete. Try a different approach. Provide your next solution as JSON."
+                        context = retry_context(stall_hint, coder_feedback, verifier_verdict.get("feedback", ""))
 
+                    candidate_round = None
                     retries = 0
-                    while retries < MAX_JSON_RETRIES:
-                        rate_limiter.wait()
-                        coder_thoughts, coder_command = ai_provider.get_ai_action(
+                    llm_start = time.monotonic()
+                    speculative = speculation is not None
+                    if speculative:
+                        # Requested while the Verifier judged the previous
+                        # attempt; only the wait after the verdict counts.
+                        coder_history[:] = speculation["history"]
+                        coder_thoughts, coder_command = speculation["thoughts"], speculation["command"]
+                        llm_start -= speculation["waited"]
+                        speculation = None
+                    elif candidate_runner is not None:
+                        candidates, retries = candidate_runner.sample(coder_history, context, cycle, attempts)
+                    else:
+                        while retries < MAX_JSON_RETRIES:
+                            rate_limiter.wait("coder")
+                            coder_thoughts, coder_command = ai_provider.get_ai_action(
+                                coder_history,
+                                context,
+                                thinking_enabled=(
+                                    ai_provider.__class__.__name__ == "GeminiProvider"
+                                ),
+                                role="coder",
+                            )
+                            ledger.add("coder", ai_provider.take_usage(), turn=attempts, cycle=cycle)
+
+                            if not coder_command and "Error:" in coder_thoughts:
+                                retries += 1
+                                metrics.inc("json_retries_total", role="coder")
+                                log_and_print(
+                                    f"🤖 Coder's response was invalid. Retrying ({retries}/{MAX_JSON_RETRIES})...",
+                                    log_file,
+                                )
+                                context = "(user) Your previous response was not valid JSON. Review the format and try again."
+                                if retries == MAX_JSON_RETRIES:
+                                    coder_command = "echo 'JSON formatting error'"
+                                    log_and_print(
+                                        "🤖 Coder failed to produce valid JSON.", log_file
+                                    )
+                            else:
+                                break
+
+                    llm_duration = time.monotonic() - llm_start
+                    metrics.observe("phase_duration_seconds", llm_duration, phase="agent_action", role="coder")
+                    if candidate_runner is not None:
+                        candidate_round, candidate_outcomes = candidate_runner.run(
+                            candidates,
                             coder_history,
-                            context,
-                            thinking_enabled=(
-                                ai_provider.__class__.__name__ == "GeminiProvider"
-                            ),
+                            current_task,
+                            current_assertions,
+                            verifier_history,
+                            stall_detector,
+                            cycle,
+                            attempts,
                         )
-                        rate_limiter.add_request()
-
-                        if not coder_command and "Error:" in coder_thoughts:
-                            retries += 1
+                        coder_thoughts, coder_command = candidate_round["thoughts"], candidate_round["command"]
+                        for outcome in sorted(candidate_outcomes, key=lambda o: o["index"]):
                             log_and_print(
-                                f"🤖 Coder's response was invalid. Retrying ({retries}/{MAX_JSON_RETRIES})...",
+                                f"🎲 Candidate {outcome['index'] + 1}: {'✅' if outcome['verdict']['success'] else '❌'} "
+                                f"{outcome['verdict'].get('completion_percentage', 0)}% ({outcome['source']}) "
+                                f"`{outcome['command']}`{' <- adopted' if outcome is candidate_round else ''}",
                                 log_file,
                             )
-                            context = "(user) Your previous response was not valid JSON. Review the format and try again."
-                            if retries == MAX_JSON_RETRIES:
-                                coder_command = "echo 'JSON formatting error'"
-                                log_and_print(
-                                    "🤖 Coder failed to produce valid JSON.", log_file
-                                )
-                        else:
-                            break
-
+                        log_file.event(
+                            "candidates",
+                            cycle=cycle,
+                            attempt=attempts,
+                            adopted=candidate_round["index"],
+                            candidates=[
+                                {
+                                    "index": outcome["index"],
+                                    "command": outcome["command"],
+                                    "success": outcome["verdict"]["success"],
+                                    "completion_percentage": outcome["verdict"].get("completion_percentage"),
+                                    "source": outcome["source"],
+                                    "forked": outcome["fork"] is not None,
+                                }
+                                for outcome in candidate_outcomes
+                            ],
+                        )
                     log_and_print(f"💭 Coder's Thoughts: {coder_thoughts}", log_file)
                     log_and_print(f"⚡ Coder's Command: `{coder_command}`", log_file)
-
-                    coder_result = handle_privileged_command(
-                        coder_command, "Coder", log_file, network_enabled
+                    log_file.event(
+                        "action",
+                        cycle=cycle,
+                        attempt=attempts,
+                        role="coder",
+                        phase="llm",
+                        thoughts=coder_thoughts,
+                        command=coder_command,
+                        retries=retries,
+                        speculative=speculative,
+                        duration=round(llm_duration, 4),
                     )
-                    log_and_print(f"🖥️  Result:\n{coder_result}", log_file)
 
-                    sandbox_state = execute_in_docker(
-                        "ls -la /app/ 2>/dev/null && echo '--- FILE CONTENTS ---' && find /app -type f -exec echo '=== {} ===' \\; -exec cat {} \\; 2>/dev/null"
+                    if candidate_round is not None:
+                        coder_result, exec_duration = candidate_round["result"], candidate_round["exec_seconds"]
+                    else:
+                        exec_start = time.monotonic()
+                        coder_result = gatekeeper.handle(
+                            coder_command, "Coder", log_file, network_enabled
+                        )
+                        exec_duration = time.monotonic() - exec_start
+                    log_and_print(f"🖥️  Result:\n{coder_result}", log_file)
+                    log_file.event(
+                        "command_result",
+                        cycle=cycle,
+                        attempt=attempts,
+                        role="coder",
+                        phase="exec",
+                        command=coder_command,
+                        result=coder_result,
+                        result_size=len(coder_result),
+                        duration=round(exec_duration, 4),
                     )
+                    coder_feedback = compactor.compact("coder", coder_command, coder_result)
+                    if speculator is not None:
+                        speculator.observe(coder_command)
+
+                    # Decisive automated checks make the /app listing moot:
+                    # only the Verifier and stall detection read it.
+                    assertion_verdict = None
+                    if candidate_round is not None:
+                        sandbox_state = candidate_round["sandbox_state"]
+                    else:
+                        assertions_start = time.monotonic()
+                        assertion_verdict = run_assertions(current_assertions)
+                        assertions_duration = time.monotonic() - assertions_start
+                        sandbox_state = None
+                        if assertion_verdict is None:
+                            with metrics.span("state_capture"):
+                                sandbox_state = capture_app_state()
+
+                    observation = None
+                    if stall_detector is not None:
+                        # Polling a job only counts as a repeat if it reports
+                        # the same thing again.
+                        stall_command = f"{coder_command}\n{coder_result}" if is_job_query(coder_command) else coder_command
+                        observation = stall_detector.observe(stall_command, sandbox_state)
+                        stall_hint = stall_detector.hint(observation)
+                        if stall_hint:
+                            metrics.inc("stall_repeats_total", kind="state" if observation["unchanged_state"] else "command")
+                            log_and_print(
+                                f"🔁 Repeat detected (this command and /app state seen {observation['repeats']}x); hinting Coder to change approach.",
+                                log_file,
+                            )
 
-                    log_and_print("\n--- 🔍 VERIFIER CHECKING ---", log_file)
-                    rate_limiter.wait()
-                    verifier_verdict = ai_provider.get_verifier_verdict(
-                        verifier_history,
-                        current_task,
-                        sandbox_state,
-                    )
-                    rate_limiter.add_request()
+                    if candidate_round is not None:
+                        verifier_verdict = candidate_round["verdict"]
+                        verdict_source = candidate_round["source"]
+                        verify_duration = candidate_round["verify_seconds"]
+                        verifier_calls_saved += candidate_round["calls_saved"]
+                        log_and_print(
+                            f"\n--- 🎲 VERDICT FROM CANDIDATE {candidate_round['index'] + 1} ({verdict_source}) ---",
+                            log_file,
+                        )
+                    else:
+                        verify_start = time.monotonic()
+                        verifier_verdict = assertion_verdict
+                        verdict_source = "assertions"
+                        if verifier_verdict is None and observation is not None:
+                            verifier_verdict = stall_detector.cached_verdict(observation["state_key"])
+                            verdict_source = "reused"
+                        if verifier_verdict is not None:
+                            if verdict_source == "assertions":
+                                log_and_print(
+                                    "\n--- 🧪 AUTOMATED CHECKS DECIDED (Verifier skipped) ---",
+                                    log_file,
+                                )
+                            else:
+                                log_and_print(
+                                    "\n--- ♻️ SANDBOX STATE UNCHANGED (previous verdict reused) ---",
+                                    log_file,
+                                )
+                            verifier_calls_saved += 1
+                        else:
+                            log_and_print("\n--- 🔍 VERIFIER CHECKING ---", log_file)
+                            if (
+                                speculator is not None
+                                and attempts < max_attempts
+                                and not (observation is not None and observation["stalled"])
+                            ):
+                                speculator.start(coder_history, retry_context(stall_hint, coder_feedback))
+                            rate_limiter.wait("verifier")
+                            verifier_verdict = ai_provider.get_verifier_verdict(
+                                verifier_history,
+                                current_task,
+                                sandbox_state,
+                            )
+                            ledger.add("verifier", ai_provider.take_usage(), turn=attempts, cycle=cycle)
+                            verdict_source = "llm"
+                            if observation is not None and not verifier_verdict["feedback"].startswith(
+                                ("Error:", "Verifier error")
+                            ):
+                                stall_detector.remember_verdict(observation["state_key"], verifier_verdict)
+                        verify_duration = assertions_duration + time.monotonic() - verify_start
+                    metrics.observe("phase_duration_seconds", verify_duration, phase="verify", source=verdict_source)
+                    if speculator is not None:
+                        speculation = speculator.resolve(verifier_verdict)
+                        if speculation is not None:
+                            ledger.add("coder", speculation["usage"], turn=attempts + 1, cycle=cycle)
+                            log_file.event(
+                                "speculation",
+                                cycle=cycle,
+                                attempt=attempts + 1,
+                                result=speculation["result"],
+                                command=speculation["command"],
+                                duration=round(speculation["duration"], 4),
+                                waited=round(speculation["waited"], 4),
+                            )
+                            if not speculation["used"]:
+                                speculation = None
+                        for usage in speculator.collect():
+                            ledger.add("coder", usage, cycle=cycle)
 
                     log_and_print(
                         f"✅ Success: {verifier_verdict['success']}", log_file
@@ -182,21 +461,62 @@ class GameLoopMode(BaseExperiment):
                     log_and_print(
                         f"💬 Feedback: {verifier_verdict['feedback']}", log_file
                     )
+                    log_file.event(
+                        "verdict",
+                        cycle=cycle,
+                        attempt=attempts,
+                        role="verifier",
+                        phase="verify",
+                        source=verdict_source,
+                        success=verifier_verdict["success"],
+                        completion_percentage=verifier_verdict["completion_percentage"],
+                        feedback=verifier_verdict["feedback"],
+                        state_size=len(sandbox_state) if sandbox_state is not None else None,
+                        duration=round(verify_duration, 4),
+                    )
+                    run_store.record_turn(
+                        run_id,
+                        attempts,
+                        "coder",
+                        coder_command,
+                        len(coder_result),
+                        retries=retries,
+                        llm_seconds=llm_duration,
+                        exec_seconds=exec_duration,
+                        verify_seconds=verify_duration,
+                        cycle=cycle,
+                    )
 
                     if verifier_verdict["success"]:
                         task_solved = True
                         break
 
+                    if observation is not None and observation["stalled"]:
+                        stalled = True
+                        metrics.inc("stalled_cycles_total")
+                        log_and_print(
+                            f"\n🛑 Coder stalled: the same command and /app state came up {observation['repeats']} times. Ending the cycle early.",
+                            log_file,
+                        )
+                        log_file.event("stall", cycle=cycle, attempt=attempts, repeats=observation["repeats"])
+                        break
+
+                    stop_reason = ledger.exceeded()
+                    if stop_reason:
+                        break
+
                     time.sleep(0.5)
 
                 attempt_percentage = (attempts / max_attempts) * 100
                 performance_record = {
                     "cycle": cycle,
                     "task": current_task,
+                    "difficulty": current_difficulty,
                     "attempts": attempts,
                     "max_attempts": max_attempts,
                     "attempt_percentage": attempt_percentage,
                     "solved": task_solved,
+                    "stalled": stalled,
                     "completion_percentage": (
                         verifier_verdict.get("completion_percentage", 0)
                         if not task_solved
@@ -204,16 +524,38 @@ class GameLoopMode(BaseExperiment):
                     ),
                 }
                 performance_history.append(performance_record)
+                if attempt_budget is not None:
+                    attempt_budget.record(current_difficulty, attempts, task_solved)
+                cycle_duration = time.monotonic() - cycle_start
+                log_file.event(
+                    "cycle_end",
+                    duration=round(cycle_duration, 4),
+                    **performance_record,
+                )
+                run_store.record_cycle(
+                    run_id,
+                    cycle,
+                    current_task,
+                    current_difficulty,
+                    attempts,
+                    max_attempts,
+                    task_solved,
+                    performance_record["completion_percentage"],
+                    duration_seconds=cycle_duration,
+                )
 
-                history_summary = "PERFORMANCE HISTORY:\n"
-                for i, record in enumerate(performance_history[-5:], 1):
-                    status = "✅ SOLVED" if record["solved"] else "❌ FAILED"
-                    history_summary += f"\nCycle {record['cycle']}: {status}\n"
-                    history_summary += f"  Task: {record['task']}\n"
-                    history_summary += f"  Attempts: {record['attempts']}/{record['max_attempts']} ({record['attempt_percentage']:.1f}%)\n"
-                    history_summary += (
-                        f"  Completion: {record['completion_percentage']}%\n"
-                    )
+                # Earlier cycles are already in the Taskmaster's conversation,
+                # so only this one is sent. Re-sending the full prompt and the
+                # last five cycles meant evaluating all of it again each cycle.
+                status = "✅ SOLVED" if task_solved else "❌ FAILED"
+                if stalled:
+                    status += " (stalled: kept repeating the same attempt)"
+                history_summary = f"Cycle {cycle}: {status}\n"
+                history_summary += f"  Task: {current_task}\n"
+                history_summary += f"  Attempts: {attempts}/{max_attempts} ({attempt_percentage:.1f}%)\n"
+                history_summary += (
+                    f"  Completion: {performance_record['completion_percentage']}%\n"
+                )
 
                 recent_success_rate = (
                     sum(1 for r in performance_history[-3:] if r["solved"])
@@ -235,18 +577,37 @@ class GameLoopMode(BaseExperiment):
                         f"\n🎉 Task SOLVED in {attempts}/{max_attempts} attempts ({attempt_percentage:.1f}%)!",
                         log_file,
                     )
+                elif stalled:
+                    log_and_print(
+                        f"\n❌ Task FAILED after {attempts} attempts (stalled).", log_file
+                    )
                 else:
                     log_and_print(
                         f"\n❌ Task FAILED after {attempts} attempts.", log_file
                     )
 
+                stop_reason = stop_reason or ledger.exceeded()
+                if stop_reason:
+                    log_and_print(f"\n💸 Stopping the run: {stop_reason}.", log_file)
+                    break
+
                 log_and_print("\n--- 🎓 TASKMASTER GENERATING NEXT TASK ---", log_file)
 
-                rate_limiter.wait()
+                taskmaster_start = time.monotonic()
+                rate_limiter.wait("taskmaster")
                 taskmaster_response = ai_provider.get_taskmaster_task(
                     taskmaster_history, history_summary
                 )
-                rate_limiter.add_request()
+                ledger.add("taskmaster", ai_provider.take_usage(), cycle=cycle)
+                trim_taskmaster_history(taskmaster_history, TASKMASTER_HISTORY_CYCLES)
+                log_file.event(
+                    "task",
+                    cycle=cycle,
+                    role="taskmaster",
+                    phase="llm",
+                    response=taskmaster_response,
+                    duration=round(time.monotonic() - taskmaster_start, 4),
+                )
 
                 if taskmaster_response is None:
                     log_and_print(
@@ -255,27 +616,71 @@ class GameLoopMode(BaseExperiment):
                     new_task = (
                         "Create a file /app/output.txt with the current timestamp"
                     )
-                    max_attempts = 15
+                    new_assertions = [{"type": "file_exists", "path": "/app/output.txt"}]
+                    new_difficulty = "trivial"
+                    requested_attempts = 15
                 else:
                     new_task = taskmaster_response["task"]
-                    max_attempts = taskmaster_response["max_attempts"]
+                    new_assertions = normalize_assertions(
+                        taskmaster_response["assertions"]
+                    )
+                    new_difficulty = taskmaster_response["expected_difficulty"]
+                    requested_attempts = taskmaster_response["max_attempts"]
                     log_and_print(f"📝 Next Task: {new_task}", log_file)
                     log_and_print(
                         f"🎯 Difficulty: {taskmaster_response['expected_difficulty']}",
                         log_file,
                     )
-                    log_and_print(f"🔢 Max Attempts: {max_attempts}", log_file)
+                    log_and_print(f"🔢 Max Attempts: {requested_attempts}", log_file)
                     log_and_print(
                         f"💡 Reasoning: {taskmaster_response['reasoning']}", log_file
                     )
 
                 current_task = new_task
-                execute_in_docker("rm -rf /app/*")
+                current_assertions = new_assertions
+                current_difficulty = new_difficulty
+                if gatekeeper.jobs:
+                    gatekeeper.jobs.kill_all()
+                reset_workspace()
+
+                if CHECKPOINT_CYCLES and cycle % CHECKPOINT_CYCLES == 0 and cycle < self.max_cycles:
+                    checkpoint_path = save_checkpoint(
+                        log_filename,
+                        {
+                            "mode": "gameloop",
+                            "provider": provider_name(ai_provider),
+                            "model": model_name,
+                            "seed": getattr(ai_provider, "seed", None),
+                            "network": network_enabled,
+                            "max_cycles": self.max_cycles,
+                            "initial_task": self.initial_task,
+                            "initial_assertions": self.initial_assertions,
+                            "run_id": run_id,
+                            "cycle": cycle,
+                            "coder_history": coder_history,
+                            "taskmaster_history": taskmaster_history,
+                            "verifier_history": verifier_history,
+                            "performance_history": performance_history,
+                            "current_task": current_task,
+                            "current_assertions": current_assertions,
+                            "current_difficulty": current_difficulty,
+                            "requested_attempts": requested_attempts,
+                            "verifier_calls_saved": verifier_calls_saved,
+                            "token_usage": ledger.state(),
+                            "rate_limiter": rate_limiter.state(),
+                            "log_offsets": log_file.sync(),
+                        },
+                    )
+                    if checkpoint_path:
+                        log_and_print(f"💾 Checkpoint saved: {checkpoint_path}", log_file)
                 time.sleep(1)
 
             game_over_header = f"\n{'='*28} TRAINING COMPLETE {'='*28}"
             log_and_print(game_over_header, log_file)
-            log_and_print(f"🏁 Completed {self.max_cycles} training cycles.", log_file)
+            if stop_reason:
+                log_and_print(f"💸 Stopped after {len(performance_history)} training cycles: {stop_reason}.", log_file)
+            else:
+                log_and_print(f"🏁 Completed {self.max_cycles} training cycles.", log_file)
 
             total_solved = sum(1 for r in performance_history if r["solved"])
             success_rate = (total_solved / len(performance_history)) * 100
@@ -284,3 +689,58 @@ class GameLoopMode(BaseExperiment):
                 f"  Tasks solved: {total_solved}/{len(performance_history)} ({success_rate:.1f}%)",
                 log_file,
             )
+            log_and_print(
+                f"  Verifier calls saved (automated checks, reused verdicts): {verifier_calls_saved}",
+                log_file,
+            )
+            budget_calls_saved = attempt_budget.expected_calls_saved if attempt_budget else 0.0
+            if attempt_budget is not None:
+                log_and_print(
+                    f"  Attempt budgets changed: {attempt_budget.decisions} "
+                    f"(~{budget_calls_saved:.1f} LLM calls saved, expected)",
+                    log_file,
+                )
+            if candidate_runner is not None:
+                log_and_print(f"🎲 Coder candidates: {candidate_runner.summary()}", log_file)
+            if speculator is not None:
+                for usage in speculator.close():
+                    ledger.add("coder", usage, cycle=cycle)
+                log_and_print(f"⚡ Speculative Coder: {speculator.summary()}", log_file)
+            if getattr(ai_provider, "escalation", None):
+                log_and_print(f"  Verifier escalation: {ai_provider.summary()}", log_file)
+            log_and_print(ledger.summary(), log_file)
+            usage_totals = ledger.totals()
+            log_file.event(
+                "run_end",
+                cycles=len(performance_history),
+                solved=total_solved,
+                verifier_calls_saved=verifier_calls_saved,
+                budget_calls_saved=round(budget_calls_saved, 2),
+                tokens=usage_totals["tokens"],
+                cost=round(usage_totals["cost"], 6),
+                stop_reason=stop_reason,
+            )
+            run_store.finish_run(run_id, "stopped" if stop_reason else "completed")
+            run_store.close()
+            discard_checkpoint(log_filename)
+
+            metrics.write_textfile(METRICS_TEXTFILE)
+            log_and_print(f"\n⏱️  PHASE TIMINGS:\n{metrics.format_summary()}", log_file)
+            if compactor.enabled:
+                log_and_print(f"✂️  Result compaction: {compactor.summary()}", log_file)
+            prompts_used = prompt_stats()
+            if prompts_used:
+                log_and_print(f"🧠 Prompt prefix reuse: {format_prompt_stats(prompts_used)}", log_file)
+            memo = memo_stats()
+            if memo["lookups"]:
+                log_and_print(
+                    f"🗂️  Sandbox memo: {memo['hits']}/{memo['lookups']} read-only commands served from cache ({memo['hit_rate']:.0%})",
+                    log_file,
+                )
+
+        return {
+            "cycles": len(performance_history),
+            "solved": total_solved,
+            "tokens": usage_totals["tokens"],
+            "cost": usage_totals["cost"],
+        }
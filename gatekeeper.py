@@ -0,0 +1,327 @@
+# gatekeeper.py
+#
+# Policy-based approval of privileged agent commands, shared by all
+# experiments. Operators answer "ask" decisions on the console (interactive
+# runs) or through the approval queue directory (any run, including
+# headless batch jobs):
+#
+#   python gatekeeper.py pending
+#   python gatekeeper.py allow <request_id>
+#   python gatekeeper.py deny <request_id>
+import argparse
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+import metrics
+from sandbox import execute_in_docker, execute_as_root
+from sandbox_jobs import JobManager, JOB_COMMAND
+from config import (
+    GATEKEEPER_POLICY_PATH,
+    GATEKEEPER_QUEUE_DIR,
+    GATEKEEPER_APPROVAL_TIMEOUT,
+    GATEKEEPER_TIMEOUT_ACTION,
+    JOBS_ENABLED,
+)
+from utils import log_and_print
+
+ACTIONS = ("allow", "deny", "ask")
+QUEUE_POLL_INTERVAL = 0.5
+
+DEFAULT_POLICY = {
+    "default": "allow",
+    "rules": [
+        {
+            "pattern": r"^\s*(apt-get|apt|curl|wget)\b",
+            "network": False,
+            "action": "deny",
+            "reason": "network access is disabled",
+        },
+        {
+            "pattern": r"^\s*(apt-get|apt)\s",
+            "action": "ask",
+            "run_as": "root",
+            "description": "run a privileged apt command",
+        },
+        {
+            "pattern": r"^\s*(curl|wget)\b",
+            "action": "ask",
+            "description": "download from",
+        },
+    ],
+}
+
+
+def load_policy(path: str = GATEKEEPER_POLICY_PATH) -> dict:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as policy_file:
+            return json.load(policy_file)
+    return DEFAULT_POLICY
+
+
+def compile_policy(policy: dict) -> list:
+    rules = []
+    for rule in policy.get("rules", []):
+        if rule.get("action") not in ACTIONS:
+            raise ValueError(f"Gatekeeper rule has invalid action: {rule}")
+        compiled = dict(rule)
+        compiled["regex"] = re.compile(rule["pattern"])
+        compiled["roles"] = {r.lower() for r in rule.get("roles", [])}
+        rules.append(compiled)
+    return rules
+
+
+class _ConsoleReader:
+    # A single daemon thread owns stdin so approval prompts can time out
+    # instead of blocking in input() forever.
+
+    def __init__(self):
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in sys.stdin:
+            self.lines.put(line.strip().lower())
+        self.lines.put(None)
+
+    def readline(self, timeout: float):
+        try:
+            return self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return ""
+
+
+_console = None
+_console_lock = threading.Lock()
+
+
+def _get_console():
+    global _console
+    with _console_lock:
+        if _console is None:
+            _console = _ConsoleReader()
+        return _console
+
+
+class ApprovalQueue:
+    def __init__(self, directory: str = GATEKEEPER_QUEUE_DIR):
+        self.directory = directory
+
+    def _path(self, request_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{request_id}.{suffix}")
+
+    def submit(self, request: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        request_id = uuid.uuid4().hex[:8]
+        with open(self._path(request_id, "request.json"), "w", encoding="utf-8") as request_file:
+            json.dump(dict(request, id=request_id, submitted_at=time.time()), request_file)
+        return request_id
+
+    def decision(self, request_id: str) -> str:
+        try:
+            with open(self._path(request_id, "decision"), encoding="utf-8") as decision_file:
+                return decision_file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def decide(self, request_id: str, action: str):
+        if not os.path.exists(self._path(request_id, "request.json")):
+            raise ValueError(f"No pending request '{request_id}'")
+        with open(self._path(request_id, "decision"), "w", encoding="utf-8") as decision_file:
+            decision_file.write(action)
+
+    def close(self, request_id: str):
+        for suffix in ("request.json", "decision"):
+            try:
+                os.remove(self._path(request_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def pending(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        requests = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".request.json"):
+                request_id = name[: -len(".request.json")]
+                if self.decision(request_id) is None:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as request_file:
+                        requests.append(json.load(request_file))
+        return requests
+
+
+class Gatekeeper:
+    def __init__(
+        self,
+        policy: dict = None,
+        approval_timeout: float = None,
+        timeout_action: str = None,
+        interactive: bool = None,
+        approval_queue: ApprovalQueue = None,
+        background_jobs: bool = None,
+    ):
+        policy = policy or load_policy()
+        self.rules = compile_policy(policy)
+        self.default_action = policy.get("default", "allow")
+        self.approval_timeout = (
+            approval_timeout
+            if approval_timeout is not None
+            else policy.get("approval_timeout", GATEKEEPER_APPROVAL_TIMEOUT)
+        )
+        self.timeout_action = timeout_action or policy.get("timeout_action", GATEKEEPER_TIMEOUT_ACTION)
+        self.interactive = sys.stdin.isatty() if interactive is None else interactive
+        self.approval_queue = approval_queue or ApprovalQueue()
+        self.decision_cache = {}
+        self._ask_lock = threading.Lock()
+        background_jobs = JOBS_ENABLED if background_jobs is None else background_jobs
+        self.jobs = JobManager() if background_jobs else None
+
+    def evaluate(self, command: str, role: str, network_enabled: bool) -> dict:
+        stripped_command = command.strip()
+        for rule in self.rules:
+            if rule["roles"] and role.lower() not in rule["roles"]:
+                continue
+            if "network" in rule and rule["network"] != network_enabled:
+                continue
+            if rule["regex"].search(stripped_command):
+                return rule
+        return {"action": self.default_action}
+
+    def _ask(self, request: dict, character_name: str, log_file) -> (str, str):
+        request_id = self.approval_queue.submit(request)
+        target = request["target"]
+        prompt_text = (
+            f"\n[GATEKEEPER] {character_name} wants to {request['description']} '{target}'. "
+            f"Allow? (y/n, default '{self.timeout_action}' in {self.approval_timeout:.0f}s, request {request_id}): "
+        )
+        log_and_print(prompt_text, log_file, end="")
+
+        deadline = time.monotonic() + self.approval_timeout
+        console = _get_console() if self.interactive else None
+        try:
+            with metrics.span("gatekeeper_approval", role=character_name.lower()):
+                while time.monotonic() < deadline:
+                    decision = self.approval_queue.decision(request_id)
+                    if decision in ("allow", "deny"):
+                        log_and_print(decision, log_file)
+                        return decision, "queue"
+                    wait = min(QUEUE_POLL_INTERVAL, max(0.0, deadline - time.monotonic()))
+                    if console is None:
+                        time.sleep(wait)
+                        continue
+                    answer = console.readline(wait)
+                    if answer is None:
+                        console = None
+                    elif answer in ("y", "yes"):
+                        log_and_print("y", log_file)
+                        return "allow", "operator"
+                    elif answer in ("n", "no"):
+                        log_and_print("n", log_file)
+                        return "deny", "operator"
+                    elif answer:
+                        print("Invalid input. Please enter 'y' or 'n'.")
+        finally:
+            self.approval_queue.close(request_id)
+
+        log_and_print(f"(timed out -> {self.timeout_action})", log_file)
+        return self.timeout_action, "timeout"
+
+    def handle(self, command: str, character_name: str, log_file, network_enabled: bool) -> str:
+        job = JOB_COMMAND.match(command) if self.jobs else None
+        if job and job["action"] != "start":
+            return self.jobs.run(job["action"], job["argument"], character_name.lower())
+        if job:
+            # `job start X` is subject to the same policy as running X.
+            command = job["argument"]
+
+        rule = self.evaluate(command, character_name, network_enabled)
+        action, source = rule["action"], "policy"
+
+        if action == "ask":
+            # Parallel Coder candidates may ask at the same time; one prompt at
+            # a time, and a repeated request reuses the answer just given.
+            with self._ask_lock:
+                stripped_command = command.strip()
+                cache_key = (stripped_command, character_name.lower(), network_enabled)
+                if cache_key in self.decision_cache:
+                    action, source = self.decision_cache[cache_key], "cache"
+                    log_and_print(
+                        f"\n[GATEKEEPER] Reusing earlier decision for {character_name}: {action.upper()}.",
+                        log_file,
+                    )
+                else:
+                    target = stripped_command
+                    if rule.get("description") == "download from":
+                        target = next(
+                            (part for part in stripped_command.split() if part.startswith("http")),
+                            "an unknown URL",
+                        )
+                    request = {
+                        "role": character_name,
+                        "command": stripped_command,
+                        "description": rule.get("description", "run"),
+                        "target": target,
+                        "network": network_enabled,
+                    }
+                    action, source = self._ask(request, character_name, log_file)
+                    if source != "timeout":
+                        self.decision_cache[cache_key] = action
+
+        metrics.inc("gatekeeper_decisions_total", action=action, source=source)
+        if hasattr(log_file, "event") and (source != "policy" or action != "allow"):
+            log_file.event(
+                "gatekeeper",
+                role=character_name.lower(),
+                command=command,
+                action=action,
+                source=source,
+            )
+
+        if action == "allow":
+            if source != "policy":
+                log_and_print("[GATEKEEPER] Request APPROVED. Executing...", log_file)
+            if job:
+                return self.jobs.start(command.strip(), character_name.lower(), run_as=rule.get("run_as"))
+            if rule.get("run_as") == "root":
+                return execute_as_root(command)
+            return execute_in_docker(command)
+
+        if source == "policy":
+            reason = rule.get("reason", "it is not allowed by the gatekeeper policy")
+            log_and_print(f"\n[GATEKEEPER] Request DENIED. {reason[0].upper()}{reason[1:]}.", log_file)
+            return f"STDOUT:\n\nSTDERR:\nGATEKEEPER: Your request was denied because {reason}."
+        log_and_print("[GATEKEEPER] Request DENIED.", log_file)
+        if source == "timeout":
+            return "STDOUT:\n\nSTDERR:\nGATEKEEPER: Your request was denied because no operator approved it in time."
+        return "STDOUT:\n\nSTDERR:\nGATEKEEPER: Your request was denied by the operator."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer queued gatekeeper approval requests.")
+    parser.add_argument("--queue-dir", default=GATEKEEPER_QUEUE_DIR)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("pending", help="List requests waiting for a decision.")
+    for action in ("allow", "deny"):
+        action_parser = subcommands.add_parser(action, help=f"{action.capitalize()} a queued request.")
+        action_parser.add_argument("request_id")
+    args = parser.parse_args()
+
+    approval_queue = ApprovalQueue(args.queue_dir)
+    if args.command == "pending":
+        requests = approval_queue.pending()
+        if not requests:
+            print("No pending requests.")
+        for request in requests:
+            age = time.time() - request["submitted_at"]
+            print(f"{request['id']}  {request['role']:<9} {age:>5.0f}s  {request['description']} '{request['target']}'")
+    else:
+        approval_queue.decide(args.request_id, args.command)
+        print(f"Request {args.request_id}: {args.command}")
+
+
+if __name__ == "__main__":
+    main()
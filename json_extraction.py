@@ -0,0 +1,196 @@
+# json_extraction.py
+import json
+import re
+
+# Raw decoding is attempted from at most this many '{' offsets per segment,
+# and the (slower) repair pass from at most REPAIR_CANDIDATES of them.
+MAX_CANDIDATES = 64
+REPAIR_CANDIDATES = 8
+
+ACTION_SCHEMA = {
+    "required": {"command": str},
+    "optional": {"thoughts": (str, dict)},
+}
+VERIFIER_SCHEMA = {
+    "required": {"success": bool},
+    "optional": {"feedback": str, "completion_percentage": (int, float)},
+}
+TASKMASTER_SCHEMA = {
+    "required": {"task": str},
+    "optional": {
+        "max_attempts": int,
+        "expected_difficulty": str,
+        "reasoning": str,
+        "assertions": list,
+    },
+}
+
+_DECODER = json.JSONDecoder(strict=False)
+_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*[ \t]*\n(.*?)```", re.DOTALL)
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def _type_names(expected_type) -> str:
+    types = expected_type if isinstance(expected_type, tuple) else (expected_type,)
+    return " or ".join(t.__name__ for t in types)
+
+
+def schema_error(data: dict, schema: dict) -> str:
+    # Why `data` can't be the answer, or None. Only required fields decide;
+    # optional ones are fixed up by apply_schema().
+    if schema is None:
+        return None
+    for key, expected_type in schema.get("required", {}).items():
+        if key not in data:
+            return f"'{key}' is missing"
+        if not isinstance(data[key], expected_type):
+            return f"'{key}' should be {_type_names(expected_type)}, not {type(data[key]).__name__}"
+    return None
+
+
+def matches_schema(data: dict, schema: dict) -> bool:
+    return schema_error(data, schema) is None
+
+
+def _coerce(value, expected_type):
+    # Numbers sent as strings ("15") or integral floats (15.0) are converted;
+    # anything else of the wrong type becomes None.
+    types = expected_type if isinstance(expected_type, tuple) else (expected_type,)
+    if isinstance(value, types):
+        return value
+    if (int in types or float in types) and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        if int in types and number.is_integer():
+            return int(number)
+        if float in types:
+            return number
+    return None
+
+
+def apply_schema(data: dict, schema: dict) -> dict:
+    # Optional fields of the wrong type are coerced or dropped, so callers
+    # fall back to their defaults instead of losing the whole object.
+    if schema is None:
+        return data
+    data = dict(data)
+    for key, expected_type in schema.get("optional", {}).items():
+        if key in data:
+            value = _coerce(data[key], expected_type)
+            if value is None:
+                del data[key]
+            else:
+                data[key] = value
+    return data
+
+
+def repair_json(text: str) -> str:
+    # Single pass over the text that fixes the defects models produce most
+    # often: single-quoted strings, raw control characters inside strings,
+    # trailing commas and Python literals.
+    out = []
+    i, length = 0, len(text)
+    quote = None
+    while i < length:
+        char = text[i]
+        if quote:
+            if char == "\\" and i + 1 < length:
+                following = text[i + 1]
+                if following == "'":
+                    out.append("'")
+                else:
+                    out.append(char + following)
+                i += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            else:
+                out.append(_STRING_ESCAPES.get(char, char))
+            i += 1
+            continue
+
+        if char in ('"', "'"):
+            quote = char
+            out.append('"')
+        elif char == ",":
+            j = i + 1
+            while j < length and text[j] in " \t\r\n":
+                j += 1
+            if j >= length or text[j] not in "}]":
+                out.append(char)
+        elif char.isalpha():
+            j = i
+            while j < length and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _candidate_segments(text: str):
+    fenced = [match.group(1) for match in _FENCE_PATTERN.finditer(text)]
+    return fenced + [text] if fenced else [text]
+
+
+def _decode_objects(segment: str):
+    offset = segment.find("{")
+    tried = 0
+    while offset != -1 and tried < MAX_CANDIDATES:
+        tried += 1
+        try:
+            data, end = _DECODER.raw_decode(segment, offset)
+        except ValueError:
+            offset = segment.find("{", offset + 1)
+            continue
+        if isinstance(data, dict):
+            yield data
+        # Skip past the decoded object so its nested dicts aren't re-yielded.
+        offset = segment.find("{", end)
+
+
+def _decode_repaired_objects(segment: str):
+    offset = segment.find("{")
+    tried = 0
+    while offset != -1 and tried < REPAIR_CANDIDATES:
+        tried += 1
+        try:
+            data, _ = _DECODER.raw_decode(repair_json(segment[offset:]))
+        except ValueError:
+            offset = segment.find("{", offset + 1)
+            continue
+        if isinstance(data, dict):
+            yield data
+        offset = segment.find("{", offset + 1)
+
+
+def extract_json_object(text: str, schema: dict = None) -> (dict, str):
+    # Returns (data, "") on success or (None, error_message). The first object
+    # matching the schema wins. Objects that don't match are never used in its
+    # place: prose quoting an example such as {"example": ...} is not an answer.
+    if not isinstance(text, str) or "{" not in text:
+        return None, "Could not find a JSON object in the response."
+
+    first_error = None
+    segments = _candidate_segments(text.strip())
+    for decode in (_decode_objects, _decode_repaired_objects):
+        for segment in segments:
+            for data in decode(segment):
+                error = schema_error(data, schema)
+                if error is None:
+                    return apply_schema(data, schema), ""
+                first_error = first_error or error
+
+    if first_error:
+        return None, f"No JSON object in the response has the expected fields: {first_error}."
+    return None, "Invalid JSON. No decodable object found in the response."
@@ -1,21 +1,88 @@
 # main.py
+import argparse
+import glob
+import importlib.util
 import os
 import sys
-from utils import RateLimiter
-from ai_providers.ollama_provider import OllamaProvider
-from ai_providers.gemini_provider import GeminiProvider
-from experiments.duel_mode import DuelMode
-from experiments.game_loop_mode import GameLoopMode
-from sandbox import cleanup_sandbox
+from contextlib import nullcontext
+from utils import RateLimiter, next_log_filename
+from registry import create_provider, load_experiment
+from sandbox import cleanup_sandbox, set_docker_host
+from config import METRICS_PORT
+from checkpoint import load_checkpoint
+from profiling import Profiler, profile_prefix_for
+from model_routing import route_roles
+import metrics
+
+
+def run_experiment(experiment, ai_provider, model_name, rate_limiter, network_enabled, log_filename, checkpoint=None, profile=False):
+    ai_provider, rate_limiter = route_roles(ai_provider, model_name, rate_limiter)
+    with Profiler(profile_prefix_for(log_filename)) if profile else nullcontext():
+        experiment.run(ai_provider, model_name, rate_limiter, network_enabled, log_filename, checkpoint=checkpoint)
+
+
+def resume(checkpoint_path: str, profile: bool = False, fresh_sandbox: bool = False):
+    checkpoint = load_checkpoint(checkpoint_path)
+    print(
+        f"[ORCHESTRATOR] Resuming {checkpoint['mode']} run '{checkpoint['log_filename']}' "
+        f"({checkpoint['provider']}:{checkpoint['model']}) from {checkpoint_path}"
+    )
+    if checkpoint["mode"] == "duel" and not checkpoint["snapshot_image"] and not fresh_sandbox:
+        # Ghost and Guardian would carry on against a container that no
+        # longer has anything they did to it.
+        print(
+            "[ERROR] This duel checkpoint has no sandbox snapshot, so the agents' histories would describe a "
+            "sandbox that no longer exists. Add --fresh-sandbox to resume in a new one anyway."
+        )
+        sys.exit(1)
+    ai_provider = create_provider(checkpoint["provider"], checkpoint["model"], seed=checkpoint["seed"])
+    rate_limiter = RateLimiter(checkpoint["rate_limiter"]["rpm_limit"])
+    rate_limiter.restore(checkpoint["rate_limiter"])
+    experiment = load_experiment(checkpoint["mode"]).from_checkpoint(checkpoint)
+    if checkpoint["snapshot_image"]:
+        # The snapshot image only exists on the host the run was on.
+        set_docker_host(checkpoint.get("docker_host", ""))
+    else:
+        print("[ORCHESTRATOR] The checkpoint has no sandbox snapshot (CHECKPOINT_SNAPSHOTS); starting a fresh sandbox.")
+    run_experiment(
+        experiment,
+        ai_provider,
+        checkpoint["model"],
+        rate_limiter,
+        checkpoint["network"],
+        checkpoint["log_filename"],
+        checkpoint=checkpoint,
+        profile=profile,
+    )
+    cleanup_sandbox()
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+
+def print_resume_hint():
+    checkpoints = sorted(glob.glob("*.checkpoint.json"), key=os.path.getmtime)
+    if checkpoints:
+        print(f"[ORCHESTRATOR] Continue with: python main.py --resume {checkpoints[-1]}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="AI sandbox orchestrator.")
+    parser.add_argument("--resume", metavar="CHECKPOINT", help="Continue an interrupted run from its checkpoint file.")
+    parser.add_argument(
+        "--fresh-sandbox",
+        action="store_true",
+        help="With --resume: continue a duel whose checkpoint has no sandbox snapshot in a new sandbox.",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Profile the run (CPU, allocations, sampled stacks) into <log>.profile.*"
+    )
+    args = parser.parse_args()
+
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+
+    if args.resume:
+        resume(args.resume, profile=args.profile, fresh_sandbox=args.fresh_sandbox)
+        return
+
     print("=" * 60)
     print("   AI SANDBOX ORCHESTRATOR")
     print("=" * 60)
@@ -40,13 +107,11 @@ def main():
         provider_choice = input("Choose AI provider: [1] Ollama, [2] Gemini: ")
         if provider_choice == "1":
             model_name = input("Enter Ollama model name (e.g., llama3): ")
-            ai_provider = OllamaProvider(model_name)
+            ai_provider = create_provider("ollama", model_name)
             break
         elif provider_choice == "2":
-            if not GEMINI_AVAILABLE:
-                print(
-                    "\n[ERROR] 'google-generativeai' not found. Run: pip install google-generativeai"
-                )
+            if importlib.util.find_spec("requests") is None:
+                print("\n[ERROR] 'requests' not found. Run: pip install requests")
                 sys.exit(1)
             if not os.getenv("GOOGLE_API_KEY"):
                 print(
@@ -71,7 +136,7 @@ def main():
                 if model_choice in gemini_models:
                     model_name = gemini_models[model_choice]
                     rpm_limit = rpm_limits.get(model_name, 15)
-                    ai_provider = GeminiProvider(model_name)
+                    ai_provider = create_provider("gemini", model_name)
                     break
                 else:
                     print("Invalid choice.")
@@ -109,13 +174,10 @@ def main():
             else:
                 print("Invalid input. Please enter 'y' or 'n'.")
 
-        test_num = 1
-        while os.path.exists(f"duel_test{test_num}.txt"):
-            test_num += 1
-        log_filename = f"duel_test{test_num}.txt"
+        log_filename = next_log_filename("duel_test")
 
-        experiment = DuelMode(max_turns)
-        experiment.run(ai_provider, model_name, rate_limiter, network_enabled, log_filename)
+        experiment = load_experiment("duel")(max_turns)
+        run_experiment(experiment, ai_provider, model_name, rate_limiter, network_enabled, log_filename, profile=args.profile)
 
     else:  # mode_choice == "2"
         while True:
@@ -138,18 +200,19 @@ def main():
         )
         initial_task = input("Task: ").strip()
 
+        initial_assertions = []
         if not initial_task:
             initial_task = "Create a file /app/output.txt with the text 'Hello, World!'"
+            initial_assertions = [
+                {"type": "file_equals", "path": "/app/output.txt", "text": "Hello, World!"}
+            ]
 
         network_enabled = False
 
-        test_num = 1
-        while os.path.exists(f"gameloop_test{test_num}.txt"):
-            test_num += 1
-        log_filename = f"gameloop_test{test_num}.txt"
+        log_filename = next_log_filename("gameloop_test")
 
-        experiment = GameLoopMode(max_cycles, initial_task)
-        experiment.run(ai_provider, model_name, rate_limiter, network_enabled, log_filename)
+        experiment = load_experiment("gameloop")(max_cycles, initial_task, initial_assertions)
+        run_experiment(experiment, ai_provider, model_name, rate_limiter, network_enabled, log_filename, profile=args.profile)
 
     cleanup_sandbox()
 
@@ -160,8 +223,10 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n\n[ORCHESTRATOR] Experiment interrupted by user.")
         cleanup_sandbox()
+        print_resume_hint()
         sys.exit(0)
     except Exception as e:
         print(f"\n[ORCHESTRATOR] A critical error occurred: {e}")
         cleanup_sandbox()
+        print_resume_hint()
         sys.exit(1)
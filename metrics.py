@@ -0,0 +1,182 @@
+# metrics.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = "ai_sandbox_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+# Called as hook(phase, labels) when a span starts; the returned callable is
+# called when it ends (see profiling.py).
+_span_hooks = []
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                "buckets": [0] * len(DEFAULT_BUCKETS),
+                "sum": 0.0,
+                "count": 0,
+                "max": 0.0,
+            }
+        for index, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+        histogram["max"] = max(histogram["max"], value)
+
+
+@contextmanager
+def span(phase: str, **labels):
+    start = time.perf_counter()
+    finishers = [hook(phase, labels) for hook in _span_hooks]
+    try:
+        yield
+    finally:
+        for finish in reversed(finishers):
+            finish()
+        observe("phase_duration_seconds", time.perf_counter() - start, phase=phase, **labels)
+
+
+def add_span_hook(hook):
+    _span_hooks.append(hook)
+
+
+def remove_span_hook(hook):
+    _span_hooks.remove(hook)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus() -> str:
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: dict(value, buckets=list(value["buckets"])) for key, value in _histograms.items()}
+
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        metric = METRIC_PREFIX + name
+        lines.append(f"# TYPE {metric} counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        metric = METRIC_PREFIX + name
+        lines.append(f"# TYPE {metric} histogram")
+        for (histogram_name, labels), histogram in sorted(histograms.items()):
+            if histogram_name != name:
+                continue
+            for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', str(bound))])} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str):
+    # Written atomically so a node_exporter textfile collector never reads a
+    # half-written file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def start_http_server(port: int, host: str = "127.0.0.1"):
+    # http.server is imported here rather than at module level: every
+    # entry point imports metrics, but few of them serve it.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[METRICS] Serving Prometheus metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def _estimate_quantile(histogram: dict, quantile: float) -> float:
+    target = quantile * histogram["count"]
+    for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+        if count >= target:
+            return min(bound, histogram["max"])
+    return histogram["max"]
+
+
+def format_summary() -> str:
+    with _lock:
+        histograms = {
+            key: dict(value, buckets=list(value["buckets"]))
+            for key, value in _histograms.items()
+            if key[0] == "phase_duration_seconds"
+        }
+        counters = dict(_counters)
+
+    if not histograms and not counters:
+        return "No metrics recorded."
+
+    rows = []
+    for (_, labels), histogram in histograms.items():
+        label_map = dict(labels)
+        phase = label_map.pop("phase", "?")
+        detail = ",".join(f"{k}={v}" for k, v in label_map.items())
+        rows.append((histogram["sum"], phase, detail, histogram))
+
+    lines = [f"{'phase':<22} {'labels':<32} {'count':>7} {'total s':>10} {'mean s':>9} {'~p95 s':>9} {'max s':>9}"]
+    for total, phase, detail, histogram in sorted(rows, key=lambda row: row[0], reverse=True):
+        lines.append(
+            f"{phase:<22} {detail[:32]:<32} {histogram['count']:>7} {total:>10.3f} "
+            f"{total / histogram['count']:>9.3f} {_estimate_quantile(histogram, 0.95):>9.3f} {histogram['max']:>9.3f}"
+        )
+    for (name, labels), value in sorted(counters.items()):
+        detail = ",".join(f"{k}={v}" for k, v in labels)
+        lines.append(f"{name:<22} {detail[:32]:<32} {value:>7g}")
+    return "\n".join(lines)
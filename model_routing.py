@@ -0,0 +1,207 @@
+# model_routing.py
+#
+# Per-role model routing. ROLE_MODELS binds roles to their own provider,
+# model and rate limit, e.g. the high-volume Verifier and Taskmaster to a
+# small local model; roles without a binding use the model chosen at
+# startup. With VERIFIER_ESCALATION, verdicts of a routed Verifier that are
+# likely to be wrong (or costly if wrong) are re-checked by a stronger
+# model: the startup model unless VERIFIER_ESCALATION_TARGET names another.
+import metrics
+from ai_providers.base import AIProvider, merge_usage
+from checkpoint import provider_name as name_of
+from registry import create_provider
+from token_usage import rates_for, usage_cost
+from utils import RateLimiter
+from config import (
+    ROLE_MODELS,
+    VERIFIER_ESCALATION,
+    VERIFIER_ESCALATION_TARGET,
+    VERIFIER_ESCALATION_MIN_COMPLETION,
+)
+
+ROLES = ("ghost", "guardian", "coder", "verifier", "taskmaster")
+UNRELIABLE_FEEDBACK = ("Error:", "Verifier error", "Verifier API failed", "Verifier timeout")
+
+
+def base_provider(ai_provider):
+    # The provider chosen at startup, whether or not roles are routed.
+    return getattr(ai_provider, "default", ai_provider)
+
+
+def describe_routes(ai_provider) -> str:
+    routes = getattr(ai_provider, "routes", None)
+    if not routes:
+        return ""
+    bindings = [f"{role}={route['label']}" for role, route in routes.items()]
+    if ai_provider.escalation:
+        bindings.append(f"verifier escalation={ai_provider.escalation['label']}")
+    return "Role models: " + ", ".join(bindings)
+
+
+def low_confidence(verdict: dict, min_completion: int = VERIFIER_ESCALATION_MIN_COMPLETION) -> bool:
+    # Small models give no usable confidence of their own, so these are the
+    # verdicts they most often get wrong, or where a wrong one costs most:
+    # unparseable ones, claimed successes (they end the cycle) and
+    # near-misses.
+    if verdict["feedback"].startswith(UNRELIABLE_FEEDBACK):
+        return True
+    return bool(verdict["success"]) or (verdict.get("completion_percentage") or 0) >= min_completion
+
+
+class RoleRateLimiter:
+    # Stands in for the run's RateLimiter: routed roles wait on their own
+    # model's limiter, everything else on the startup model's.
+
+    def __init__(self, default: RateLimiter, limiters: dict):
+        self.default = default
+        self.limiters = limiters
+
+    def wait(self, role: str = None):
+        self.limiters.get(role, self.default).wait()
+
+    def state(self) -> dict:
+        return self.default.state()
+
+    def restore(self, state: dict):
+        self.default.restore(state)
+
+
+class RoleRouter(AIProvider):
+    def __init__(self, default, model_name: str, routes: dict, escalation: dict = None):
+        self.default = default
+        self.model_name = model_name
+        self.seed = getattr(default, "seed", None)
+        self.routes = routes
+        self.escalation = escalation
+        self.escalated = 0
+        self.overturned = 0
+
+    def _provider(self, role: str):
+        route = self.routes.get(role)
+        return (route["provider"] if route else self.default), route
+
+    @staticmethod
+    def _thinking(provider) -> bool:
+        # Decided per provider actually called; the experiments only see
+        # the router.
+        return provider.__class__.__name__ == "GeminiProvider"
+
+    def _price(self, route: dict):
+        # Usage of a routed call carries its own cost, since the ledger
+        # prices everything else at the startup model's rates.
+        usage = self.last_usage
+        if route is not None and usage is not None:
+            self.last_usage = dict(usage, cost=usage_cost(usage, route["rates"]))
+
+    def get_ai_action(self, history: list, context: str, thinking_enabled: bool, role: str = "agent") -> (str, str):
+        provider, route = self._provider(role)
+        result = provider.get_ai_action(history, context, self._thinking(provider), role=role)
+        self._price(route)
+        return result
+
+    def get_ai_candidates(
+        self, history: list, context: str, thinking_enabled: bool, count: int, role: str = "agent"
+    ) -> list:
+        provider, route = self._provider(role)
+        candidates = provider.get_ai_candidates(history, context, self._thinking(provider), count, role=role)
+        self._price(route)
+        return candidates
+
+    def get_taskmaster_task(self, taskmaster_history: list, history_summary: str) -> dict:
+        provider, route = self._provider("taskmaster")
+        task = provider.get_taskmaster_task(taskmaster_history, history_summary)
+        self._price(route)
+        return task
+
+    def get_verifier_verdict(self, verifier_history: list, task: str, sandbox_state: str) -> dict:
+        provider, route = self._provider("verifier")
+        if route is None or self.escalation is None:
+            verdict = provider.get_verifier_verdict(verifier_history, task, sandbox_state)
+            self._price(route)
+            return verdict
+
+        branch = list(verifier_history)
+        verdict = provider.get_verifier_verdict(branch, task, sandbox_state)
+        self._price(route)
+        if not low_confidence(verdict):
+            verifier_history[:] = branch
+            return verdict
+
+        # The stronger model judges from the history before the small
+        # model's answer, and its exchange is the one kept.
+        usage = self.take_usage()
+        escalation = self.escalation
+        escalated_branch = list(verifier_history)
+        escalation["rate_limiter"].wait()
+        second_opinion = escalation["provider"].get_verifier_verdict(escalated_branch, task, sandbox_state)
+        self._price(escalation)
+        self.last_usage = merge_usage(usage, self.take_usage())
+        if second_opinion["feedback"].startswith(UNRELIABLE_FEEDBACK):
+            metrics.inc("verifier_escalations_total", result="failed")
+            verifier_history[:] = branch
+            return verdict
+
+        self.escalated += 1
+        overturned = bool(second_opinion["success"]) != bool(verdict["success"])
+        self.overturned += overturned
+        metrics.inc("verifier_escalations_total", result="overturned" if overturned else "confirmed")
+        print(
+            f"\n[ROUTING] Verifier verdict ({'success' if verdict['success'] else 'failure'}, "
+            f"{verdict.get('completion_percentage') or 0}%) re-checked by {escalation['label']}: "
+            f"{'overturned' if overturned else 'confirmed'}."
+        )
+        verifier_history[:] = escalated_branch
+        return second_opinion
+
+    def summary(self) -> str:
+        return f"{self.escalated} verdicts escalated, {self.overturned} overturned"
+
+
+def _binding_key(binding: dict) -> tuple:
+    return binding["provider"], binding["model"]
+
+
+def route_roles(ai_provider, model_name: str, rate_limiter: RateLimiter, role_models: dict = None):
+    # Returns the provider and rate limiter to run the experiment with:
+    # unchanged when nothing is routed.
+    role_models = ROLE_MODELS if role_models is None else role_models
+    if not role_models:
+        return ai_provider, rate_limiter
+    provider_name = name_of(ai_provider)
+    unknown = set(role_models) - set(ROLES)
+    if unknown:
+        raise ValueError(f"ROLE_MODELS has unknown roles {sorted(unknown)}. Roles: {', '.join(ROLES)}")
+
+    startup = {
+        "provider": ai_provider,
+        "rate_limiter": rate_limiter,
+        "rates": rates_for(model_name),
+        "label": f"{provider_name}:{model_name}",
+    }
+    # Roles bound to the same model share its provider and rate limit.
+    shared = {(provider_name, model_name): startup}
+
+    def route_for(binding: dict) -> dict:
+        key = _binding_key(binding)
+        if key not in shared:
+            shared[key] = {
+                "provider": create_provider(binding["provider"], binding["model"], seed=getattr(ai_provider, "seed", None)),
+                "rate_limiter": RateLimiter(binding.get("rpm_limit", 0)),
+                "rates": rates_for(binding["model"]),
+                "label": f"{binding['provider']}:{binding['model']}",
+            }
+        return shared[key]
+
+    routes = {
+        role: route_for(binding)
+        for role, binding in role_models.items()
+        if _binding_key(binding) != (provider_name, model_name)
+    }
+    escalation = None
+    if VERIFIER_ESCALATION and "verifier" in routes:
+        escalation = route_for(VERIFIER_ESCALATION_TARGET) if VERIFIER_ESCALATION_TARGET else startup
+        if escalation is routes["verifier"]:
+            escalation = None
+    router = RoleRouter(ai_provider, model_name, routes, escalation)
+    limiters = {role: route["rate_limiter"] for role, route in routes.items()}
+    return router, RoleRateLimiter(rate_limiter, limiters)
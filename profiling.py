@@ -0,0 +1,150 @@
+# profiling.py
+#
+# `python main.py --profile` runs the experiment under cProfile and
+# tracemalloc, with a sampling thread that records every thread's stack and
+# the traced memory at a fixed interval. Spans (see metrics.span) are hooked
+# to attribute CPU time and allocations to phases. On exit it writes, next to
+# the transcript:
+#
+#   <run>.profile.pstats     cProfile data (snakeviz, pstats)
+#   <run>.profile.txt        per-phase CPU/allocations, top functions, top allocation sites
+#   <run>.profile.collapsed  sampled stacks for flamegraph.pl / speedscope
+#   <run>.profile.memory.tsv traced memory over time
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+import metrics
+from config import PROFILE_SAMPLE_INTERVAL, PROFILE_TRACEMALLOC_FRAMES, PROFILE_TOP
+
+SAMPLED_STACK_DEPTH = 64
+
+
+def profile_prefix_for(log_filename: str) -> str:
+    return os.path.splitext(log_filename)[0] + ".profile"
+
+
+class Profiler:
+    def __init__(
+        self,
+        prefix: str,
+        sample_interval: float = PROFILE_SAMPLE_INTERVAL,
+        tracemalloc_frames: int = PROFILE_TRACEMALLOC_FRAMES,
+        top: int = PROFILE_TOP,
+    ):
+        self.prefix = prefix
+        self.sample_interval = sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.stacks = Counter()
+        self.memory_samples = []
+        self.phases = {}
+        self._active = {}  # thread id -> phases currently open in it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+
+    def _span_hook(self, phase: str, labels: dict):
+        thread_id = threading.get_ident()
+        stack = self._active.setdefault(thread_id, [])
+        stack.append(phase)
+        cpu_start = time.thread_time()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+
+        def finish():
+            stack.pop()
+            with self._lock:
+                totals = self.phases.setdefault(phase, {"count": 0, "wall": 0.0, "cpu": 0.0, "allocated": 0})
+                totals["count"] += 1
+                totals["wall"] += time.perf_counter() - wall_start
+                totals["cpu"] += time.thread_time() - cpu_start
+                totals["allocated"] += tracemalloc.get_traced_memory()[0] - memory_start
+
+        return finish
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.sample_interval):
+            for thread in threading.enumerate():
+                names.setdefault(thread.ident, thread.name)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < SAMPLED_STACK_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                phases = self._active.get(thread_id)
+                root = [names.get(thread_id, str(thread_id)), f"[{phases[-1] if phases else 'other'}]"]
+                self.stacks[";".join(root + frames[::-1])] += 1
+            self.memory_samples.append((time.monotonic() - self._started, tracemalloc.get_traced_memory()[0]))
+
+    def start(self):
+        self._started = time.monotonic()
+        if self.tracemalloc_frames:
+            tracemalloc.start(self.tracemalloc_frames)
+        metrics.add_span_hook(self._span_hook)
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        # cProfile covers the thread that starts it (the experiment loop);
+        # the sampler covers every thread.
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        self.profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        metrics.remove_span_hook(self._span_hook)
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self._write_reports(snapshot, peak, time.monotonic() - self._started)
+
+    def _write_reports(self, snapshot, peak: int, duration: float):
+        self.profile.dump_stats(f"{self.prefix}.pstats")
+        with open(f"{self.prefix}.collapsed", "w", encoding="utf-8") as collapsed_file:
+            for stack, count in self.stacks.most_common():
+                collapsed_file.write(f"{stack} {count}\n")
+        with open(f"{self.prefix}.memory.tsv", "w", encoding="utf-8") as memory_file:
+            memory_file.write("seconds\ttraced_bytes\n")
+            memory_file.writelines(f"{seconds:.3f}\t{size}\n" for seconds, size in self.memory_samples)
+
+        lines = [f"Profiled {duration:.1f}s, peak traced memory {peak / 1024 / 1024:.1f} MiB", ""]
+        lines.append("PHASES (inclusive; CPU is the phase's own thread, allocations are net across threads)")
+        lines.append(f"{'phase':<22} {'count':>8} {'wall s':>10} {'cpu s':>10} {'net alloc KiB':>14}")
+        for phase, totals in sorted(self.phases.items(), key=lambda item: -item[1]["cpu"]):
+            lines.append(
+                f"{phase:<22} {totals['count']:>8} {totals['wall']:>10.3f} {totals['cpu']:>10.3f} "
+                f"{totals['allocated'] / 1024:>14.1f}"
+            )
+
+        stats_output = io.StringIO()
+        pstats.Stats(self.profile, stream=stats_output).sort_stats("cumulative").print_stats(self.top)
+        lines += ["", "TOP FUNCTIONS (cumulative, experiment thread)", stats_output.getvalue().strip()]
+
+        lines += ["", "TOP ALLOCATION SITES (live at exit)"]
+        for statistic in snapshot.statistics("lineno")[: self.top] if snapshot else []:
+            frame = statistic.traceback[0]
+            lines.append(
+                f"{statistic.size / 1024:>10.1f} KiB {statistic.count:>8} blocks  {frame.filename}:{frame.lineno}"
+            )
+        with open(f"{self.prefix}.txt", "w", encoding="utf-8") as report_file:
+            report_file.write("\n".join(lines) + "\n")
+        print(f"[ORCHESTRATOR] Profile written to {self.prefix}.txt (.pstats, .collapsed, .memory.tsv)")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,98 @@
+# prompt_cache.py
+#
+# How much of each prompt a backend can serve from its prefix (KV) cache.
+# Local models only evaluate the tokens after the longest prefix shared with
+# the previous request of the same conversation, so every role keeps its
+# messages append-only. Two numbers are tracked per role:
+#   - shared prefix: characters the request has in common with the previous
+#     request of that role plus its reply (what the layout allows)
+#   - evaluated tokens vs prompt tokens as reported by the provider (what the
+#     backend actually reused); Ollama doesn't report the prompt size, so it
+#     is estimated from the character count
+import os
+import threading
+import metrics
+
+CHARS_PER_TOKEN = 4
+
+_lock = threading.Lock()
+_previous = {}
+_stats = {}
+
+
+def _snapshot(messages: list) -> list:
+    return [(message["role"], message["content"]) for message in messages]
+
+
+def _shared_chars(previous: list, current: list) -> int:
+    shared = 0
+    for old, new in zip(previous, current):
+        if old == new:
+            shared += len(new[0]) + len(new[1])
+            continue
+        if old[0] == new[0]:
+            shared += len(new[0]) + len(os.path.commonprefix([old[1], new[1]]))
+        break
+    return shared
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    return sum(len(message["role"]) + len(message["content"]) for message in messages) // CHARS_PER_TOKEN
+
+
+def record_prompt(role: str, messages: list, reply: str, evaluated_tokens=None, prompt_tokens=None):
+    current = _snapshot(messages)
+    total_chars = sum(len(role_name) + len(content) for role_name, content in current)
+    estimated = prompt_tokens is None
+    if estimated:
+        prompt_tokens = estimate_prompt_tokens(messages)
+    with _lock:
+        shared_chars = _shared_chars(_previous.get(role, []), current)
+        _previous[role] = current + [("assistant", reply)]
+        stats = _stats.setdefault(
+            role,
+            {"requests": 0, "chars": 0, "shared_chars": 0, "prompt_tokens": 0, "evaluated_tokens": 0, "reported": 0, "estimated": False},
+        )
+        stats["requests"] += 1
+        stats["chars"] += total_chars
+        stats["shared_chars"] += shared_chars
+        if evaluated_tokens is not None:
+            stats["reported"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["evaluated_tokens"] += evaluated_tokens
+            stats["estimated"] = stats["estimated"] or estimated
+    metrics.inc("prompt_chars_total", total_chars, role=role, kind="total")
+    metrics.inc("prompt_chars_total", shared_chars, role=role, kind="shared_prefix")
+    if evaluated_tokens is not None:
+        metrics.inc("prompt_tokens_total", prompt_tokens, role=role, kind="prompt")
+        metrics.inc("prompt_tokens_total", evaluated_tokens, role=role, kind="evaluated")
+
+
+def reset_prompt_stats():
+    with _lock:
+        _previous.clear()
+        _stats.clear()
+
+
+def prompt_stats() -> dict:
+    with _lock:
+        stats = {role: dict(values) for role, values in _stats.items()}
+    for values in stats.values():
+        values["prefix_reuse"] = values["shared_chars"] / values["chars"] if values["chars"] else 0.0
+        reused = values["prompt_tokens"] - values["evaluated_tokens"]
+        values["cache_reuse"] = max(0.0, reused / values["prompt_tokens"]) if values["prompt_tokens"] else None
+    return stats
+
+
+def format_prompt_stats(stats: dict) -> str:
+    parts = []
+    for role, values in sorted(stats.items()):
+        part = f"{role} {values['prefix_reuse']:.0%} shared prefix"
+        if values["cache_reuse"] is not None:
+            estimate = "~" if values["estimated"] else ""
+            part += (
+                f", {values['evaluated_tokens']}/{estimate}{values['prompt_tokens']} tokens evaluated"
+                f" ({values['cache_reuse']:.0%} from cache)"
+            )
+        parts.append(part)
+    return "; ".join(parts)
@@ -182,9 +182,22 @@ You MUST respond with valid JSON containing:
   "task": "Clear, specific description of the next task",
   "max_attempts": 5-50,
   "expected_difficulty": "trivial/easy/medium/hard/expert",
-  "reasoning": "Why this task and attempt limit"
+  "reasoning": "Why this task and attempt limit",
+  "assertions": [
+    {"type": "file_exists", "path": "/app/output.txt"},
+    {"type": "file_equals", "path": "/app/output.txt", "text": "exact expected content"},
+    {"type": "file_matches", "path": "/app/output.txt", "pattern": "python regex"},
+    {"type": "command_exit_code", "command": "python3 /app/solve.py", "expected": 0},
+    {"type": "output_regex", "command": "python3 /app/solve.py", "pattern": "python regex"}
+  ]
 }
 
+**ASSERTIONS:**
+- "assertions" is a list of machine-checkable conditions that are run in the sandbox before the Verifier is consulted
+- If every assertion passes, the task is marked solved; if any fails, the attempt is marked failed
+- Only include assertions you are certain a correct solution satisfies; use an empty list when the result can't be checked mechanically
+- Commands in assertions run as the sandbox user and must finish quickly
+
 **DIFFICULTY PROGRESSION STRATEGY:**
 - Always increase complexity gradually from the previous task
 - Consider Coder's recent performance:
@@ -207,7 +220,10 @@ Cycle 2: "Create /app/output.txt containing the numbers 1-10, each on a new line
 → If solved in 5 attempts (42%) →
 Cycle 3: "Read /app/input.txt and write the sum of all numbers to /app/output.txt" (medium, 25 attempts)
 
-**PREVIOUS PERFORMANCE HISTORY:**
+After every cycle you will receive Coder's result for that cycle and recent statistics. Respond with the next task as JSON.
+"""
+
+TASKMASTER_UPDATE = """
 {history}
 
 Generate the next task as JSON.
@@ -224,3 +240,14 @@ NETWORK_DISABLED_ADDON = """
 **NETWORK ACCESS:**
 Network access is disabled for this session. You cannot install packages or download files from external sources.
 """
+
+JOBS_ADDON = """
+
+**BACKGROUND JOBS:**
+Commands are killed after 20 seconds. Run anything longer (builds, test suites, scans) as a background job and keep working while it runs:
+- `job start <command>` starts it and gives you a job id.
+- `job status [id]` shows whether your jobs are still running and their exit codes.
+- `job tail <id> [lines]` shows the last lines of a job's output.
+- `job kill <id>` stops a job.
+A job and everything it started are killed after {time_limit} seconds, and you can have at most {max_running} running at once.
+"""
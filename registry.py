@@ -0,0 +1,64 @@
+# registry.py
+#
+# Providers and experiments by name. An entry's module is imported only
+# when that entry is selected, so starting the orchestrator doesn't pay for
+# provider SDKs or experiment code it won't use. Other packages can add
+# entries through the "ai_sandbox.providers" and "ai_sandbox.experiments"
+# entry point groups.
+import importlib
+
+PROVIDERS = {
+    "ollama": "ai_providers.ollama_provider:OllamaProvider",
+    "gemini": "ai_providers.gemini_provider:GeminiProvider",
+}
+EXPERIMENTS = {
+    "duel": "experiments.duel_mode:DuelMode",
+    "gameloop": "experiments.game_loop_mode:GameLoopMode",
+}
+ENTRY_POINT_GROUPS = {
+    "provider": "ai_sandbox.providers",
+    "experiment": "ai_sandbox.experiments",
+}
+
+
+def _load(kind: str, name: str, builtins: dict):
+    target = builtins.get(name)
+    if target is None:
+        # Scanning installed distributions is comparatively slow, so entry
+        # points are only consulted for names that aren't built in.
+        from importlib import metadata
+
+        for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUPS[kind]):
+            if entry_point.name == name:
+                return entry_point.load()
+        raise ValueError(f"Unknown {kind} '{name}'. Available: {', '.join(_names(kind, builtins))}")
+    module_name, class_name = target.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _names(kind: str, builtins: dict) -> list:
+    from importlib import metadata
+
+    names = set(builtins)
+    names.update(ep.name for ep in metadata.entry_points(group=ENTRY_POINT_GROUPS[kind]))
+    return sorted(names)
+
+
+def load_provider(name: str):
+    return _load("provider", name, PROVIDERS)
+
+
+def load_experiment(name: str):
+    return _load("experiment", name, EXPERIMENTS)
+
+
+def provider_names() -> list:
+    return _names("provider", PROVIDERS)
+
+
+def experiment_names() -> list:
+    return _names("experiment", EXPERIMENTS)
+
+
+def create_provider(name: str, model: str, seed=None):
+    return load_provider(name)(model, seed=seed)
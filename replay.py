@@ -0,0 +1,301 @@
+# replay.py
+#
+# Deterministic replay of a recorded run: the agents' commands, verdicts,
+# tasks and operator gatekeeper answers are read from the run's event stream
+# and fed back into DuelMode/GameLoopMode against a fresh sandbox, without
+# any LLM calls. Every command result is compared with the recorded one, so
+# a replay doubles as a repeatable workload for sandbox-layer changes.
+#
+#   python replay.py duel_test3.events.jsonl [--timing original] [--output replay.txt]
+import argparse
+import importlib
+import json
+import os
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from ai_providers.base import AIProvider
+from gatekeeper import Gatekeeper
+from prompts import TASKMASTER_UPDATE
+from registry import load_experiment
+from run_logger import decompress_payload
+from run_store import RunStore
+from sandbox import cleanup_sandbox
+from utils import RateLimiter
+from config import STALL_DETECTION
+
+EXPERIMENT_MODULES = ("experiments.duel_mode", "experiments.game_loop_mode")
+MAX_REPORTED_DIFFERENCES = 10
+
+
+class RecordingExhausted(Exception):
+    pass
+
+
+class _NoSleepTime:
+    # Stands in for `time` inside the experiments so their pacing sleeps are
+    # skipped when replaying as fast as possible.
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    @staticmethod
+    def sleep(seconds):
+        pass
+
+
+def load_recording(events_path: str) -> dict:
+    with open(events_path, encoding="utf-8") as events_file:
+        events = [json.loads(line) for line in events_file if line.strip()]
+    events = [{key: decompress_payload(value) for key, value in event.items()} for event in events]
+    kinds = {event["event"] for event in events}
+    if "run_start" not in kinds:
+        raise ValueError(f"'{events_path}' has no run_start event")
+    if "run_resume" in kinds:
+        raise ValueError(f"'{events_path}' is a resumed run; only uninterrupted runs can be replayed")
+    if "candidates" in kinds:
+        raise ValueError(f"'{events_path}' was recorded with Best-of-N candidates, which replay doesn't support")
+
+    recording = {
+        "start": next(event for event in events if event["event"] == "run_start"),
+        "end": next((event for event in events if event["event"] == "run_end"), None),
+        "actions": defaultdict(deque),
+        "verdicts": deque(),
+        "tasks": deque(),
+        "decisions": defaultdict(deque),
+        "cycles": [],
+        "budgets": {},
+        "results": [],
+    }
+    for event in events:
+        kind = event["event"]
+        if kind == "action":
+            recording["actions"][event["role"]].append(event)
+        elif kind == "verdict" and event["source"] == "llm":
+            recording["verdicts"].append(event)
+        elif kind == "task":
+            recording["tasks"].append(event)
+        elif kind == "gatekeeper" and event["source"] in ("operator", "queue", "timeout"):
+            recording["decisions"][(event["role"], event["command"].strip())].append(event["action"])
+        elif kind == "cycle_start":
+            recording["cycles"].append(event)
+        elif kind == "budget":
+            recording["budgets"][event["cycle"]] = event
+        elif kind == "command_result":
+            recording["results"].append(event)
+    return recording
+
+
+class ReplayProvider(AIProvider):
+    def __init__(self, recording: dict, preserve_timing: bool = False):
+        self.recording = recording
+        self.preserve_timing = preserve_timing
+
+    def _next(self, queue: deque, what: str) -> dict:
+        if not queue:
+            raise RecordingExhausted(f"no recorded {what} left")
+        event = queue.popleft()
+        if self.preserve_timing:
+            time.sleep(event.get("duration") or 0)
+        return event
+
+    def get_ai_action(self, history: list, context: str, thinking_enabled: bool, role: str = "agent") -> (str, str):
+        history.append({"role": "user", "content": context})
+        event = self._next(self.recording["actions"][role], f"{role} action")
+        history.append(
+            {"role": "assistant", "content": json.dumps({"thoughts": event["thoughts"], "command": event["command"]})}
+        )
+        return event["thoughts"], event["command"]
+
+    def get_verifier_verdict(self, verifier_history: list, task: str, sandbox_state: str) -> dict:
+        verifier_history.append({"role": "user", "content": f"TASK TO VERIFY:\n{task}\n\nCURRENT SANDBOX STATE:\n{sandbox_state}"})
+        event = self._next(self.recording["verdicts"], "verdict")
+        verdict = {field: event[field] for field in ("success", "feedback", "completion_percentage")}
+        verifier_history.append({"role": "assistant", "content": json.dumps(verdict)})
+        return verdict
+
+    def get_taskmaster_task(self, taskmaster_history: list, history_summary: str) -> dict:
+        taskmaster_history.append({"role": "user", "content": TASKMASTER_UPDATE.format(history=history_summary)})
+        response = self._next(self.recording["tasks"], "task")["response"]
+        taskmaster_history.append({"role": "assistant", "content": json.dumps(response)})
+        return response
+
+
+class ReplayApprovalQueue:
+    # Answers "ask" decisions with what the operator (or the timeout) decided
+    # in the recorded run.
+
+    def __init__(self, decisions: dict):
+        self.decisions = decisions
+        self.requests = {}
+
+    def submit(self, request: dict) -> str:
+        request_id = str(len(self.requests))
+        self.requests[request_id] = request
+        return request_id
+
+    def decision(self, request_id: str) -> str:
+        request = self.requests[request_id]
+        answers = self.decisions.get((request["role"].lower(), request["command"]))
+        if not answers:
+            raise RecordingExhausted(f"no recorded gatekeeper decision for `{request['command']}`")
+        return answers.popleft()
+
+    def close(self, request_id: str):
+        pass
+
+
+class RecordedBudget:
+    # Grants each cycle the attempts it had in the recorded run, whatever the
+    # run store now suggests.
+
+    def __init__(self, recording: dict):
+        self.cycles = deque(recording["cycles"])
+        self.budgets = recording["budgets"]
+        self.decisions = 0
+        self.expected_calls_saved = 0.0
+
+    def record(self, difficulty, attempts, solved):
+        pass
+
+    def allocate(self, difficulty: str, requested: int) -> (int, dict):
+        if not self.cycles:
+            raise RecordingExhausted("no recorded cycle left")
+        cycle = self.cycles.popleft()
+        decision = self.budgets.get(cycle["cycle"]) or {"requested": cycle["max_attempts"], "expected_calls_saved": 0.0}
+        if cycle["max_attempts"] != decision["requested"]:
+            self.decisions += 1
+            self.expected_calls_saved += decision["expected_calls_saved"]
+        return cycle["max_attempts"], {key: value for key, value in decision.items() if key not in ("ts", "event", "cycle")}
+
+
+@contextmanager
+def _patched(patches: list):
+    originals = []
+    try:
+        for module, name, value in patches:
+            originals.append((module, name, getattr(module, name)))
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, original in reversed(originals):
+            setattr(module, name, original)
+
+
+def _compare(recorded: list, replayed: list) -> dict:
+    differences = []
+    for index, (original, new) in enumerate(zip(recorded, replayed), start=1):
+        if (original["role"], original["command"], original["result"]) != (new["role"], new["command"], new["result"]):
+            differences.append({"index": index, "role": new["role"], "command": new["command"]})
+    return {
+        "commands": len(replayed),
+        "recorded_commands": len(recorded),
+        "identical": min(len(recorded), len(replayed)) - len(differences),
+        "differences": differences,
+        "recorded_exec_seconds": sum(event["duration"] for event in recorded[: len(replayed)]),
+        "replay_exec_seconds": sum(event["duration"] for event in replayed),
+    }
+
+
+def replay(events_path: str, log_filename: str = None, preserve_timing: bool = False) -> dict:
+    recording = load_recording(events_path)
+    start, end = recording["start"], recording["end"]
+    log_filename = log_filename or events_path.replace(".events.jsonl", "") + ".replay.txt"
+
+    if start["mode"] == "duel":
+        # A won or stopped duel ends early; replay exactly as many turns.
+        experiment = load_experiment("duel")(end["turns"] if end else start["max_turns"])
+    else:
+        first_cycle = recording["cycles"][0]
+        experiment = load_experiment("gameloop")(
+            len(recording["cycles"]) if end else start["max_cycles"],
+            first_cycle["task"],
+            first_cycle["assertions"],
+        )
+
+    approval_queue = ReplayApprovalQueue(recording["decisions"])
+    budget = RecordedBudget(recording)
+    patches = []
+    for module in map(importlib.import_module, EXPERIMENT_MODULES):
+        patches += [
+            (module, "Gatekeeper", lambda **kwargs: Gatekeeper(interactive=False, approval_queue=approval_queue, **kwargs)),
+            (module, "RunStore", lambda: RunStore(":memory:")),
+        ]
+        if not preserve_timing:
+            patches.append((module, "time", _NoSleepTime()))
+    duel_module, game_loop_module = map(importlib.import_module, EXPERIMENT_MODULES)
+    patches += [
+        (duel_module, "CHECKPOINT_TURNS", 0),
+        (game_loop_module, "CHECKPOINT_CYCLES", 0),
+        (game_loop_module, "ADAPTIVE_BUDGET", True),
+        (game_loop_module, "AttemptBudget", lambda *args, **kwargs: budget),
+        (game_loop_module, "STALL_DETECTION", start.get("stall_detection", STALL_DETECTION)),
+        (game_loop_module, "CODER_CANDIDATES", 1),
+        (game_loop_module, "SPECULATIVE_CODER", False),
+    ]
+
+    status, error = "completed", None
+    started = time.monotonic()
+    try:
+        with _patched(patches):
+            experiment.run(
+                ReplayProvider(recording, preserve_timing),
+                start["model"],
+                RateLimiter(0),
+                start["network"],
+                log_filename,
+            )
+    except RecordingExhausted as e:
+        # Expected where the recorded run stopped mid-turn (budget, crash);
+        # anywhere else the replayed run took a different path.
+        status, error = ("ended" if not end or end.get("stop_reason") else "diverged"), str(e)
+    finally:
+        cleanup_sandbox()
+    duration = time.monotonic() - started
+
+    events_filename = os.path.splitext(log_filename)[0] + ".events.jsonl"
+    with open(events_filename, encoding="utf-8") as events_file:
+        replayed = [json.loads(line) for line in events_file if line.strip()]
+    replayed = [
+        {key: decompress_payload(value) for key, value in event.items()}
+        for event in replayed
+        if event["event"] == "command_result"
+    ]
+    return dict(_compare(recording["results"], replayed), status=status, error=error, duration=duration, log_filename=log_filename)
+
+
+def print_report(report: dict):
+    print(f"\n[REPLAY] {report['status'].upper()}" + (f": {report['error']}" if report["error"] else ""))
+    print(
+        f"[REPLAY] {report['commands']}/{report['recorded_commands']} commands replayed in {report['duration']:.1f}s, "
+        f"{report['identical']} with identical output, {len(report['differences'])} different"
+    )
+    print(
+        f"[REPLAY] Sandbox exec time: recorded {report['recorded_exec_seconds']:.2f}s, "
+        f"replay {report['replay_exec_seconds']:.2f}s"
+    )
+    for difference in report["differences"][:MAX_REPORTED_DIFFERENCES]:
+        print(f"  #{difference['index']} {difference['role']}: `{difference['command']}` produced different output")
+    print(f"[REPLAY] Transcript: {report['log_filename']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded run against a fresh sandbox without LLM calls.")
+    parser.add_argument("events", help="The run's .events.jsonl file.")
+    parser.add_argument(
+        "--timing",
+        choices=("fast", "original"),
+        default="fast",
+        help="Skip model latency and pacing (fast) or wait as long as the recorded model calls took.",
+    )
+    parser.add_argument("--output", help="Transcript of the replay (default: <run>.replay.txt).")
+    args = parser.parse_args()
+
+    report = replay(args.events, args.output, preserve_timing=args.timing == "original")
+    print_report(report)
+    if report["status"] == "diverged" or report["differences"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
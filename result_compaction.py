@@ -0,0 +1,153 @@
+# result_compaction.py
+#
+# Shrinks command results before they are fed back into agent prompts.
+# Transcripts and events keep the full output; only the next prompt sees
+# the compacted version:
+#   - ANSI escapes, carriage-return redraws and progress lines are dropped
+#   - runs of identical lines are collapsed, and runs of lines differing only
+#     in their numbers too if the result is still over its budget
+#   - a repeat of a command gets a diff against its previous result
+#   - what is left is cut to a per-role token budget, keeping head and tail
+import difflib
+import re
+import metrics
+from config import COMPACT_RESULTS, RESULT_TOKEN_BUDGETS, RESULT_TOKEN_BUDGET_DEFAULT
+
+CHARS_PER_TOKEN = 4
+MIN_COLLAPSE_RUN = 3
+SHORT_RESULT_CHARS = 400
+
+_ANSI_ESCAPE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])")
+_PROGRESS_LINE = re.compile(
+    "|".join(
+        [
+            r"^\s*\d{1,3}%\s*(?:\[.*\]\s*)?$",  # apt: "45% [3 Packages 1.2 MB]"
+            r"^(?:Reading package lists|Building dependency tree|Reading state information)\.\.\. \d+%",
+            r"^\(Reading database \.\.\. \d+%",
+            r"^\s*\d+K(?: \.{10}){1,5}\s+\d+%",  # wget dots
+            r"^\s*% Total\s+% Received",  # curl progress table
+            r"^\s*Dload\s+Upload\s+Total",
+            r"^\s*\d{1,3}\s+\S+\s+\d{1,3}\s+\S+\s+\d+\s+\d+\s+\S+\s+\S+\s+[-:\d]+\s+[-:\d]+\s+[-:\d]+\s+\S+\s*$",
+        ]
+    )
+)
+_DIGITS = re.compile(r"\d+")
+
+
+def strip_noise(text: str) -> list:
+    lines = []
+    for line in _ANSI_ESCAPE.sub("", text).split("\n"):
+        # Progress bars redraw with \r; only the final state is visible.
+        line = line.rstrip("\r").rsplit("\r", 1)[-1]
+        if not _PROGRESS_LINE.search(line):
+            lines.append(line)
+    return lines
+
+
+def collapse_repeats(lines: list, similar: bool = False) -> list:
+    # similar: also collapse lines that differ only in their numbers. Those
+    # numbers are often what a task asks for (sequences, counts), so only
+    # for output that would be cut anyway.
+    shape_of = (lambda line: _DIGITS.sub("#", line)) if similar else (lambda line: line)
+    collapsed = []
+    i = 0
+    while i < len(lines):
+        shape = shape_of(lines[i])
+        j = i + 1
+        while j < len(lines) and shape_of(lines[j]) == shape:
+            j += 1
+        run = j - i
+        if run < MIN_COLLAPSE_RUN:
+            collapsed.extend(lines[i:j])
+        elif all(line == lines[i] for line in lines[i:j]):
+            collapsed += [lines[i], f"[... previous line repeated {run - 1} more times ...]"]
+        else:
+            collapsed += [lines[i], f"[... {run - 2} similar lines ...]", lines[j - 1]]
+        i = j
+    return collapsed
+
+
+def head_tail(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    lines = text.split("\n")
+    head_budget, tail_budget = int(max_chars * 0.6), int(max_chars * 0.4)
+    head, used = [], 0
+    for line in lines:
+        if used + len(line) + 1 > head_budget:
+            break
+        head.append(line)
+        used += len(line) + 1
+    tail, used = [], 0
+    for line in reversed(lines[len(head):]):
+        if used + len(line) + 1 > tail_budget:
+            break
+        tail.append(line)
+        used += len(line) + 1
+    tail.reverse()
+    omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # One huge line: cut characters instead.
+        return f"{text[:head_budget]}\n[... {len(text) - max_chars} characters omitted (full output in the log) ...]\n{text[-tail_budget:]}"
+    return "\n".join(head + [f"[... {omitted} lines omitted (full output in the log) ...]"] + tail)
+
+
+def _split_result(result: str) -> (str, str):
+    if not result.startswith("STDOUT:\n"):
+        return None, None
+    stdout, _, stderr = result[len("STDOUT:\n"):].partition("\nSTDERR:\n")
+    return stdout, stderr
+
+
+class ResultCompactor:
+    def __init__(self, budgets: dict = None, enabled: bool = COMPACT_RESULTS):
+        self.enabled = enabled
+        self.budgets = RESULT_TOKEN_BUDGETS if budgets is None else budgets
+        self.previous = {}
+        self.raw_chars = 0
+        self.compacted_chars = 0
+
+    def _clean(self, text: str, max_chars: int) -> str:
+        lines = collapse_repeats(strip_noise(text))
+        cleaned = "\n".join(lines).strip("\n")
+        if len(cleaned) > max_chars:
+            cleaned = "\n".join(collapse_repeats(lines, similar=True)).strip("\n")
+        return cleaned
+
+    def compact(self, role: str, command: str, result: str) -> str:
+        stdout, stderr = _split_result(result)
+        if not self.enabled or stdout is None:
+            return result
+
+        budget = self.budgets.get(role, RESULT_TOKEN_BUDGET_DEFAULT) * CHARS_PER_TOKEN
+        stdout, stderr = self._clean(stdout, budget), self._clean(stderr, budget // 3)
+        key = (role, " ".join(command.split()))
+        previous = self.previous.get(key)
+        self.previous[key] = (stdout, stderr)
+
+        if previous is not None and len(stdout) > SHORT_RESULT_CHARS:
+            if previous[0] == stdout:
+                stdout = f"[Output identical to the previous run of this command ({stdout.count(chr(10)) + 1} lines).]"
+            else:
+                diff_text = "\n".join(
+                    line
+                    for line in difflib.unified_diff(previous[0].split("\n"), stdout.split("\n"), n=1, lineterm="")
+                    if not line.startswith(("---", "+++"))
+                )
+                if len(diff_text) < len(stdout) // 2:
+                    stdout = f"[Changes since the previous run of this command; unchanged lines omitted:]\n{diff_text}"
+
+        stderr_budget = min(len(stderr), budget // 3)
+        compacted = f"STDOUT:\n{head_tail(stdout, budget - stderr_budget)}\nSTDERR:\n{head_tail(stderr, stderr_budget)}"
+
+        self.raw_chars += len(result)
+        self.compacted_chars += len(compacted)
+        metrics.inc("result_chars_total", len(result), role=role, stage="raw")
+        metrics.inc("result_chars_total", len(compacted), role=role, stage="compacted")
+        return compacted
+
+    def summary(self) -> str:
+        if not self.raw_chars:
+            return "no command results compacted"
+        saved = (1 - self.compacted_chars / self.raw_chars) * 100
+        return f"{self.raw_chars} -> {self.compacted_chars} characters fed back to agents ({saved:.0f}% smaller)"
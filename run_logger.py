@@ -0,0 +1,161 @@
+# run_logger.py
+import base64
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+import metrics
+from config import LOG_FLUSH_INTERVAL, LOG_FLUSH_BYTES, LOG_COMPRESS_THRESHOLD
+
+_STOP = object()
+
+
+def events_filename_for(log_filename: str) -> str:
+    return os.path.splitext(log_filename)[0] + ".events.jsonl"
+
+
+def compress_payload(text: str) -> dict:
+    raw = text.encode("utf-8")
+    return {
+        "gzip_b64": base64.b64encode(gzip.compress(raw)).decode("ascii"),
+        "size": len(raw),
+    }
+
+
+def decompress_payload(value):
+    if isinstance(value, dict) and "gzip_b64" in value:
+        return gzip.decompress(base64.b64decode(value["gzip_b64"])).decode("utf-8")
+    return value
+
+
+class RunLogger:
+    # Drop-in replacement for the transcript file handle: write() only
+    # enqueues, and a background thread batches the disk writes. Structured
+    # events go to a JSONL stream next to the transcript.
+
+    def __init__(
+        self,
+        log_filename,
+        events_filename=None,
+        flush_interval=LOG_FLUSH_INTERVAL,
+        flush_bytes=LOG_FLUSH_BYTES,
+        compress_threshold=LOG_COMPRESS_THRESHOLD,
+        append=False,
+        truncate_to=None,
+    ):
+        self.log_filename = log_filename
+        self.events_filename = events_filename or events_filename_for(log_filename)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.compress_threshold = compress_threshold
+        self._queue = queue.Queue()
+        self._closed = False
+        self._offsets = None
+        # Resumed runs append to the transcript and event stream they
+        # started, cut back to where their checkpoint was taken (see sync()).
+        mode = "a" if append else "w"
+        self._transcript = open(log_filename, mode, encoding="utf-8")
+        self._events = open(self.events_filename, mode, encoding="utf-8")
+        for handle, key in ((self._transcript, "transcript"), (self._events, "events")):
+            if append and truncate_to and truncate_to.get(key) is not None and truncate_to[key] < handle.tell():
+                handle.truncate(truncate_to[key])
+        self._writer = threading.Thread(target=self._run_writer, daemon=True)
+        self._writer.start()
+
+    def write(self, text: str):
+        if not self._closed:
+            self._queue.put(("text", text))
+
+    def flush(self):
+        # Flushing happens on the writer's time/size policy; explicit flushes
+        # from callers are intentionally cheap.
+        pass
+
+    def event(self, event_type: str, **fields):
+        if not self._closed:
+            self._queue.put(("event", (time.time(), event_type, fields)))
+
+    def sync(self) -> dict:
+        # Waits until everything logged so far is on disk and returns the
+        # file sizes at that point, for checkpoints to record.
+        if self._closed:
+            return None
+        synced = threading.Event()
+        self._queue.put(("sync", synced))
+        synced.wait()
+        return dict(self._offsets)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._transcript.close()
+        self._events.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _encode_event(self, timestamp, event_type, fields) -> str:
+        record = {"ts": round(timestamp, 6), "event": event_type}
+        for key, value in fields.items():
+            if (
+                self.compress_threshold
+                and isinstance(value, str)
+                and len(value) > self.compress_threshold
+            ):
+                value = compress_payload(value)
+            record[key] = value
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    def _run_writer(self):
+        text_buffer, event_buffer = [], []
+        buffered_bytes = 0
+        last_flush = time.monotonic()
+        stopping = False
+        synced = None
+
+        while not stopping:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                kind, payload = item
+                if kind == "sync":
+                    synced = payload
+                elif kind == "text":
+                    text_buffer.append(payload)
+                    buffered_bytes += len(payload)
+                else:
+                    line = self._encode_event(*payload)
+                    event_buffer.append(line)
+                    buffered_bytes += len(line)
+
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if stopping or due or synced or buffered_bytes >= self.flush_bytes:
+                with metrics.span("log_flush") if text_buffer or event_buffer else nullcontext():
+                    if text_buffer:
+                        self._transcript.write("".join(text_buffer))
+                        self._transcript.flush()
+                    if event_buffer:
+                        self._events.write("".join(event_buffer))
+                        self._events.flush()
+                text_buffer, event_buffer = [], []
+                buffered_bytes = 0
+                last_flush = time.monotonic()
+            if synced is not None:
+                self._offsets = {"transcript": self._transcript.tell(), "events": self._events.tell()}
+                synced.set()
+                synced = None
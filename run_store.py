@@ -0,0 +1,226 @@
+# run_store.py
+import sqlite3
+import time
+from config import RUN_STORE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    mode TEXT NOT NULL,
+    provider TEXT,
+    model TEXT,
+    network INTEGER,
+    log_filename TEXT,
+    max_rounds INTEGER,
+    started_at REAL,
+    finished_at REAL,
+    outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs(model);
+CREATE INDEX IF NOT EXISTS idx_runs_mode ON runs(mode);
+CREATE INDEX IF NOT EXISTS idx_runs_outcome ON runs(outcome);
+CREATE INDEX IF NOT EXISTS idx_runs_started_at ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_runs_log_filename ON runs(log_filename);
+
+CREATE TABLE IF NOT EXISTS turns (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    cycle INTEGER,
+    turn INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    command TEXT,
+    result_size INTEGER,
+    retries INTEGER,
+    llm_seconds REAL,
+    exec_seconds REAL,
+    verify_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_run ON turns(run_id);
+CREATE INDEX IF NOT EXISTS idx_turns_role ON turns(role);
+
+CREATE TABLE IF NOT EXISTS cycles (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    cycle INTEGER NOT NULL,
+    task TEXT,
+    difficulty TEXT,
+    attempts INTEGER,
+    max_attempts INTEGER,
+    solved INTEGER,
+    completion_percentage REAL,
+    duration_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_cycles_run ON cycles(run_id);
+CREATE INDEX IF NOT EXISTS idx_cycles_difficulty ON cycles(difficulty);
+
+CREATE TABLE IF NOT EXISTS usage (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    cycle INTEGER,
+    turn INTEGER,
+    role TEXT NOT NULL,
+    prompt_tokens INTEGER,
+    cached_tokens INTEGER,
+    output_tokens INTEGER,
+    cost REAL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_run ON usage(run_id);
+"""
+
+
+class RunStore:
+    def __init__(self, path=RUN_STORE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        # WAL lets several experiment processes append while analytics reads.
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._drop_unique_log_filename()
+        self.connection.executescript(SCHEMA)
+
+    def _drop_unique_log_filename(self):
+        # Stores created before transcript names could repeat (re-run batch
+        # matrices, recycled duel_testN.txt names) have UNIQUE(log_filename).
+        # SQLite can't drop a constraint, so the table is rebuilt once.
+        row = self.connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'runs'").fetchone()
+        if row is None or "log_filename TEXT UNIQUE" not in row[0]:
+            return
+        # New table first and renamed last, so the other tables' references
+        # to runs(id) are left as they are.
+        create = SCHEMA.split("CREATE INDEX", 1)[0].replace("IF NOT EXISTS runs", "runs_rebuilt")
+        with self.connection:
+            self.connection.execute(create)
+            self.connection.execute("INSERT INTO runs_rebuilt SELECT * FROM runs")
+            self.connection.execute("DROP TABLE runs")
+            self.connection.execute("ALTER TABLE runs_rebuilt RENAME TO runs")
+
+    def start_run(
+        self, mode, provider, model, network, log_filename, max_rounds, started_at=None
+    ) -> int:
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (mode, provider, model, network, log_filename, max_rounds, started_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    mode,
+                    provider,
+                    model,
+                    int(bool(network)),
+                    log_filename,
+                    max_rounds,
+                    started_at if started_at is not None else time.time(),
+                ),
+            )
+        return cursor.lastrowid
+
+    def record_turn(
+        self,
+        run_id,
+        turn,
+        role,
+        command,
+        result_size,
+        retries=0,
+        llm_seconds=None,
+        exec_seconds=None,
+        verify_seconds=None,
+        cycle=None,
+    ):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO turns (run_id, cycle, turn, role, command, result_size, retries,"
+                " llm_seconds, exec_seconds, verify_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    cycle,
+                    turn,
+                    role,
+                    command,
+                    result_size,
+                    retries,
+                    llm_seconds,
+                    exec_seconds,
+                    verify_seconds,
+                ),
+            )
+
+    def record_cycle(
+        self,
+        run_id,
+        cycle,
+        task,
+        difficulty,
+        attempts,
+        max_attempts,
+        solved,
+        completion_percentage,
+        duration_seconds=None,
+    ):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO cycles (run_id, cycle, task, difficulty, attempts, max_attempts,"
+                " solved, completion_percentage, duration_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    cycle,
+                    task,
+                    difficulty,
+                    attempts,
+                    max_attempts,
+                    int(bool(solved)),
+                    completion_percentage,
+                    duration_seconds,
+                ),
+            )
+
+    def record_usage(
+        self, run_id, turn, role, prompt_tokens, cached_tokens, output_tokens, cost=0.0, cycle=None
+    ):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO usage (run_id, cycle, turn, role, prompt_tokens, cached_tokens, output_tokens, cost)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, cycle, turn, role, prompt_tokens, cached_tokens, output_tokens, cost),
+            )
+
+    def finish_run(self, run_id, outcome, finished_at=None):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE runs SET outcome = ?, finished_at = ? WHERE id = ?",
+                (outcome, finished_at if finished_at is not None else time.time(), run_id),
+            )
+
+    def rewind(self, run_id, turn=None, cycle=None):
+        # A resumed run repeats everything after its checkpoint; drop the rows
+        # recorded for that stretch so they aren't counted twice.
+        with self.connection:
+            if cycle is not None:
+                self.connection.execute("DELETE FROM turns WHERE run_id = ? AND cycle >= ?", (run_id, cycle))
+                self.connection.execute("DELETE FROM cycles WHERE run_id = ? AND cycle >= ?", (run_id, cycle))
+                self.connection.execute("DELETE FROM usage WHERE run_id = ? AND cycle >= ?", (run_id, cycle))
+            if turn is not None:
+                self.connection.execute("DELETE FROM turns WHERE run_id = ? AND turn >= ?", (run_id, turn))
+                self.connection.execute("DELETE FROM usage WHERE run_id = ? AND turn >= ?", (run_id, turn))
+            self.connection.execute(
+                "UPDATE runs SET outcome = NULL, finished_at = NULL WHERE id = ?", (run_id,)
+            )
+
+    def cycle_history(self, model, exclude_run_id=None, limit=None) -> list:
+        sql = (
+            "SELECT c.difficulty, c.attempts, c.solved FROM cycles c JOIN runs r ON r.id = c.run_id"
+            " WHERE r.model = ? AND c.run_id IS NOT ? ORDER BY c.rowid DESC"
+        )
+        params = [model, exclude_run_id]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self.query(sql, params)
+
+    def has_log(self, log_filename) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM runs WHERE log_filename = ?", (log_filename,)
+        ).fetchone()
+        return row is not None
+
+    def query(self, sql, params=()) -> list:
+        return self.connection.execute(sql, params).fetchall()
+
+    def close(self):
+        self.connection.close()
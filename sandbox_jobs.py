@@ -0,0 +1,269 @@
+# sandbox_jobs.py
+#
+# Background jobs for agent commands that would outlast execute_in_docker's
+# 20 second limit (builds, test suites, scans). The Gatekeeper routes these
+# reserved commands here:
+#
+#   job start <command>      run <command> in the background; returns its job id
+#   job status [id]          state and exit code of one or all of the agent's jobs
+#   job tail <id> [lines]    last lines of a job's combined stdout/stderr
+#   job kill <id>            stop a job and everything it started
+#
+# Each job runs niced in its own session inside the sandbox, with a virtual
+# memory limit and a watchdog that kills the session at the time limit. Its
+# pid, output and exit code are files in its own directory under JOB_DIR,
+# owned by the user the job runs as; JOB_DIR itself belongs to root. Those
+# files are only ever read and acted on as that same user, so a job can't get
+# the orchestrator to read or kill anything it couldn't itself. kill_all()
+# ends every job between Game Loop cycles; cleanup_sandbox() removing the
+# container ends whatever is left at the end of a run.
+import re
+import shlex
+import threading
+import time
+import metrics
+from sandbox import start_detached, execute_in_docker, execute_as_root
+from config import USER_TO_RUN_AS, JOB_DIR, JOB_TIME_LIMIT, JOB_MEMORY_LIMIT_MB, JOB_MAX_RUNNING, JOB_TAIL_LINES
+
+JOB_COMMAND = re.compile(r"^\s*job\s+(?P<action>start|status|tail|kill)\b\s*(?P<argument>.*?)\s*$", re.DOTALL)
+JOB_USAGE = "usage: job start <command> | job status [id] | job tail <id> [lines] | job kill <id>"
+MAX_TAIL_LINES = 500
+FINAL_STATES = ("exited", "timeout", "killed", "lost")
+
+# Runs as `bash -c WRAPPER <command>`, so the job's command is $0. The
+# watchdog, the command and anything it leaves behind share the session's
+# process group, which is what the time limit and `job kill` kill.
+_WRAPPER = (
+    "echo $$ > {dir}/{id}/pid; ulimit -v {memory_kb}; "
+    "( sleep {limit}; touch {dir}/{id}/timeout; kill -KILL 0 ) & "
+    'nice -n 10 bash -c "$0" < /dev/null > {dir}/{id}/out 2>&1; '
+    "echo $? > {dir}/{id}/exit; kill -KILL 0"
+)
+# Sets $pid to the job's process group, or to nothing if the pid file holds
+# anything but the pid of a live process group leader.
+_GROUP = (
+    "pid=$(head -c 16 {dir}/$id/pid 2>/dev/null); "
+    'case "$pid" in ""|*[!0-9]*|0|1) pid="";; esac; '
+    '[ -n "$pid" ] && [ "$(cut -d" " -f5 /proc/$pid/stat 2>/dev/null)" != "$pid" ] && pid=""; '
+)
+_STATE = (
+    "for id in {ids}; do " + _GROUP + 'if [ -f {dir}/$id/exit ]; then echo "$id exited $(head -c 16 {dir}/$id/exit)"; '
+    'elif [ -f {dir}/$id/timeout ]; then echo "$id timeout"; '
+    'elif [ ! -f {dir}/$id/pid ]; then echo "$id starting"; '
+    'elif [ -n "$pid" ]; then echo "$id running"; '
+    'else echo "$id lost"; fi; done'
+)
+_KILL = "for id in {ids}; do " + _GROUP + '[ -n "$pid" ] && kill -KILL -- "-$pid"; done 2>/dev/null; true'
+# The output file is read only if it is still a regular file in the job's
+# directory, not a symlink put in its place.
+_TAIL = (
+    'out=$(realpath -e -- {dir}/{id}/out) && [ "$out" = {dir}/{id}/out ] && [ -f "$out" ] '
+    '&& tail -n {lines} -- "$out"'
+)
+
+
+def is_job_query(command: str) -> bool:
+    match = JOB_COMMAND.match(command)
+    return match is not None and match["action"] in ("status", "tail")
+
+
+def _result(stdout: str = "", stderr: str = "") -> str:
+    return f"STDOUT:\n{stdout}\nSTDERR:\n{stderr}"
+
+
+def _stdout(result: str) -> str:
+    if result.startswith("ORCHESTRATOR ERROR"):
+        return None
+    return result.split("\nSTDERR:\n", 1)[0].removeprefix("STDOUT:\n")
+
+
+def _execute(user: str, command: str) -> str:
+    if user == "root":
+        return execute_as_root(command)
+    # Not memoized: job state changes without any command running.
+    return execute_in_docker(command, read_only=False)
+
+
+def _by_user(jobs: list) -> dict:
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job["user"], []).append(job)
+    return groups
+
+
+class JobManager:
+    def __init__(
+        self,
+        time_limit: int = JOB_TIME_LIMIT,
+        memory_limit_mb: int = JOB_MEMORY_LIMIT_MB,
+        max_running: int = JOB_MAX_RUNNING,
+        directory: str = JOB_DIR,
+    ):
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
+        self.max_running = max_running
+        # realpath output is compared against it, so it must be canonical.
+        self.directory = shlex.quote(directory.rstrip("/"))
+        self.jobs = {}
+        self._next_id = 1
+        self._directory_ready = False
+        self._lock = threading.Lock()
+
+    def run(self, action: str, argument: str, role: str) -> str:
+        # status/tail/kill; `job start` goes through the Gatekeeper policy
+        # first and then to start().
+        words = argument.split()
+        if action == "status" and len(words) <= 1:
+            return self.status(role, words[0] if words else None)
+        if action == "tail" and 1 <= len(words) <= 2 and all(word.isdigit() for word in words[1:]):
+            return self.tail(role, words[0], int(words[1]) if len(words) > 1 else JOB_TAIL_LINES)
+        if action == "kill" and len(words) == 1:
+            return self.kill(role, words[0])
+        return _result(stderr=JOB_USAGE + "\n")
+
+    def _own_job(self, role: str, job_id: str) -> dict:
+        job = self.jobs.get(int(job_id)) if job_id.isdigit() else None
+        return job if job is not None and job["role"] == role else None
+
+    def _refresh(self, jobs: list):
+        # One exec per user covers every job still being watched.
+        pending = [job for job in jobs if job["state"] not in FINAL_STATES]
+        output = ""
+        for user, own in _by_user(pending).items():
+            ids = " ".join(str(job["id"]) for job in own)
+            output += _stdout(_execute(user, _STATE.format(ids=ids, dir=self.directory))) or ""
+        for line in output.splitlines():
+            fields = line.split()
+            job = self.jobs.get(int(fields[0])) if fields and fields[0].isdigit() else None
+            if job is None or job["state"] in FINAL_STATES:
+                continue
+            job["state"] = fields[1]
+            if fields[1] == "exited":
+                job["exit_code"] = int(fields[2]) if len(fields) > 2 and fields[2].lstrip("-").isdigit() else None
+            if job["state"] in FINAL_STATES:
+                metrics.inc("sandbox_jobs_total", result=job["state"])
+
+    def _describe(self, job: dict) -> str:
+        state = job["state"]
+        if state == "exited":
+            state = f"exited with code {job['exit_code']}"
+        elif state == "timeout":
+            state = f"killed at the {self.time_limit}s time limit"
+        elif state == "lost":
+            state = "ended without an exit code"
+        return f"job {job['id']}: {state}: {job['command']}"
+
+    def start(self, command: str, role: str, run_as: str = None) -> str:
+        if not command:
+            return _result(stderr=JOB_USAGE + "\n")
+        with self._lock:
+            own = [job for job in self.jobs.values() if job["role"] == role]
+            self._refresh(own)
+            running = [job for job in own if job["state"] not in FINAL_STATES]
+            if len(running) >= self.max_running:
+                metrics.inc("sandbox_jobs_total", result="rejected")
+                ids = ", ".join(str(job["id"]) for job in running)
+                return _result(
+                    stderr=f"JOBS: You already have {len(running)} jobs running ({ids}); "
+                    f"wait for one to finish or kill it first.\n"
+                )
+            if not self._directory_ready:
+                # Fresh per run, so a resumed snapshot's job files can't be
+                # mistaken for new jobs with the same ids. No -p: if
+                # anything recreated the path in between, fail rather than
+                # use it.
+                error = self._setup(f"rm -rf {self.directory} && mkdir -m 0755 {self.directory}")
+                if error:
+                    return error
+                self._directory_ready = True
+            job_id = self._next_id
+            self._next_id += 1
+
+        user = "root" if run_as == "root" else USER_TO_RUN_AS
+        error = self._setup(f"install -d -m 0700 -o {user} {self.directory}/{job_id}")
+        if error:
+            return error
+        script = _WRAPPER.format(
+            dir=self.directory, id=job_id, memory_kb=self.memory_limit_mb * 1024, limit=self.time_limit
+        )
+        error = start_detached(script, command, user=user)
+        if error:
+            metrics.inc("sandbox_jobs_total", result="failed")
+            return error
+        with self._lock:
+            self.jobs[job_id] = {
+                "id": job_id,
+                "role": role,
+                "user": user,
+                "command": command,
+                "started": time.monotonic(),
+                "state": "starting",
+                "exit_code": None,
+            }
+        metrics.inc("sandbox_jobs_total", result="started")
+        return _result(
+            f"Started job {job_id} (killed after {self.time_limit}s). "
+            f"Check it with `job status {job_id}` or `job tail {job_id}`.\n"
+        )
+
+    @staticmethod
+    def _setup(command: str) -> str:
+        # Root-only steps on paths the agents can't write to. Returns an
+        # error message or None.
+        result = execute_as_root(f"{command} && echo ok")
+        if _stdout(result) == "ok\n":
+            return None
+        metrics.inc("sandbox_jobs_total", result="failed")
+        return _result(stderr=f"JOBS: Could not set up the job directory.\n{result}\n")
+
+    def status(self, role: str, job_id: str = None) -> str:
+        with self._lock:
+            if job_id is None:
+                jobs = [job for job in self.jobs.values() if job["role"] == role]
+                if not jobs:
+                    return _result("You have no background jobs.\n")
+            else:
+                job = self._own_job(role, job_id)
+                if job is None:
+                    return _result(stderr=f"JOBS: You have no job {job_id}.\n")
+                jobs = [job]
+            self._refresh(jobs)
+            return _result("".join(self._describe(job) + "\n" for job in jobs))
+
+    def tail(self, role: str, job_id: str, lines: int = JOB_TAIL_LINES) -> str:
+        with self._lock:
+            job = self._own_job(role, job_id)
+            if job is None:
+                return _result(stderr=f"JOBS: You have no job {job_id}.\n")
+            self._refresh([job])
+            description = self._describe(job)
+        lines = max(1, min(lines, MAX_TAIL_LINES))
+        output = _stdout(_execute(job["user"], _TAIL.format(dir=self.directory, id=job["id"], lines=lines)))
+        if output is None:
+            return _result(stderr=f"JOBS: Could not read the output of job {job['id']}.\n")
+        return _result(f"{description}\n--- last {lines} lines ---\n{output}")
+
+    def kill(self, role: str, job_id: str) -> str:
+        with self._lock:
+            job = self._own_job(role, job_id)
+            if job is None:
+                return _result(stderr=f"JOBS: You have no job {job_id}.\n")
+            self._refresh([job])
+            if job["state"] in FINAL_STATES:
+                return _result(f"{self._describe(job)} (nothing to kill)\n")
+            self._kill([job])
+            return _result(f"{self._describe(job)}\n")
+
+    def _kill(self, jobs: list):
+        for user, own in _by_user(jobs).items():
+            _execute(user, _KILL.format(ids=" ".join(str(job["id"]) for job in own), dir=self.directory))
+        for job in jobs:
+            job["state"] = "killed"
+            metrics.inc("sandbox_jobs_total", result="killed")
+
+    def kill_all(self) -> int:
+        with self._lock:
+            running = [job for job in self.jobs.values() if job["state"] not in FINAL_STATES]
+            if running:
+                self._kill(running)
+            return len(running)
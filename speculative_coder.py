@@ -0,0 +1,127 @@
+# speculative_coder.py
+#
+# Speculative Coder requests for the Game Loop (SPECULATIVE_CODER). While
+# the Verifier judges attempt k, the Coder's attempt k+1 is already
+# requested on a copy of its history, from the command result alone. A
+# successful verdict discards it. Otherwise it becomes attempt k+1, unless
+# the Verifier's feedback probably matters more than the time saved: the
+# verdict was a near miss, or the speculative command repeats one already
+# tried this cycle. Then attempt k+1 is requested again with the feedback,
+# as without speculation.
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from stall_detection import normalize_command
+from config import SPECULATIVE_REGENERATE_ABOVE
+
+
+class SpeculativeCoder:
+    def __init__(self, ai_provider, rate_limiter, regenerate_above: int = SPECULATIVE_REGENERATE_ABOVE):
+        self.ai_provider = ai_provider
+        self.rate_limiter = rate_limiter
+        self.regenerate_above = regenerate_above
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative-coder")
+        self.pending = None
+        self.discarded = []
+        self.tried = set()
+        self.counts = Counter()
+        self.seconds_saved = 0.0
+
+    def reset(self):
+        self.tried = set()
+
+    def observe(self, command: str):
+        self.tried.add(normalize_command(command))
+
+    def _request(self, history: list, context: str) -> dict:
+        started = time.monotonic()
+        self.rate_limiter.wait("coder")
+        thoughts, command = self.ai_provider.get_ai_action(
+            history,
+            context,
+            thinking_enabled=(self.ai_provider.__class__.__name__ == "GeminiProvider"),
+            role="coder",
+        )
+        return {
+            "history": history,
+            "thoughts": thoughts,
+            "command": command,
+            "usage": self.ai_provider.take_usage(),
+            "started": started,
+            "duration": time.monotonic() - started,
+        }
+
+    def start(self, coder_history: list, context: str):
+        self.pending = self.pool.submit(self._request, list(coder_history), context)
+        self.counts["requested"] += 1
+
+    def resolve(self, verdict: dict) -> dict:
+        # Called once the Verifier has answered. Returns the speculation
+        # with "used" and "result" set, or None if there was none or the
+        # verdict was a success; its usage is then left to collect().
+        future, self.pending = self.pending, None
+        if future is None:
+            return None
+        if verdict["success"]:
+            self.discarded.append(future)
+            self._count("discarded")
+            return None
+
+        verdict_time = time.monotonic()
+        try:
+            speculation = future.result()
+        except Exception as e:
+            print(f"\n[SPECULATION] Speculative Coder request failed: {e}")
+            self._count("failed")
+            return None
+        speculation["waited"] = time.monotonic() - verdict_time
+        if not speculation["command"]:
+            result = "invalid"
+        elif normalize_command(speculation["command"]) in self.tried:
+            result = "repeat"
+        elif (verdict.get("completion_percentage") or 0) >= self.regenerate_above:
+            result = "near_miss"
+        else:
+            result = "used"
+            # The part of the request that ran while the Verifier did.
+            self.seconds_saved += min(speculation["duration"], verdict_time - speculation["started"])
+        self._count(result)
+        return dict(speculation, used=result == "used", result=result)
+
+    def _count(self, result: str):
+        self.counts[result] += 1
+        metrics.inc("speculative_coder_total", result=result)
+
+    def collect(self, block: bool = False) -> list:
+        # Usage of discarded requests, once they have finished.
+        done = [future for future in self.discarded if block or future.done()]
+        self.discarded = [future for future in self.discarded if future not in done]
+        usage = []
+        for future in done:
+            try:
+                usage.append(future.result()["usage"])
+            except Exception:
+                pass
+        return usage
+
+    def close(self) -> list:
+        if self.pending is not None:
+            self.discarded.append(self.pending)
+            self.pending = None
+        usage = self.collect(block=True)
+        self.pool.shutdown()
+        return usage
+
+    def summary(self) -> str:
+        requested = self.counts["requested"]
+        used = self.counts["used"]
+        regenerated = sum(self.counts[result] for result in ("near_miss", "repeat", "invalid", "failed"))
+        return (
+            f"{requested} requests, {used} used ({used / requested:.0%} hit rate), "
+            f"{self.counts['discarded'] + regenerated} wasted ({self.counts['discarded']} after a success, "
+            f"{regenerated} regenerated); "
+            f"~{self.seconds_saved:.1f}s of Coder latency overlapped"
+            if requested
+            else "no requests"
+        )
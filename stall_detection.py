@@ -0,0 +1,75 @@
+# stall_detection.py
+#
+# Per-cycle bookkeeping that spots a Coder going in circles: the same
+# (normalized) command, or an /app state identical to one the Verifier has
+# already judged. Only hashes are kept.
+import hashlib
+from config import STALL_LIMIT
+
+STALL_HINT = (
+    "NOTE: You are repeating yourself. {reason} Doing the same thing again will "
+    "not change the outcome; take a substantially different approach."
+)
+
+
+def _fingerprint(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=16).digest()
+
+
+def state_key(sandbox_state: str) -> bytes:
+    return _fingerprint(sandbox_state)
+
+
+def normalize_command(command: str) -> str:
+    return " ".join(command.split()).rstrip(";").strip()
+
+
+class StallDetector:
+    def __init__(self, limit: int = STALL_LIMIT):
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self.commands = set()
+        self.outcomes = {}
+        self.verdicts = {}
+        self.previous_state = None
+
+    def observe(self, command: str, sandbox_state: str = None) -> dict:
+        # sandbox_state is None when automated checks decided the attempt and
+        # /app wasn't captured: only the command counts then.
+        command_key = _fingerprint(normalize_command(command))
+        sandbox_key = state_key(sandbox_state) if sandbox_state is not None else None
+        outcome_key = command_key + (sandbox_key or b"")
+        self.outcomes[outcome_key] = self.outcomes.get(outcome_key, 0) + 1
+
+        observation = {
+            "state_key": sandbox_key,
+            "repeated_command": command_key in self.commands,
+            "unchanged_state": sandbox_key is not None and sandbox_key == self.previous_state,
+            "repeats": self.outcomes[outcome_key],
+        }
+        observation["stalled"] = observation["repeats"] >= self.limit
+        self.commands.add(command_key)
+        self.previous_state = sandbox_key
+        return observation
+
+    def cached_verdict(self, state_key: bytes) -> dict:
+        # The Verifier only sees the task and the sandbox state, so a state
+        # it has already judged this cycle gets the same verdict.
+        return self.verdicts.get(state_key)
+
+    def remember_verdict(self, state_key: bytes, verdict: dict):
+        self.verdicts[state_key] = verdict
+
+    @staticmethod
+    def hint(observation: dict) -> str:
+        if observation["repeated_command"] and observation["unchanged_state"]:
+            reason = "You already ran this command and it left /app exactly as it was."
+        elif observation["repeated_command"]:
+            reason = "You already ran this exact command earlier in this task."
+        elif observation["unchanged_state"]:
+            reason = "Your last command did not change anything in /app."
+        else:
+            return ""
+        return STALL_HINT.format(reason=reason)
@@ -0,0 +1,108 @@
+# token_usage.py
+#
+# Token and cost accounting for a run. Providers leave the usage of their
+# last successful call in `last_usage`; the experiment hands it to the
+# ledger together with the role and turn, and the ledger keeps per-role
+# totals, prices them with TOKEN_COST_RATES, stores every call in the run
+# store and tells the experiment when MAX_RUN_TOKENS or MAX_RUN_COST is hit.
+import metrics
+from config import TOKEN_COST_RATES, MAX_RUN_TOKENS, MAX_RUN_COST
+
+USAGE_FIELDS = ("prompt_tokens", "cached_tokens", "output_tokens")
+# Hosted models, which are never free; local ones are.
+BILLED_MODEL_PREFIXES = ("gemini",)
+
+_unpriced_warned = set()
+
+
+def rates_for(model_name: str, rates: dict = None) -> dict:
+    rates = TOKEN_COST_RATES if rates is None else rates
+    matches = [prefix for prefix in rates if model_name.startswith(prefix)]
+    if matches:
+        return rates[max(matches, key=len)]
+    if model_name.startswith(BILLED_MODEL_PREFIXES) and model_name not in _unpriced_warned:
+        _unpriced_warned.add(model_name)
+        print(
+            f"[COST] ⚠️ No rate for '{model_name}' in TOKEN_COST_RATES: its calls are counted at $0 "
+            f"and MAX_RUN_COST can't stop the run."
+        )
+    return None
+
+
+def usage_cost(usage: dict, rates: dict) -> float:
+    if not rates:
+        return 0.0
+    uncached = usage["prompt_tokens"] - usage["cached_tokens"]
+    return (
+        uncached * rates["input"]
+        + usage["cached_tokens"] * rates.get("cached_input", rates["input"])
+        + usage["output_tokens"] * rates["output"]
+    ) / 1_000_000
+
+
+class TokenLedger:
+    def __init__(self, model_name: str, log_file=None, run_store=None, run_id=None, max_tokens=MAX_RUN_TOKENS, max_cost=MAX_RUN_COST):
+        self.model_name = model_name
+        self.rates = rates_for(model_name)
+        self.log_file = log_file
+        self.run_store = run_store
+        self.run_id = run_id
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.roles = {}
+
+    def add(self, role: str, usage: dict, turn: int = None, cycle: int = None):
+        if usage is None:
+            return
+        # Calls routed to another model (model_routing.py) arrive priced.
+        cost = usage["cost"] if "cost" in usage else usage_cost(usage, self.rates)
+        usage = {field: usage[field] for field in USAGE_FIELDS}
+        totals = self.roles.setdefault(role, dict.fromkeys(USAGE_FIELDS + ("calls", "cost"), 0))
+        for field in USAGE_FIELDS:
+            totals[field] += usage[field]
+            metrics.inc("llm_tokens_total", usage[field], role=role, kind=field.replace("_tokens", ""))
+        totals["calls"] += 1
+        totals["cost"] += cost
+        metrics.inc("llm_cost_usd_total", cost, role=role)
+        if self.run_store is not None:
+            self.run_store.record_usage(self.run_id, turn, role, cost=cost, cycle=cycle, **usage)
+        if self.log_file is not None:
+            self.log_file.event("usage", role=role, turn=turn, cycle=cycle, cost=round(cost, 6), **usage)
+
+    def totals(self) -> dict:
+        totals = dict.fromkeys(USAGE_FIELDS + ("calls", "cost"), 0)
+        for role_totals in self.roles.values():
+            for field, value in role_totals.items():
+                totals[field] += value
+        totals["tokens"] = totals["prompt_tokens"] + totals["output_tokens"]
+        return totals
+
+    def exceeded(self) -> str:
+        totals = self.totals()
+        if self.max_tokens is not None and totals["tokens"] >= self.max_tokens:
+            return f"token budget reached ({totals['tokens']} >= {self.max_tokens} tokens)"
+        if self.max_cost is not None and totals["cost"] >= self.max_cost:
+            return f"cost budget reached (${totals['cost']:.4f} >= ${self.max_cost:.4f})"
+        return None
+
+    def state(self) -> dict:
+        return {role: dict(totals) for role, totals in self.roles.items()}
+
+    def restore(self, state: dict):
+        self.roles = {role: dict(totals) for role, totals in state.items()}
+
+    def summary(self) -> str:
+        totals = self.totals()
+        priced = self.rates is not None or totals["cost"] > 0
+        lines = [
+            f"  Tokens: {totals['tokens']} over {totals['calls']} calls "
+            f"({totals['prompt_tokens']} prompt, {totals['cached_tokens']} of them cached, {totals['output_tokens']} output)"
+            + (f", est. ${totals['cost']:.4f}" if priced else "")
+        ]
+        for role, role_totals in sorted(self.roles.items()):
+            per_call = (role_totals["prompt_tokens"] + role_totals["output_tokens"]) / role_totals["calls"]
+            lines.append(
+                f"    {role:<10} {role_totals['prompt_tokens']:>9} prompt {role_totals['output_tokens']:>8} output"
+                f" {per_call:>9.0f}/call" + (f"  ${role_totals['cost']:.4f}" if priced else "")
+            )
+        return "\n".join(lines)
@@ -1,52 +1,94 @@
 # utils.py
-import json
+import os
 import re
+import threading
 import time
 from collections import deque
+import metrics
+from json_extraction import (
+    extract_json_object,
+    ACTION_SCHEMA,
+    VERIFIER_SCHEMA,
+    TASKMASTER_SCHEMA,
+)
 
 
 class RateLimiter:
     def __init__(self, rpm_limit):
         self.limit = rpm_limit if rpm_limit > 0 else float("inf")
         self.timestamps = deque()
+        # Parallel callers (Best-of-N candidates, speculative Coder requests)
+        # reserve their slots one at a time.
+        self._lock = threading.Lock()
         print(f"[RATE LIMITER] Initialized with a limit of {self.limit} RPM.")
 
-    def wait(self):
+    # `role` is accepted for model_routing.RoleRateLimiter compatibility;
+    # a plain limiter covers every role.
+    def wait(self, role: str = None):
+        # Returns once a slot is free, having taken it for the caller's
+        # request. The sleep happens outside the lock, and the slot is
+        # checked again afterwards, since another caller may have taken it.
         if self.limit == float("inf"):
             return
 
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self.timestamps and now - self.timestamps[0] > 60:
+                    self.timestamps.popleft()
+
+                if len(self.timestamps) < self.limit:
+                    self.timestamps.append(now)
+                    return
+                time_to_wait = 60 - (now - self.timestamps[0])
+            print(f"\n[RATE LIMITER] RPM limit ({self.limit}) reached. Waiting for {time_to_wait:.1f} seconds...")
+            with metrics.span("rate_limit_wait"):
+                time.sleep(max(0.0, time_to_wait) + 0.5)
+
+    def state(self) -> dict:
         now = time.monotonic()
-        while self.timestamps and now - self.timestamps[0] > 60:
-            self.timestamps.popleft()
-
-        if len(self.timestamps) >= self.limit:
-            oldest_request_time = self.timestamps[0]
-            time_to_wait = 60 - (now - oldest_request_time)
-            if time_to_wait > 0:
-                print(
-                    f"\n[RATE LIMITER] RPM limit ({self.limit}) reached. Waiting for {time_to_wait:.1f} seconds..."
-                )
-                time.sleep(time_to_wait + 0.5)
+        return {
+            "rpm_limit": 0 if self.limit == float("inf") else self.limit,
+            "request_ages": [now - t for t in self.timestamps],
+            "saved_at": time.time(),
+        }
 
-    def add_request(self):
-        if self.limit != float("inf"):
-            self.timestamps.append(time.monotonic())
+    def restore(self, state: dict):
+        # Monotonic timestamps don't survive a restart, so requests are saved
+        # as ages and shifted by the wall-clock time spent offline.
+        offline = max(0.0, time.time() - state["saved_at"])
+        now = time.monotonic()
+        self.timestamps = deque(
+            now - age - offline for age in state["request_ages"] if age + offline < 60
+        )
 
 
 def log_and_print(message, file_handle, end="\n"):
-    print(message, end=end)
-    file_handle.write(message + end)
-    file_handle.flush()
+    with metrics.span("log"):
+        print(message, end=end)
+        file_handle.write(message + end)
+        file_handle.flush()
+
+
+def next_log_filename(prefix: str, directory: str = ".") -> str:
+    # One directory scan instead of probing duel_test1.txt, duel_test2.txt, ...
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d+)\.txt$")
+    highest = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = pattern.match(entry.name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+    filename = f"{prefix}{highest + 1}.txt"
+    return filename if directory == "." else os.path.join(directory, filename)
 
 
 def parse_ai_json_response(response_text: str) -> (str, str):
     try:
-        response_text = response_text.strip()
-        match = re.search(r"\{.*\}", response_text, re.DOTALL)
-        if not match:
-            return "Error: Could not find a JSON object in the response.", ""
-
-        data = json.loads(match.group(0))
+        with metrics.span("parse", kind="action"):
+            data, error = extract_json_object(response_text, ACTION_SCHEMA)
+        if data is None:
+            return f"Error: {error}", ""
 
         thoughts_raw = data.get("thoughts", "No 'thoughts' field provided.")
         if isinstance(thoughts_raw, dict):
@@ -64,25 +106,21 @@ def parse_ai_json_response(response_text: str) -> (str, str):
             return "Error: 'command' must be a string.", ""
 
         return thoughts, command
-    except json.JSONDecodeError as e:
-        return f"Error: Invalid JSON. {str(e)}", ""
     except Exception as e:
         return f"Unexpected error: {e}", ""
 
 
 def parse_verifier_response(response_text: str) -> dict:
     try:
-        response_text = response_text.strip()
-        match = re.search(r"\{.*\}", response_text, re.DOTALL)
-        if not match:
+        with metrics.span("parse", kind="verdict"):
+            data, error = extract_json_object(response_text, VERIFIER_SCHEMA)
+        if data is None:
             return {
                 "success": False,
-                "feedback": "Error: Could not parse Verifier response",
+                "feedback": f"Error: Could not parse Verifier response. {error}",
                 "completion_percentage": 0,
             }
 
-        data = json.loads(match.group(0))
-
         return {
             "success": data.get("success", False),
             "feedback": data.get("feedback", "No feedback provided"),
@@ -98,18 +136,18 @@ def parse_verifier_response(response_text: str) -> dict:
 
 def parse_taskmaster_response(response_text: str) -> dict:
     try:
-        response_text = response_text.strip()
-        match = re.search(r"\{.*\}", response_text, re.DOTALL)
-        if not match:
+        with metrics.span("parse", kind="task"):
+            data, error = extract_json_object(response_text, TASKMASTER_SCHEMA)
+        if data is None:
+            print(f"[ERROR] Failed to parse Taskmaster response: {error}")
             return None
 
-        data = json.loads(match.group(0))
-
         return {
             "task": data.get("task", ""),
             "max_attempts": data.get("max_attempts", 20),
             "expected_difficulty": data.get("expected_difficulty", "medium"),
             "reasoning": data.get("reasoning", ""),
+            "assertions": data.get("assertions", []),
         }
     except Exception as e:
         print(f"[ERROR] Failed to parse Taskmaster response: {e}")